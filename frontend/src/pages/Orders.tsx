@@ -143,7 +143,7 @@ const Orders = () => {
                       <div className="flex items-start sm:items-center gap-2 sm:gap-3 flex-1">
                         <div className="w-1.5 h-1.5 sm:w-2 sm:h-2 bg-blue-600 rounded-full flex-shrink-0 mt-1.5 sm:mt-0"></div>
                         <div className="flex-1 min-w-0">
-                          <span className="text-gray-700 text-sm sm:text-base break-words">{item.product.name}</span>
+                          <span className="text-gray-700 text-sm sm:text-base break-words">{item.product_name}</span>
                           <span className="text-xs sm:text-sm text-gray-500 ml-2">× {item.quantity}</span>
                         </div>
                       </div>
@@ -11,13 +11,19 @@ import {
   AdminStats,
   PaginatedResponse,
   LoginResponse,
-  RegisterResponse
+  RegisterResponse,
+  BulkOrderUpdateResult,
+  OrderTimeline,
+  TimeInState,
+  LiveEvent
 } from '../types';
 
 const API_URL = 'https://medicom.onrender.com/api';
 
 const api: AxiosInstance = axios.create({
   baseURL: API_URL,
+  // Sends the guest cart cookie, which is merged into the cart on login
+  withCredentials: true,
   headers: {
     'Content-Type': 'application/json',
   },
@@ -98,6 +104,9 @@ export const cartAPI = {
   
   clear: (): Promise<AxiosResponse<Cart>> =>
     api.delete('/orders/cart/clear/'),
+  
+  batch: (items: { product_id: number; quantity: number }[]): Promise<AxiosResponse<Cart>> =>
+    api.put('/orders/cart/batch/', { items }),
 };
 
 // Orders API
@@ -113,6 +122,9 @@ export const ordersAPI = {
   
   markPaid: (id: number): Promise<AxiosResponse<Order>> =>
     api.post(`/orders/orders/${id}/mark_paid/`),
+  
+  getTimeline: (id: number): Promise<AxiosResponse<OrderTimeline>> =>
+    api.get(`/orders/orders/${id}/timeline/`),
 };
 
 // Admin API
@@ -124,11 +136,19 @@ export const adminAPI = {
   getRecentOrders: (): Promise<AxiosResponse<Order[]>> =>
     api.get('/admin-panel/dashboard/recent_orders/'),
   
-  getSalesAnalytics: (): Promise<AxiosResponse<{
-    daily_sales: Array<{
-      day: string;
-      total: number;
-      count: number;
+  getSalesAnalytics: (params?: {
+    start?: string;
+    end?: string;
+    granularity?: 'day' | 'week' | 'month';
+  }): Promise<AxiosResponse<{
+    start: string;
+    end: string;
+    granularity: 'day' | 'week' | 'month';
+    sales: Array<{
+      period: string;
+      orders: number;
+      units: number;
+      revenue: number;
     }>;
     top_products: Array<{
       product__name: string;
@@ -136,8 +156,26 @@ export const adminAPI = {
       total_quantity: number;
       total_revenue: number;
     }>;
+    categories: Array<{
+      category__name: string;
+      category__id: number;
+      total_quantity: number;
+      total_revenue: number;
+    }>;
+  }>> =>
+    api.get('/admin-panel/dashboard/sales_analytics/', { params }),
+  
+  getFulfillment: (params?: {
+    field?: 'status' | 'payment_status';
+    start?: string;
+    end?: string;
+  }): Promise<AxiosResponse<{
+    field: 'status' | 'payment_status';
+    start: string;
+    end: string;
+    states: TimeInState[];
   }>> =>
-    api.get('/admin-panel/dashboard/sales_analytics/'),
+    api.get('/admin-panel/dashboard/fulfillment/', { params }),
   
   // Products
   getProducts: (params?: Record<string, any>): Promise<AxiosResponse<PaginatedResponse<Product> | Product[]>> =>
@@ -201,6 +239,21 @@ export const adminAPI = {
   updateOrderPaymentStatus: (id: number, payment_status: string): Promise<AxiosResponse<Order>> =>
     api.post(`/admin-panel/orders/${id}/update_payment_status/`, { payment_status }),
   
+  getOrderTimeline: (id: number): Promise<AxiosResponse<OrderTimeline>> =>
+    api.get(`/admin-panel/orders/${id}/timeline/`),
+  
+  bulkUpdateOrderStatus: (
+    status: string,
+    selection: { ids: number[] } | { filter: Record<string, string> }
+  ): Promise<AxiosResponse<BulkOrderUpdateResult>> =>
+    api.post('/admin-panel/orders/bulk_update_status/', { status, ...selection }),
+  
+  bulkUpdateOrderPaymentStatus: (
+    payment_status: string,
+    selection: { ids: number[] } | { filter: Record<string, string> }
+  ): Promise<AxiosResponse<BulkOrderUpdateResult>> =>
+    api.post('/admin-panel/orders/bulk_update_payment_status/', { payment_status, ...selection }),
+  
   // Categories
   getCategories: (params?: Record<string, any>): Promise<AxiosResponse<PaginatedResponse<Category> | Category[]>> =>
     api.get('/admin-panel/categories/', { params }),
@@ -226,4 +279,44 @@ export const adminAPI = {
     api.delete(`/admin-panel/categories/${id}/`),
 };
 
+// Live updates (server-sent events), instead of polling orders and stats
+export const liveAPI = {
+  getTicket: (): Promise<AxiosResponse<{ ticket: string; expires_in: number }>> =>
+    api.post('/live/ticket/'),
+  
+  // Calls onEvent for every event; 'ready' (also after reconnects) means refetch.
+  // Returns a function that closes the stream.
+  connect: (onEvent: (event: LiveEvent) => void): (() => void) => {
+    const names: LiveEvent['event'][] = ['ready', 'order.created', 'order.updated', 'stock.low', 'overflow'];
+    let source: EventSource | null = null;
+    let closed = false;
+    
+    const open = async () => {
+      const { data } = await liveAPI.getTicket();
+      if (closed) return;
+      source = new EventSource(`${API_URL}/live/stream/?ticket=${encodeURIComponent(data.ticket)}`);
+      names.forEach((name) =>
+        source!.addEventListener(name, (message) =>
+          onEvent({ event: name, data: JSON.parse((message as MessageEvent).data) } as LiveEvent)
+        )
+      );
+      // Overflows and expired tickets close the stream for good; reopen with a fresh ticket
+      source.addEventListener('overflow', () => reopen());
+      source.onerror = () => {
+        if (source?.readyState === EventSource.CLOSED) reopen();
+      };
+    };
+    const reopen = () => {
+      source?.close();
+      if (!closed) setTimeout(() => open().catch(() => reopen()), 3000);
+    };
+    
+    open().catch(() => reopen());
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  },
+};
+
 export default api;
\ No newline at end of file
@@ -69,6 +69,7 @@ export interface Cart {
   id: number;
   items: CartItem[];
   total: number;
+  item_count?: number;
   created_at: string;
   updated_at: string;
 }
@@ -78,6 +79,7 @@ export interface OrderItem {
   id: number;
   product: number | Product;
   product_name?: string;
+  product_slug?: string;
   product_image?: string;
   quantity: number;
   price: string | number;
@@ -186,6 +188,8 @@ export interface AdminProduct extends Product {
 export interface AdminUser extends User {
   total_orders?: number;
   total_spent?: number;
+  first_order_at?: string | null;
+  last_order_at?: string | null;
 }
 
 export interface AdminOrder extends Order {
@@ -194,6 +198,60 @@ export interface AdminOrder extends Order {
   items_count?: number;
 }
 
+export interface BulkOrderUpdateResult {
+  status?: string;
+  payment_status?: string;
+  updated: number;
+  results: Array<{
+    id: number;
+    result: 'updated' | 'unchanged' | 'rejected' | 'not_found';
+    previous?: string;
+    error?: string;
+  }>;
+}
+
+export interface OrderEvent {
+  id: number;
+  field: 'status' | 'payment_status';
+  from_value: string;
+  to_value: string;
+  entered_at: string;
+  created_at: string;
+}
+
+export interface OrderTimeline {
+  order: number;
+  order_number: string;
+  status: string;
+  payment_status: string;
+  placed_at: string;
+  events: OrderEvent[];
+}
+
+export interface TimeInState {
+  state: string;
+  transitions: number;
+  average_seconds: number;
+  min_seconds: number;
+  max_seconds: number;
+  histogram: Record<string, number>;
+}
+
+export interface LiveOrder {
+  id: number;
+  order_number: string;
+  status: string;
+  payment_status: string;
+  total_amount: string;
+}
+
+export type LiveEvent =
+  | { event: 'ready'; data: Record<string, never> }
+  | { event: 'order.created'; data: LiveOrder & { user_email?: string; created_at?: string } }
+  | { event: 'order.updated'; data: LiveOrder & { field: string; from_value: string; to_value: string } }
+  | { event: 'stock.low'; data: { id: number; name: string; slug: string; stock: number; threshold: number } }
+  | { event: 'overflow'; data: Record<string, never> };
+
 export interface AdminCategory extends Category {
   products_count?: number;
 }
@@ -11,6 +11,11 @@ class User(AbstractUser):
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_id_idx'),
+        ]
     
     def __str__(self):
         return self.email
\ No newline at end of file
@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from orders import guest_cart
 from .serializers import (RegisterSerializer, UserSerializer, ChangePasswordSerializer, UpdateProfileSerializer)
 
 
@@ -15,6 +16,15 @@ if not User.objects.filter(username="admin").exists():
         password="admin123"
     )
 
+def merge_guest_cart(request, user, response):
+    """Fold the visitor's guest cart into ``user``'s cart and report the outcome."""
+    lines = guest_cart.load(request)
+    if lines:
+        response.data['cart_merge'] = guest_cart.merge(user, lines)
+        guest_cart.forget(response)
+    return response
+
+
 # Custom Login View (Simpler and More Reliable)
 class CustomLoginView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -67,10 +77,11 @@ class CustomLoginView(APIView):
         # Generate tokens
         refresh = RefreshToken.for_user(user)
         
-        return Response({
+        response = Response({
             'access': str(refresh.access_token),
             'refresh': str(refresh),
         }, status=status.HTTP_200_OK)
+        return merge_guest_cart(request, user, response)
 
 
 # Register View
@@ -86,11 +97,12 @@ class RegisterView(generics.CreateAPIView):
         
         refresh = RefreshToken.for_user(user)
         
-        return Response({
+        response = Response({
             'user': UserSerializer(user).data,
             'refresh': str(refresh),
             'access': str(refresh.access_token),
         }, status=status.HTTP_201_CREATED)
+        return merge_guest_cart(request, user, response)
 
 
 # User Profile View - UPDATED
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class AdminPanelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'admin_panel'
\ No newline at end of file
+    name = 'admin_panel'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,89 @@
+"""
+Bulk order status and payment-status changes.
+
+The selected orders are locked and read once.  They then move together in
+one ``UPDATE ... WHERE id IN (...) AND <field> IN (<allowed sources>)``, so
+the transition rule (``orders.transitions``) is enforced by the statement
+itself, and their OrderEvents are appended in one INSERT.  ``Order.save`` and
+its signals are bypassed, so the rollups they would have booked
+(``admin_panel.rollups``) are booked here in a few set-based writes in the
+same transaction.
+"""
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from orders import transitions
+from orders.models import Order, OrderEvent
+from orders.signals import order_transitioned
+from . import rollups
+
+
+BULK_LIMIT = 1000
+
+
+def transition(order_ids, field, target, actor=None):
+    """
+    Move the orders in ``order_ids`` to ``field=target`` where
+    ``orders.transitions`` allows it, logging an OrderEvent for each.
+    Returns ``{order_id: previous value}`` for the orders found and the
+    list of ids that were updated.
+    """
+    allowed_from = transitions.sources(field, target)
+    with transaction.atomic():
+        rows = {
+            pk: {
+                'status': order_status, 'payment_status': payment_status, 'total_amount': total,
+                'user_id': user_id, 'created_at': created_at,
+            }
+            for pk, order_status, payment_status, total, user_id, created_at in
+            Order.objects.filter(pk__in=order_ids).order_by('pk').select_for_update()
+            .values_list('pk', 'status', 'payment_status', 'total_amount', 'user_id', 'created_at')
+        }
+        eligible = [pk for pk, row in rows.items() if row[field] in allowed_from]
+        if eligible:
+            now = timezone.now()
+            updates = {field: target, 'updated_at': now}
+            if field == 'payment_status' and target == 'paid':
+                # What Order.save() and mark_paid keep in step with the payment status
+                updates.update(is_paid=True, paid_at=Coalesce('paid_at', Value(now)))
+            Order.objects.filter(pk__in=eligible, **{f'{field}__in': allowed_from}).update(**updates)
+
+            since = transitions.entered_at([(pk, rows[pk]['created_at']) for pk in eligible], field)
+            events = OrderEvent.objects.bulk_create([
+                OrderEvent(
+                    order_id=pk, field=field, from_value=rows[pk][field], to_value=target,
+                    entered_at=since[pk], actor=actor,
+                )
+                for pk in eligible
+            ])
+            order_transitioned.send(sender=Order, events=events)
+            book_rollups([(rows[pk], {**rows[pk], field: target}, pk) for pk in eligible])
+    return {pk: row[field] for pk, row in rows.items()}, eligible
+
+
+def book_rollups(changes):
+    """Book ``(before, after, order_id)`` state changes the way the Order signals would."""
+    totals = {}
+    spent_by_user = {}
+    booked, unbooked = [], []
+    for before, after, pk in changes:
+        was = rollups.order_contribution(before['status'], before['payment_status'], before['total_amount'])
+        now = rollups.order_contribution(after['status'], after['payment_status'], after['total_amount'])
+        shard = totals.setdefault(rollups.shard_of(pk), {})
+        for name in now:
+            shard[name] = shard.get(name, 0) + now[name] - was[name]
+        spent = now['revenue'] - was['revenue']
+        spent_by_user[after['user_id']] = spent_by_user.get(after['user_id'], 0) + spent
+
+        was_sale = rollups.counts_as_sale(before['status'], before['payment_status'])
+        is_sale = rollups.counts_as_sale(after['status'], after['payment_status'])
+        if was_sale != is_sale:
+            (booked if is_sale else unbooked).append(pk)
+
+    for shard, deltas in totals.items():
+        rollups.record(shard=shard, **deltas)
+    rollups.record_customer_spend(spent_by_user)
+    rollups.book_sales(booked, 1)
+    rollups.book_sales(unbooked, -1)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from admin_panel.rollups import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's lifetime order count, spend and order dates"
+
+    def handle(self, *args, **options):
+        users = rebuild_customer_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt customer stats for {users} users'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from admin_panel.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily dashboard rollups from orders and users'
+
+    def handle(self, *args, **options):
+        days = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt dashboard stats for {days} days'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from admin_panel.rollups import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from paid orders and their items'
+
+    def handle(self, *args, **options):
+        days = rebuild_sales()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} days'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('orders', '0007_orderitem_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('users', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pending_orders', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily stats',
+                'db_table': 'daily_stats',
+                'ordering': ['date'],
+            },
+        ),
+        # Backfilled by 0004, once the rows have the shard rebuild fills in
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0001_daily_stats'),
+        ('orders', '0007_orderitem_snapshot'),
+        ('products', '0012_stock_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'db_table': 'daily_sales',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_facts', to='products.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_facts', to='products.product')),
+            ],
+            options={
+                'db_table': 'sales_facts',
+                'indexes': [models.Index(fields=['date', 'category'], name='sales_fact_date_category_idx')],
+                'unique_together': {('date', 'product')},
+            },
+        ),
+        # Backfilled by 0004, once the rows have the shard rebuild_sales fills in
+    ]
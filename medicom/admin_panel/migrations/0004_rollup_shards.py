@@ -0,0 +1,75 @@
+# Generated by Django 5.2.10 on 2026-10-18 21:36
+
+from django.db import migrations, models
+
+
+def backfill_daily_stats(apps, schema_editor):
+    from admin_panel.rollups import rebuild
+    rebuild(apps)
+
+
+def backfill_sales(apps, schema_editor):
+    from admin_panel.rollups import rebuild_sales
+    rebuild_sales(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0003_customer_stats'),
+        ('products', '0012_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='dailysales',
+            options={'ordering': ['date', 'shard'], 'verbose_name_plural': 'Daily sales'},
+        ),
+        migrations.AlterModelOptions(
+            name='dailystats',
+            options={'ordering': ['date', 'shard'], 'verbose_name_plural': 'Daily stats'},
+        ),
+        migrations.AlterUniqueTogether(
+            name='salesfact',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='salesfact',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='dailysales',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='dailystats',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysales',
+            unique_together={('date', 'shard')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailystats',
+            unique_together={('date', 'shard')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='salesfact',
+            unique_together={('date', 'product', 'shard')},
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,95 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class DailyStats(models.Model):
+    """
+    Net change of the dashboard counters on one day.
+
+    Maintained incrementally by ``admin_panel.signals`` and rebuilt from
+    scratch by ``manage.py rebuild_daily_stats``; summing every row gives
+    the current totals, so the dashboard never scans orders or users.  A
+    day may be split over several shard rows (see ``admin_panel.rollups``).
+    """
+    date = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    users = models.IntegerField(default=0)
+    # Paid revenue booked (or refunded) on this day
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Orders entering minus orders leaving the pending/processing statuses
+    pending_orders = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_stats'
+        ordering = ['date', 'shard']
+        unique_together = ('date', 'shard')
+        verbose_name_plural = 'Daily stats'
+
+    def __str__(self):
+        return f'Stats for {self.date}'
+
+
+class DailySales(models.Model):
+    """Sales of one day: paid, uncancelled orders placed that day (see ``admin_panel.rollups``)."""
+    date = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_sales'
+        ordering = ['date', 'shard']
+        unique_together = ('date', 'shard')
+        verbose_name_plural = 'Daily sales'
+
+    def __str__(self):
+        return f'Sales for {self.date}'
+
+
+class SalesFact(models.Model):
+    """One product's share of a day's sales; ``orders`` counts orders containing it."""
+    date = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    product = models.ForeignKey('products.Product', related_name='sales_facts', on_delete=models.CASCADE)
+    # The product's category when the row was first booked
+    category = models.ForeignKey('products.Category', related_name='sales_facts', on_delete=models.CASCADE)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'sales_facts'
+        unique_together = ('date', 'product', 'shard')
+        indexes = [models.Index(fields=['date', 'category'], name='sales_fact_date_category_idx')]
+
+    def __str__(self):
+        return f'Sales of {self.product_id} on {self.date}'
+
+
+class CustomerStats(models.Model):
+    """
+    Lifetime order totals of one user, maintained by ``admin_panel.signals``
+    and rebuilt by ``manage.py rebuild_customer_stats``; the admin user list
+    reads and sorts on these instead of aggregating every user's orders.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, primary_key=True, related_name='customer_stats', on_delete=models.CASCADE
+    )
+    order_count = models.IntegerField(default=0)
+    # Total of the user's paid orders
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_order_at = models.DateTimeField(null=True, blank=True)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'customer_stats'
+        verbose_name_plural = 'Customer stats'
+        indexes = [
+            models.Index(fields=['-total_spent', '-user'], name='customer_stats_spent_idx'),
+            models.Index(fields=['-order_count', '-user'], name='customer_stats_orders_idx'),
+        ]
+
+    def __str__(self):
+        return f'Stats for user {self.user_id}'
@@ -0,0 +1,322 @@
+"""
+Incremental dashboard rollups.
+
+Every order, payment and user change adds its net effect to today's
+DailyStats row with an ``F()`` update in the same transaction, so the
+rollup commits or rolls back with the change itself.  Each day is split
+over ROLLUP_SHARDS rows and an order or user always books into the shard
+its id picks (``shard_of``), so concurrent checkouts lock different rows
+instead of queueing on one until they commit; readers sum the shards.
+
+Sales rollups (DailySales, and SalesFact per day and product) count the
+orders that are paid and not cancelled, on the day they were placed: an
+order is booked when it becomes paid and unbooked again when it is
+refunded, cancelled or deleted, so past days reflect refunds.
+
+CustomerStats keeps each user's order count, paid spend and first/last
+order time the same way, updated with the order that changes them.
+"""
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DateField, DecimalField, ExpressionWrapper, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, Mod, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import CustomerStats, DailySales, DailyStats, SalesFact
+
+
+PENDING_STATUSES = ('pending', 'processing')
+LINE_REVENUE = ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def shard_of(pk):
+    """The rollup shard an order or user with this id books into."""
+    return pk % settings.ROLLUP_SHARDS
+
+
+def _add(model, day, shard, deltas):
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    if not model.objects.filter(date=day, shard=shard).update(**updates):
+        model.objects.get_or_create(date=day, shard=shard)
+        model.objects.filter(date=day, shard=shard).update(**updates)
+
+
+def record(day=None, shard=0, **deltas):
+    """Add ``deltas`` (counter name -> change) to one shard of ``day``'s row (default today)."""
+    _add(DailyStats, day or timezone.localdate(), shard, deltas)
+
+
+def order_contribution(status, payment_status, total_amount):
+    """What one order in this state adds to the running totals."""
+    return {
+        'orders': 1,
+        'revenue': total_amount if payment_status == 'paid' else 0,
+        'pending_orders': 1 if status in PENDING_STATUSES else 0,
+    }
+
+
+def counts_as_sale(status, payment_status):
+    return payment_status == 'paid' and status != 'cancelled'
+
+
+def book_sale(order, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) ``order``'s items from the sales rollups."""
+    book_sales([order.pk], sign)
+
+
+def book_sales(order_ids, sign=1):
+    """``book_sale`` for many orders at once, grouped by the day each was placed and its shard."""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    shard = Mod('id', settings.ROLLUP_SHARDS)
+    per_day = {
+        (row['day'], row['shard']): {'orders': sign * row['orders'], 'units': 0, 'revenue': 0}
+        for row in Order.objects.filter(pk__in=order_ids).order_by()
+        .annotate(day=TruncDate('created_at'), shard=shard).values('day', 'shard').annotate(orders=Count('id'))
+    }
+    lines = list(
+        OrderItem.objects.filter(order_id__in=order_ids).order_by()
+        .annotate(day=TruncDate('order__created_at'), shard=Mod('order_id', settings.ROLLUP_SHARDS))
+        .values('day', 'shard', 'product_id', 'product__category_id')
+        .annotate(orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum(LINE_REVENUE))
+    )
+    for line in lines:
+        per_day[line['day'], line['shard']]['units'] += sign * line['units']
+        per_day[line['day'], line['shard']]['revenue'] += sign * line['revenue']
+    for (day, shard), deltas in per_day.items():
+        _add(DailySales, day, shard, deltas)
+    days = {day for day, _ in per_day}
+    if sign < 0:
+        # Unbooked to nothing: drop the rows, as a rebuild would not have them
+        _delete_empty(DailySales, [{'date': day, 'shard': shard} for day, shard in per_day])
+    if not lines:
+        return
+    SalesFact.objects.bulk_create([
+        SalesFact(
+            date=line['day'], shard=line['shard'],
+            product_id=line['product_id'], category_id=line['product__category_id'],
+        )
+        for line in lines
+    ], ignore_conflicts=True)
+
+    def per_fact(field):
+        return Case(
+            *[
+                When(
+                    date=line['day'], shard=line['shard'], product_id=line['product_id'],
+                    then=F(field) + sign * line[field],
+                )
+                for line in lines
+            ],
+            default=F(field),
+        )
+    SalesFact.objects.filter(
+        date__in=days, shard__in={line['shard'] for line in lines},
+        product_id__in={line['product_id'] for line in lines},
+    ).update(orders=per_fact('orders'), units=per_fact('units'), revenue=per_fact('revenue'))
+    if sign < 0:
+        _delete_empty(SalesFact, [
+            {'date': line['day'], 'shard': line['shard'], 'product_id': line['product_id']} for line in lines
+        ])
+
+
+def _delete_empty(model, keys):
+    """Delete the sales rows at ``keys`` (field -> value dicts) that no longer count anything."""
+    touched = Q()
+    for key in keys:
+        touched |= Q(**key)
+    model.objects.filter(touched, orders=0, units=0, revenue=0).delete()
+
+
+def record_customer(user_id, orders=0, spent=0, placed_at=None):
+    """
+    Add an order count and paid spend change to ``user_id``'s stats, widening
+    the first/last order range to ``placed_at`` when given.
+    """
+    updates = {}
+    if orders:
+        updates['order_count'] = F('order_count') + orders
+    if spent:
+        updates['total_spent'] = F('total_spent') + spent
+    if placed_at is not None:
+        # LEAST/GREATEST of NULL differ by database; Coalesce covers a first order
+        updates['first_order_at'] = Coalesce(Least('first_order_at', Value(placed_at)), Value(placed_at))
+        updates['last_order_at'] = Coalesce(Greatest('last_order_at', Value(placed_at)), Value(placed_at))
+    if updates:
+        CustomerStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def record_customer_spend(spent_by_user):
+    """Add paid spend changes (user id -> amount) to many users' stats in one update."""
+    spent_by_user = {user_id: spent for user_id, spent in spent_by_user.items() if spent}
+    if not spent_by_user:
+        return
+    CustomerStats.objects.filter(user_id__in=spent_by_user).update(total_spent=Case(
+        *[When(user_id=user_id, then=F('total_spent') + spent) for user_id, spent in spent_by_user.items()],
+        default=F('total_spent'),
+    ))
+
+
+def reset_customer_range(user_id):
+    """Recompute ``user_id``'s first/last order times after an order is deleted."""
+    span = Order.objects.filter(user_id=user_id).aggregate(first=Min('created_at'), last=Max('created_at'))
+    CustomerStats.objects.filter(user_id=user_id).update(first_order_at=span['first'], last_order_at=span['last'])
+
+
+def totals():
+    """Current dashboard counters, summed over every day and shard in one query."""
+    return DailyStats.objects.aggregate(
+        total_orders=Coalesce(Sum('orders'), 0),
+        total_users=Coalesce(Sum('users'), 0),
+        total_revenue=Coalesce(Sum('revenue'), Value(0), output_field=DecimalField()),
+        pending_orders=Coalesce(Sum('pending_orders'), 0),
+    )
+
+
+def rebuild(apps=global_apps):
+    """
+    Recompute every row from orders and users; returns the number of days.
+
+    Each order and user lands in its ``shard_of`` row, as when booked
+    incrementally.  ``apps`` is the model registry, so a migration can
+    backfill with its historical models.
+    """
+    Order = apps.get_model('orders', 'Order')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    DailyStats = apps.get_model('admin_panel', 'DailyStats')
+    shard = Mod('id', settings.ROLLUP_SHARDS)
+    rows = {}
+
+    def add(grouped, **fields):
+        for row in grouped:
+            entry = rows.setdefault(
+                (row['day'], row['shard']), DailyStats(date=row['day'], shard=row['shard'])
+            )
+            for name, key in fields.items():
+                setattr(entry, name, getattr(entry, name) + (row[key] or 0))
+
+    created_day = TruncDate('created_at')
+    add(
+        Order.objects.order_by().annotate(day=created_day, shard=shard).values('day', 'shard').annotate(
+            count=Count('id'), pending=Count('id', filter=Q(status__in=PENDING_STATUSES))
+        ),
+        orders='count', pending_orders='pending',
+    )
+    add(
+        Order.objects.filter(payment_status='paid').order_by()
+        .annotate(day=TruncDate(Coalesce('paid_at', 'created_at')), shard=shard).values('day', 'shard')
+        .annotate(revenue=Sum('total_amount')),
+        revenue='revenue',
+    )
+    add(
+        User.objects.filter(is_superuser=False).order_by()
+        .annotate(day=TruncDate('date_joined'), shard=shard).values('day', 'shard').annotate(count=Count('id')),
+        users='count',
+    )
+    with transaction.atomic():
+        DailyStats.objects.all().delete()
+        DailyStats.objects.bulk_create(rows.values())
+    return len({day for day, _ in rows})
+
+
+def rebuild_sales(apps=global_apps):
+    """Recompute the sales rollups from paid, uncancelled orders; returns the number of days."""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySales = apps.get_model('admin_panel', 'DailySales')
+    SalesFact = apps.get_model('admin_panel', 'SalesFact')
+
+    sold = OrderItem.objects.filter(order__payment_status='paid').exclude(order__status='cancelled').order_by()
+    # Each order in the shard book_sales puts it in, so unbooking it later empties that row
+    sold = sold.annotate(day=TruncDate('order__created_at'), shard=Mod('order_id', settings.ROLLUP_SHARDS))
+    days = [
+        DailySales(
+            date=row['day'], shard=row['shard'], orders=row['orders'], units=row['units'], revenue=row['revenue']
+        )
+        for row in sold.values('day', 'shard').annotate(
+            orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum(LINE_REVENUE)
+        )
+    ]
+    facts = [
+        SalesFact(
+            date=row['day'], shard=row['shard'], product_id=row['product_id'],
+            category_id=row['product__category_id'],
+            orders=row['orders'], units=row['units'], revenue=row['revenue'],
+        )
+        for row in sold.values('day', 'shard', 'product_id', 'product__category_id').annotate(
+            orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=Sum(LINE_REVENUE)
+        )
+    ]
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        SalesFact.objects.all().delete()
+        DailySales.objects.bulk_create(days)
+        SalesFact.objects.bulk_create(facts, batch_size=1000)
+    return len({row.date for row in days})
+
+
+def rebuild_customer_stats(apps=global_apps, batch_size=1000):
+    """Recompute every user's stats from their orders; returns the number of users."""
+    Order = apps.get_model('orders', 'Order')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    CustomerStats = apps.get_model('admin_panel', 'CustomerStats')
+
+    per_user = {
+        row['user_id']: row
+        for row in Order.objects.order_by().values('user_id').annotate(
+            count=Count('id'),
+            spent=Sum('total_amount', filter=Q(payment_status='paid')),
+            first=Min('created_at'),
+            last=Max('created_at'),
+        )
+    }
+    rows = []
+    for user_id in User.objects.values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        row = per_user.get(user_id, {})
+        rows.append(CustomerStats(
+            user_id=user_id,
+            order_count=row.get('count', 0),
+            total_spent=row.get('spent') or 0,
+            first_order_at=row.get('first'),
+            last_order_at=row.get('last'),
+        ))
+    with transaction.atomic():
+        CustomerStats.objects.all().delete()
+        CustomerStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+GRANULARITIES = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def sales_report(start, end, granularity='day', top=5):
+    """Sales between ``start`` and ``end`` (inclusive), read only from the rollups."""
+    trunc = GRANULARITIES[granularity]
+    period = trunc('date', output_field=DateField()) if trunc else F('date')
+    days = DailySales.objects.filter(date__range=(start, end)).order_by()
+    facts = SalesFact.objects.filter(date__range=(start, end)).order_by()
+    return {
+        'sales': list(
+            days.annotate(period=period).values('period')
+            .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue')).order_by('period')
+        ),
+        'top_products': list(
+            facts.values('product__id', 'product__name')
+            .annotate(total_quantity=Sum('units'), total_revenue=Sum('revenue'))
+            .order_by('-total_quantity', 'product__id')[:top]
+        ),
+        'categories': list(
+            facts.values('category__id', 'category__name')
+            .annotate(total_quantity=Sum('units'), total_revenue=Sum('revenue'))
+            .order_by('-total_revenue', 'category__id')
+        ),
+    }
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from products.models import Product, Category
+from products.serializers import ConsolidatedStockMixin
 from orders.models import Order, OrderItem
+from .bulk_updates import BULK_LIMIT
 
 User = get_user_model()
 
@@ -16,7 +18,7 @@ class AdminDashboardStatsSerializer(serializers.Serializer):
     pending_orders = serializers.IntegerField()
 
 
-class AdminProductSerializer(serializers.ModelSerializer):
+class AdminProductSerializer(ConsolidatedStockMixin, serializers.ModelSerializer):
     """Serializer for product management"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     
@@ -24,59 +26,94 @@ class AdminProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = [
             'id', 'name', 'description', 'price', 'image', 
-            'stock', 'category', 'category_name', 'is_available',
+            'stock', 'stock_shards', 'category', 'category_name', 'is_available',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['stock_shards', 'created_at', 'updated_at']
 
 
 class AdminUserSerializer(serializers.ModelSerializer):
     """Serializer for user management"""
     total_orders = serializers.IntegerField(read_only=True)
-    total_spent = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    total_spent = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    first_order_at = serializers.DateTimeField(read_only=True)
+    last_order_at = serializers.DateTimeField(read_only=True)
     
     class Meta:
         model = User
         fields = [
             'id', 'email', 'username', 'first_name', 'last_name',
             'phone', 'is_active', 'is_staff', 'is_superuser',
-            'date_joined', 'last_login', 'total_orders', 'total_spent'
+            'date_joined', 'last_login', 'total_orders', 'total_spent',
+            'first_order_at', 'last_order_at'
         ]
         read_only_fields = ['date_joined', 'last_login']
 
 
 class AdminOrderItemSerializer(serializers.ModelSerializer):
     """Serializer for order items in admin panel"""
-    product_name = serializers.CharField(source='product.name', read_only=True)
-    product_image = serializers.ImageField(source='product.image', read_only=True)
-    
+
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'product_name', 'product_image', 'quantity', 'price']
+        fields = ['id', 'product', 'product_name', 'product_slug', 'product_image', 'quantity', 'price']
+        read_only_fields = ['product_name', 'product_slug', 'product_image']
 
 
-class AdminOrderSerializer(serializers.ModelSerializer):
-    """Serializer for order management"""
+class AdminOrderListSerializer(serializers.ModelSerializer):
+    """Serializer for the admin orders grid: no items, just their stored count"""
     user_email = serializers.CharField(source='user.email', read_only=True)
     user_name = serializers.SerializerMethodField()
-    items = AdminOrderItemSerializer(many=True, read_only=True)
-    items_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Order
         fields = [
             'id', 'order_number', 'user', 'user_email', 'user_name',
             'status', 'payment_method', 'payment_status', 'total_amount',
-            'shipping_address', 'shipping_city', 'shipping_state',
-            'shipping_pincode', 'shipping_phone', 'items', 'items_count',
-            'created_at', 'updated_at'
+            'items_count', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'order_number', 'status', 'payment_status', 'items_count', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['order_number', 'created_at', 'updated_at']
     
     def get_user_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}".strip() or obj.user.username
 
 
+class AdminOrderSerializer(AdminOrderListSerializer):
+    """Serializer for order management"""
+    items = AdminOrderItemSerializer(many=True, read_only=True)
+    
+    class Meta(AdminOrderListSerializer.Meta):
+        fields = [
+            'id', 'order_number', 'user', 'user_email', 'user_name',
+            'status', 'payment_method', 'payment_status', 'total_amount',
+            'shipping_address', 'shipping_city', 'shipping_state',
+            'shipping_pincode', 'shipping_phone', 'items', 'items_count',
+            'created_at', 'updated_at'
+        ]
+
+
+
+class BulkOrderSelectionSerializer(serializers.Serializer):
+    """The orders a bulk update applies to: explicit ``ids`` or a list ``filter``"""
+    FILTER_KEYS = ('status', 'payment_status', 'search', 'start_date', 'end_date')
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_LIMIT, required=False
+    )
+    filter = serializers.DictField(child=serializers.CharField(), allow_empty=False, required=False)
+    
+    def validate_filter(self, value):
+        unknown = set(value) - set(self.FILTER_KEYS)
+        if unknown:
+            raise serializers.ValidationError(f'Unknown filter keys: {", ".join(sorted(unknown))}')
+        return value
+    
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Give either ids or filter')
+        return attrs
+
 class AdminCategorySerializer(serializers.ModelSerializer):
     """Serializer for category management"""
     products_count = serializers.IntegerField(read_only=True)
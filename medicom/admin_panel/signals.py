@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from orders.models import Order
+from . import rollups
+from .models import CustomerStats
+
+
+User = get_user_model()
+
+ORDER_FIELDS = {'status', 'payment_status', 'total_amount', 'is_paid'}
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order_state(sender, instance, update_fields=None, **kwargs):
+    """Capture the stored state so a save only books its difference."""
+    instance._previous_rollup_state = None
+    if update_fields is not None and not ORDER_FIELDS.intersection(update_fields):
+        instance._previous_rollup_state = False  # nothing the rollups count changes
+    elif not instance._state.adding and instance.pk:
+        instance._previous_rollup_state = (
+            Order.objects.filter(pk=instance.pk)
+            .values_list('status', 'payment_status', 'total_amount')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def book_order_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rollup_state', None)
+    if previous is False:
+        return
+    current = rollups.order_contribution(instance.status, instance.payment_status, instance.total_amount)
+    if previous is not None:
+        before = rollups.order_contribution(*previous)
+        current = {name: value - before[name] for name, value in current.items()}
+    rollups.record(shard=rollups.shard_of(instance.pk), **current)
+    rollups.record_customer(
+        instance.user_id, orders=current['orders'], spent=current['revenue'],
+        placed_at=instance.created_at if created else None,
+    )
+
+    was_sale = previous is not None and rollups.counts_as_sale(*previous[:2])
+    is_sale = rollups.counts_as_sale(instance.status, instance.payment_status)
+    if was_sale != is_sale:
+        rollups.book_sale(instance, 1 if is_sale else -1)
+
+
+@receiver(pre_delete, sender=Order)
+def unbook_order_sale(sender, instance, **kwargs):
+    # Before the delete, while the order's items still exist
+    if rollups.counts_as_sale(instance.status, instance.payment_status):
+        rollups.book_sale(instance, -1)
+
+
+@receiver(post_delete, sender=Order)
+def unbook_order(sender, instance, **kwargs):
+    contribution = rollups.order_contribution(instance.status, instance.payment_status, instance.total_amount)
+    rollups.record(shard=rollups.shard_of(instance.pk), **{name: -value for name, value in contribution.items()})
+    rollups.record_customer(instance.user_id, orders=-1, spent=-contribution['revenue'])
+    rollups.reset_customer_range(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_superuser_flag(sender, instance, update_fields=None, **kwargs):
+    instance._was_superuser = None
+    if update_fields is not None and 'is_superuser' not in update_fields:
+        instance._was_superuser = instance.is_superuser
+    elif not instance._state.adding and instance.pk:
+        instance._was_superuser = User.objects.filter(pk=instance.pk).values_list('is_superuser', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def book_user_change(sender, instance, created, **kwargs):
+    # Superusers are not counted as customers
+    was_counted = not created and getattr(instance, '_was_superuser', None) is False
+    rollups.record(shard=rollups.shard_of(instance.pk), users=int(not instance.is_superuser) - int(was_counted))
+    if created:
+        CustomerStats.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=User)
+def unbook_user(sender, instance, **kwargs):
+    if not instance.is_superuser:
+        rollups.record(shard=rollups.shard_of(instance.pk), users=-1)
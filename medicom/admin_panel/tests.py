@@ -1,13 +1,46 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from products.models import Product, Category
-from orders.models import Order
+from orders import search as order_search
+from orders.models import Order, OrderEvent, OrderItem
+from admin_panel import rollups
+from admin_panel.models import CustomerStats, DailySales, DailyStats, SalesFact
 
 User = get_user_model()
 
 
+def make_order(user, **fields):
+    """Create an order for user with placeholder shipping details"""
+    fields = {
+        'total_amount': 10, 'shipping_address': 'Street', 'shipping_city': 'City',
+        'shipping_country': 'India', 'shipping_postal_code': '000000', 'phone': '1', **fields
+    }
+    return Order.objects.create(user=user, **fields)
+
+
+class AdminAPITestCase(TestCase):
+    """Base for test cases that call the admin API as a superuser"""
+    
+    def setUp(self):
+        """Set up an admin and authenticate the client as them"""
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            email='admin@test.com',
+            username='admin',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin_user)
+
+
 class AdminPanelTestCase(TestCase):
     """Test cases for admin panel"""
     
@@ -184,4 +217,600 @@ class AdminPanelTestCase(TestCase):
         response = self.client.post(
             f'/api/admin-panel/users/{self.admin_user.id}/toggle_active/'
         )
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_users_cursor_pagination(self):
+        """Test keyset pagination on the users list"""
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get('/api/admin-panel/users/', {'cursor': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [self.regular_user.id, self.admin_user.id]
+        )
+    
+    def test_shard_and_update_stock(self):
+        """Test that sharded stock is edited and reported as one total"""
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            f'/api/admin-panel/products/{self.product.id}/shard_stock/', {'shards': 4}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['stock'], response.data['stock_shards']), (50, 4))
+
+        response = self.client.post(
+            f'/api/admin-panel/products/{self.product.id}/update_stock/', {'stock': 7}
+        )
+        self.assertEqual(response.data['stock'], 7)
+        self.assertEqual(self.product.shards.count(), 4)
+
+        response = self.client.post(
+            f'/api/admin-panel/products/{self.product.id}/shard_stock/', {'shards': 0}
+        )
+        self.assertEqual((response.data['stock'], response.data['stock_shards']), (7, 0))
+
+
+class DashboardStatsTestCase(AdminAPITestCase):
+    """Test cases for the rolled-up dashboard statistics"""
+    
+    def setUp(self):
+        """Set up an admin, a customer and one product"""
+        super().setUp()
+        self.customer = User.objects.create_user(
+            email='customer@test.com',
+            username='customer',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category')
+        Product.objects.create(
+            name='Test Product', description='Test', price=100, stock=5, category=category
+        )
+    
+    def order(self, amount):
+        return make_order(self.customer, total_amount=amount)
+    
+    def stats(self):
+        response = self.client.get('/api/admin-panel/dashboard/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_stats_follow_order_lifecycle(self):
+        """Test that placing, paying, shipping, refunding and deleting orders update the counters"""
+        first = self.order(250)
+        second = self.order(100)
+        first.payment_status = 'paid'
+        first.save()
+        second.status = 'shipped'
+        second.save()
+        self.assertEqual(self.stats(), {
+            'total_products': 1,
+            'total_orders': 2,
+            'total_users': 1,
+            'total_revenue': 250.0,
+            'low_stock_products': 1,
+            'pending_orders': 1,
+        })
+        
+        first.payment_status = 'refunded'
+        first.status = 'cancelled'
+        first.save()
+        second.delete()
+        data = self.stats()
+        self.assertEqual(
+            (data['total_orders'], data['total_revenue'], data['pending_orders']), (1, 0.0, 0)
+        )
+    
+    def test_stats_use_two_queries(self):
+        """Test that the dashboard cost does not grow with order history"""
+        for _ in range(5):
+            self.order(10)
+        with self.assertNumQueries(2):
+            self.client.get('/api/admin-panel/dashboard/stats/')
+    
+    @override_settings(ROLLUP_SHARDS=4)
+    def test_orders_book_into_their_shard(self):
+        """Test that orders book into their own shard of today's row and the totals sum the shards"""
+        orders = [self.order(100) for _ in range(4)]
+        orders[0].payment_status = 'paid'
+        orders[0].save()
+        orders[1].delete()
+        
+        shards = dict(DailyStats.objects.filter(orders__gt=0).values_list('shard', 'orders'))
+        self.assertEqual(shards, {rollups.shard_of(order.pk): 1 for order in (orders[0], orders[2], orders[3])})
+        self.assertEqual(DailyStats.objects.get(shard=rollups.shard_of(orders[0].pk)).revenue, 100)
+        data = self.stats()
+        self.assertEqual((data['total_orders'], data['total_revenue']), (3, 100.0))
+    
+    def test_rebuild_matches_incremental_counters(self):
+        """Test that rebuilding the rollups reproduces the maintained totals"""
+        paid = self.order(300)
+        paid.is_paid = True
+        paid.save()
+        self.order(50)
+        before = self.stats()
+        
+        def shards():
+            return list(
+                DailyStats.objects.exclude(orders=0, users=0, revenue=0, pending_orders=0)
+                .values_list('date', 'shard', 'orders', 'users', 'revenue', 'pending_orders')
+            )
+        booked = shards()
+        DailyStats.objects.all().delete()
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        self.assertEqual(self.stats(), before)
+        self.assertEqual(shards(), booked)
+
+
+class SalesAnalyticsTestCase(AdminAPITestCase):
+    """Test cases for the sales rollups behind sales analytics"""
+    
+    def setUp(self):
+        """Set up an admin, a customer and products in two categories"""
+        super().setUp()
+        self.customer = User.objects.create_user(
+            email='customer@test.com',
+            username='customer',
+            password='testpass123'
+        )
+        self.medicines = Category.objects.create(name='Medicines')
+        self.devices = Category.objects.create(name='Devices')
+        self.tablet = Product.objects.create(
+            name='Tablet', description='Test', price=10, stock=100, category=self.medicines
+        )
+        self.syrup = Product.objects.create(
+            name='Syrup', description='Test', price=50, stock=100, category=self.medicines
+        )
+        self.monitor = Product.objects.create(
+            name='Monitor', description='Test', price=500, stock=100, category=self.devices
+        )
+    
+    def order(self, *lines, paid=True):
+        order = make_order(self.customer, total_amount=sum(product.price * quantity for product, quantity in lines))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for product, quantity in lines
+        ])
+        if paid:
+            order.payment_status = 'paid'
+            order.save()
+        return order
+    
+    def analytics(self, **params):
+        response = self.client.get('/api/admin-panel/dashboard/sales_analytics/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_paid_orders_are_booked(self):
+        """Test that only paid orders reach the rollups, per day, product and category"""
+        self.order((self.tablet, 3), (self.monitor, 1))
+        self.order((self.tablet, 2))
+        self.order((self.syrup, 5), paid=False)
+        
+        data = self.analytics()
+        today = date.today()
+        self.assertEqual(data['start'], today - timedelta(days=6))
+        self.assertEqual(data['sales'][-1], {'period': today, 'orders': 2, 'units': 6, 'revenue': 550})
+        self.assertEqual(
+            [(row['product__name'], row['total_quantity'], row['total_revenue']) for row in data['top_products']],
+            [('Tablet', 5, 50), ('Monitor', 1, 500)]
+        )
+        self.assertEqual(
+            [(row['category__name'], row['total_revenue']) for row in data['categories']],
+            [('Devices', 500), ('Medicines', 50)]
+        )
+        self.assertEqual(SalesFact.objects.filter(product=self.tablet).aggregate(orders=Sum('orders')), {'orders': 2})
+    
+    def test_refunds_and_cancellations_are_unbooked(self):
+        """Test that refunding, cancelling or deleting a paid order takes it back out"""
+        refunded = self.order((self.tablet, 1))
+        cancelled = self.order((self.syrup, 1))
+        deleted = self.order((self.monitor, 1))
+        kept = self.order((self.tablet, 4))
+        
+        refunded.payment_status = 'refunded'
+        refunded.save()
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        deleted.delete()
+        kept.status = 'shipped'
+        kept.save()
+        
+        self.assertEqual(
+            list(DailySales.objects.values_list('orders', 'units', 'revenue')), [(1, 4, 40)]
+        )
+        self.assertEqual(
+            list(SalesFact.objects.values_list('product__name', 'orders', 'units')),
+            [('Tablet', 1, 4)]
+        )
+    
+    @override_settings(ROLLUP_SHARDS=4)
+    def test_unbooking_after_rebuild_keeps_shard_neighbours(self):
+        """Test that unbooking a rebuilt order leaves the other orders booked in its shard"""
+        cancelled = self.order((self.syrup, 3))
+        rollups.rebuild_sales()
+        # Four consecutive ids: the last shares the cancelled order's shard
+        neighbour = [self.order((self.tablet, 2), paid=False) for _ in range(4)][-1]
+        self.assertEqual(rollups.shard_of(neighbour.pk), rollups.shard_of(cancelled.pk))
+        neighbour.payment_status = 'paid'
+        neighbour.save()
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        
+        self.assertEqual(
+            DailySales.objects.aggregate(Sum('orders'), Sum('units'), Sum('revenue')),
+            {'orders__sum': 1, 'units__sum': 2, 'revenue__sum': 20}
+        )
+        self.assertEqual(
+            list(SalesFact.objects.values_list('product__name', 'shard', 'orders', 'units')),
+            [('Tablet', rollups.shard_of(neighbour.pk), 1, 2)]
+        )
+    
+    def test_granularity(self):
+        """Test that days are grouped by week and month"""
+        today = date.today()
+        DailySales.objects.bulk_create([
+            DailySales(date=today - timedelta(days=offset), orders=1, units=2, revenue=10)
+            for offset in range(40)
+        ])
+        start = today - timedelta(days=39)
+        
+        weeks = self.analytics(start=start.isoformat(), end=today.isoformat(), granularity='week')['sales']
+        self.assertTrue(all(row['period'].weekday() == 0 for row in weeks))
+        self.assertEqual(sum(row['orders'] for row in weeks), 40)
+        
+        months = self.analytics(start=start.isoformat(), end=today.isoformat(), granularity='month')['sales']
+        self.assertTrue(all(row['period'].day == 1 for row in months))
+        self.assertEqual(sum(row['units'] for row in months), 80)
+        self.assertEqual(len(months), len({(row['period'].year, row['period'].month) for row in months}))
+    
+    def test_rebuild_matches_incremental_rollups(self):
+        """Test that rebuilding the sales rollups reproduces the maintained rows"""
+        self.order((self.tablet, 3), (self.monitor, 1))
+        refunded = self.order((self.syrup, 2))
+        self.order((self.tablet, 1))
+        refunded.payment_status = 'refunded'
+        refunded.save()
+        before = self.analytics()
+        
+        DailySales.objects.all().delete()
+        SalesFact.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.analytics(), before)
+    
+    def test_analytics_read_only_rollups(self):
+        """Test that the report costs the same queries however many orders exist"""
+        for _ in range(5):
+            self.order((self.tablet, 1), (self.syrup, 1))
+        with self.assertNumQueries(3):
+            self.client.get('/api/admin-panel/dashboard/sales_analytics/', {'granularity': 'month'})
+    
+    def test_invalid_parameters(self):
+        """Test that bad dates and granularities are rejected"""
+        for params in (
+            {'start': 'yesterday'},
+            {'start': '2026-02-01', 'end': '2026-01-01'},
+            {'granularity': 'year'},
+        ):
+            response = self.client.get('/api/admin-panel/dashboard/sales_analytics/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CustomerStatsTestCase(AdminAPITestCase):
+    """Test cases for the per-customer stats behind the admin user list"""
+    
+    def setUp(self):
+        """Set up an admin and two customers"""
+        super().setUp()
+        self.alice = User.objects.create_user(email='alice@test.com', username='alice', password='testpass123')
+        self.bob = User.objects.create_user(email='bob@test.com', username='bob', password='testpass123')
+    
+    def order(self, user, amount, paid=False):
+        order = make_order(user, total_amount=amount)
+        if paid:
+            order.payment_status = 'paid'
+            order.save()
+        return order
+    
+    def users(self, **params):
+        response = self.client.get('/api/admin-panel/users/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+    
+    def test_stats_follow_orders(self):
+        """Test that placing, paying, refunding and deleting orders update the customer's stats"""
+        first = self.order(self.alice, 100, paid=True)
+        second = self.order(self.alice, 40)
+        third = self.order(self.alice, 60, paid=True)
+        third.payment_status = 'refunded'
+        third.save()
+        
+        stats = CustomerStats.objects.get(user=self.alice)
+        self.assertEqual((stats.order_count, stats.total_spent), (3, 100))
+        self.assertEqual((stats.first_order_at, stats.last_order_at), (first.created_at, third.created_at))
+        
+        third.delete()
+        first.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.order_count, stats.total_spent), (1, 0))
+        self.assertEqual((stats.first_order_at, stats.last_order_at), (second.created_at, second.created_at))
+    
+    def test_user_list_sorts_by_spend(self):
+        """Test that the user list reports and sorts on the stored totals"""
+        self.order(self.alice, 50, paid=True)
+        self.order(self.bob, 300, paid=True)
+        self.order(self.bob, 20)
+        
+        rows = self.users(ordering='-total_spent')
+        self.assertEqual([row['email'] for row in rows], ['bob@test.com', 'alice@test.com', 'admin@test.com'])
+        self.assertEqual((rows[0]['total_orders'], float(rows[0]['total_spent'])), (2, 300.0))
+        self.assertIsNone(rows[2]['last_order_at'])
+        
+        rows = self.users(ordering='total_orders')
+        self.assertEqual(rows[0]['email'], 'admin@test.com')
+    
+    def test_user_list_does_not_touch_orders(self):
+        """Test that the list costs the same queries however many orders exist"""
+        for _ in range(5):
+            self.order(self.alice, 10, paid=True)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/admin-panel/users/', {'ordering': '-total_spent'})
+        self.assertFalse(any('"orders_order"' in query['sql'] for query in queries.captured_queries))
+    
+    def test_rebuild_matches_incremental_stats(self):
+        """Test that rebuilding the customer stats reproduces the maintained rows"""
+        self.order(self.alice, 80, paid=True)
+        self.order(self.alice, 15)
+        self.order(self.bob, 25, paid=True).delete()
+        fields = ('user', 'order_count', 'total_spent', 'first_order_at', 'last_order_at')
+        before = list(CustomerStats.objects.order_by('user').values_list(*fields))
+        
+        CustomerStats.objects.all().delete()
+        call_command('rebuild_customer_stats', stdout=StringIO())
+        self.assertEqual(list(CustomerStats.objects.order_by('user').values_list(*fields)), before)
+
+
+class AdminOrderViewTestCase(AdminAPITestCase):
+    """Test cases for the admin order list and detail representations"""
+    
+    def setUp(self):
+        """Set up an admin and a few multi-line orders"""
+        super().setUp()
+        self.customer = User.objects.create_user(
+            email='customer@test.com',
+            username='customer',
+            password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category')
+        self.products = [
+            Product.objects.create(name=f'Product {i}', description='Test', price=10, stock=50, category=category)
+            for i in range(3)
+        ]
+        self.orders = []
+        for lines in range(1, 4):
+            order = make_order(self.customer, total_amount=10 * lines)
+            for product in self.products[:lines]:
+                OrderItem.objects.create(
+                    order=order, product=product, quantity=1, price=10, **OrderItem.snapshot(product)
+                )
+            self.orders.append(order)
+    
+    def test_list_omits_items(self):
+        """Test that the grid reports the stored line count without item rows"""
+        response = self.client.get('/api/admin-panel/orders/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['items_count'] for row in response.data['results']], [3, 2, 1])
+        self.assertNotIn('items', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['user_email'], 'customer@test.com')
+    
+    def test_retrieve_includes_items(self):
+        """Test that a single order carries its full item breakdown"""
+        response = self.client.get(f'/api/admin-panel/orders/{self.orders[2].id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items_count'], 3)
+        self.assertEqual(
+            [item['product_name'] for item in response.data['items']], ['Product 0', 'Product 1', 'Product 2']
+        )
+    
+    def test_items_count_follows_item_changes(self):
+        """Test that adding and removing lines keeps the stored count right"""
+        order = self.orders[0]
+        order.items.get().delete()
+        order.refresh_from_db()
+        self.assertEqual(order.items_count, 0)
+    
+    def test_list_query_budget(self):
+        """Test that the list costs a count and one page query, however many items"""
+        with self.assertNumQueries(2):
+            self.client.get('/api/admin-panel/orders/')
+        with self.assertNumQueries(1):
+            self.client.get('/api/admin-panel/orders/', {'cursor': ''})
+    
+    def test_retrieve_query_budget(self):
+        """Test that the detail costs the order (with its user) and one items query"""
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/admin-panel/orders/{self.orders[2].id}/')
+
+
+class OrderSearchTestCase(AdminAPITestCase):
+    """Test cases for support order search"""
+    
+    def setUp(self):
+        """Set up an admin and orders for two customers"""
+        super().setUp()
+        asha = User.objects.create_user(email='Asha.Rao@Example.com', username='asha', password='testpass123')
+        ravi = User.objects.create_user(email='ravi@example.com', username='ravi', password='testpass123')
+        self.asha_order = self.order(asha, 'ORD-20261001-A1B2C3D4', '9845012345', '560001')
+        self.ravi_order = self.order(ravi, 'ORD-20261015-12345678', '7012345678', '110001')
+    
+    def order(self, user, number, phone, postal_code):
+        return make_order(user, order_number=number, phone=phone, shipping_postal_code=postal_code)
+    
+    def found(self, query):
+        response = self.client.get('/api/admin-panel/orders/', {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {row['order_number'] for row in response.data['results']}
+    
+    def test_query_shapes(self):
+        """Test that each query shape is looked up in the right column"""
+        asha, ravi = self.asha_order.order_number, self.ravi_order.order_number
+        cases = {
+            'ORD-20261001-A1B2C3D4': {asha},
+            'ord-202610': {asha, ravi},
+            'ORD-20261015': {ravi},
+            'a1b2': {asha},
+            '123456': {ravi},
+            '560001': {asha},
+            '98450 12345': {asha},
+            '701-2345': {ravi},
+            'ASHA.RAO@EXAMPLE.COM': {asha},
+            'ravi': {ravi},
+            'nobody@example.com': set(),
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), expected)
+    
+    def test_formatted_phones(self):
+        """Test that phones match on their digits however the order and the query wrote them"""
+        formatted = self.order(self.asha_order.user, 'ORD-20261020-0F0F0F0F', '+91 98450 12345', '560002')
+        self.asha_order.phone = '98450-12345'
+        self.asha_order.save(update_fields=['phone'])
+        self.asha_order.refresh_from_db()
+        self.assertEqual((formatted.phone_digits, self.asha_order.phone_digits), ('9845012345', '9845012345'))
+        
+        both = {formatted.order_number, self.asha_order.order_number}
+        for query in ('+91 98450 12345', '98450-12345', '9845012345', '0 98450 12', '(98450) 123'):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), both)
+    
+    def test_classify(self):
+        """Test the query shape recognized for typical support queries"""
+        self.assertEqual(order_search.classify(' ord-2026 '), ('order_number', 'ORD-2026'))
+        self.assertEqual(order_search.classify('c3d4e5'), ('suffix', 'C3D4E5'))
+        self.assertEqual(order_search.classify('560 001'), ('postal_code', '560001'))
+        self.assertEqual(order_search.classify('+91 98450-12345'), ('phone', '9845012345'))
+        self.assertEqual(order_search.classify('Asha'), ('email', 'asha'))
+        self.assertEqual(order_search.classify(''), (None, ''))
+
+
+class BulkOrderUpdateTestCase(AdminAPITestCase):
+    """Test cases for bulk order status and payment-status updates"""
+    
+    def setUp(self):
+        """Set up an admin, two customers and a product"""
+        super().setUp()
+        self.customers = [
+            User.objects.create_user(email=f'customer{i}@test.com', username=f'customer{i}', password='testpass123')
+            for i in range(2)
+        ]
+        category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            name='Test Product', description='Test', price=25, stock=100, category=category
+        )
+    
+    def order(self, customer=0, quantity=2, **fields):
+        order = make_order(self.customers[customer], total_amount=25 * quantity, **fields)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=25)
+        return order
+    
+    def bulk(self, action, body):
+        return self.client.post(f'/api/admin-panel/orders/{action}/', body, format='json')
+    
+    def test_status_outcomes_per_id(self):
+        """Test that each id reports whether it moved, was already there, was refused or is missing"""
+        pending = self.order()
+        processing = self.order(status='processing')
+        shipped = self.order(status='shipped')
+        delivered = self.order(status='delivered')
+        ids = [pending.id, processing.id, shipped.id, delivered.id, 999999]
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk('bulk_update_status', {'status': 'shipped', 'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([row['result'] for row in response.data['results']], [
+            'updated', 'updated', 'unchanged', 'rejected', 'not_found'
+        ])
+        self.assertEqual(response.data['results'][1]['previous'], 'processing')
+        order_updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(order_updates), 1)
+        self.assertEqual(
+            list(Order.objects.filter(pk__in=ids).order_by('pk').values_list('status', flat=True)),
+            ['shipped', 'shipped', 'shipped', 'delivered']
+        )
+    
+    def test_bulk_moves_are_logged(self):
+        """Test that a bulk move logs one event per moved order, timed from its last move"""
+        fresh = self.order()
+        moved = self.order()
+        self.client.post(f'/api/admin-panel/orders/{moved.id}/update_status/', {'status': 'processing'}, format='json')
+        first_move = OrderEvent.objects.get(order=moved)
+        self.bulk('bulk_update_status', {'status': 'shipped', 'ids': [fresh.id, moved.id, 999999]})
+        
+        events = OrderEvent.objects.filter(to_value='shipped').order_by('order_id')
+        self.assertEqual(
+            [(event.order_id, event.from_value, event.entered_at) for event in events],
+            [(fresh.id, 'pending', fresh.created_at), (moved.id, 'processing', first_move.created_at)]
+        )
+        self.assertTrue(all(event.actor_id == self.admin_user.id for event in events))
+    
+    def test_filter_selection(self):
+        """Test that a list filter selects the orders to move"""
+        first = self.order()
+        second = self.order(customer=1)
+        self.order(status='processing')
+        response = self.bulk('bulk_update_status', {'status': 'processing', 'filter': {'status': 'pending'}})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['id'], row['result']) for row in response.data['results']],
+            [(first.id, 'updated'), (second.id, 'updated')]
+        )
+    
+    def test_payment_updates_keep_rollups_consistent(self):
+        """Test that bulk payment and status changes book the same rollups a rebuild computes"""
+        orders = [self.order(), self.order(customer=1, quantity=4), self.order(customer=1)]
+        ids = [order.id for order in orders]
+        response = self.bulk('bulk_update_payment_status', {'payment_status': 'paid', 'ids': ids})
+        self.assertEqual(response.data['updated'], 3)
+        self.assertTrue(all(Order.objects.filter(pk__in=ids).values_list('is_paid', flat=True)))
+        self.bulk('bulk_update_payment_status', {'payment_status': 'refunded', 'ids': ids[:1]})
+        self.bulk('bulk_update_status', {'status': 'cancelled', 'ids': ids[2:]})
+        
+        customer = CustomerStats.objects.get(user=self.customers[1])
+        self.assertEqual(customer.total_spent, 150)
+        self.assertEqual(list(SalesFact.objects.values_list('orders', 'units', 'revenue')), [(1, 4, 100)])
+        
+        def snapshot():
+            return (
+                rollups.totals(),
+                list(CustomerStats.objects.order_by('user').values_list('user', 'order_count', 'total_spent')),
+                list(
+                    DailySales.objects.values('date').annotate(Sum('orders'), Sum('units'), Sum('revenue'))
+                    .values_list('date', 'orders__sum', 'units__sum', 'revenue__sum')
+                ),
+                list(
+                    SalesFact.objects.order_by('date', 'product').values('date', 'product')
+                    .annotate(Sum('orders'), Sum('units'), Sum('revenue'))
+                    .values_list('date', 'product', 'orders__sum', 'units__sum', 'revenue__sum')
+                ),
+            )
+        before = snapshot()
+        rollups.rebuild()
+        rollups.rebuild_sales()
+        rollups.rebuild_customer_stats()
+        self.assertEqual(snapshot(), before)
+    
+    def test_invalid_requests(self):
+        """Test that bad targets and selections are rejected"""
+        order = self.order()
+        for action, body in (
+            ('bulk_update_status', {'status': 'lost', 'ids': [order.id]}),
+            ('bulk_update_status', {'status': 'shipped'}),
+            ('bulk_update_status', {'status': 'shipped', 'ids': [order.id], 'filter': {'status': 'pending'}}),
+            ('bulk_update_status', {'status': 'shipped', 'filter': {'colour': 'red'}}),
+            ('bulk_update_payment_status', {'payment_status': 'pending', 'ids': [order.id]}),
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(self.bulk(action, body).status_code, status.HTTP_400_BAD_REQUEST)
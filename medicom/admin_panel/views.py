@@ -5,18 +5,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from rest_framework.request import Request
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum, Q, F, QuerySet
+from django.db.models import Count, F, Q, QuerySet
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 
 from products.models import Product, Category
-from orders.models import Order, OrderItem
+from products.cache import cache_stats
+from products.inventory import set_stock, shard_product, unshard_product
+from orders import search as order_search, transitions
+from orders.serializers import OrderTimelineSerializer
+from orders.models import Order
+from . import bulk_updates, rollups
 from .serializers import (
     AdminDashboardStatsSerializer,
     AdminProductSerializer,
     AdminUserSerializer,
+    AdminOrderListSerializer,
     AdminOrderSerializer,
-    AdminCategorySerializer
+    AdminCategorySerializer,
+    BulkOrderSelectionSerializer
 )
 
 User = get_user_model()
@@ -29,42 +36,22 @@ class AdminDashboardViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request: Request) -> Response:
         """Get dashboard statistics"""
-        # Total products
-        total_products = Product.objects.count()
+        # Order, revenue and user counters come from the daily rollups
+        data = rollups.totals()
         
-        # Total orders
-        total_orders = Order.objects.count()
+        # Product counters reflect current stock, in one conditional aggregate
+        data.update(Product.objects.with_stock().aggregate(
+            total_products=Count('id'),
+            low_stock_products=Count('id', filter=Q(stock_on_hand__lt=Product.LOW_STOCK_THRESHOLD)),
+        ))
         
-        # Total users (exclude superusers)
-        total_users = User.objects.filter(is_superuser=False).count()
-        
-        # Total revenue (from paid orders)
-        total_revenue = Order.objects.filter(
-            payment_status='paid'
-        ).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        # Low stock products (less than 10)
-        low_stock_products = Product.objects.filter(stock__lt=10).count()
-        
-        # Pending orders
-        pending_orders = Order.objects.filter(
-            status__in=['processing', 'pending']
-        ).count()
-        
-        data = {
-            'total_products': total_products,
-            'total_orders': total_orders,
-            'total_users': total_users,
-            'total_revenue': float(total_revenue),
-            'low_stock_products': low_stock_products,
-            'pending_orders': pending_orders
-        }
-        
-        serializer = AdminDashboardStatsSerializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.validated_data)
+        serializer = AdminDashboardStatsSerializer(data)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request: Request) -> Response:
+        """Get catalog response cache hit/miss counters"""
+        return Response(cache_stats())
     
     @action(detail=False, methods=['get'])
     def recent_orders(self, request: Request) -> Response:
@@ -75,36 +62,66 @@ class AdminDashboardViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def sales_analytics(self, request: Request) -> Response:
-        """Get sales analytics data"""
-        # Last 7 days sales
-        last_7_days = timezone.now() - timedelta(days=7)
-        daily_sales = Order.objects.filter(
-            created_at__gte=last_7_days,
-            payment_status='paid'
-        ).extra(
-            select={'day': 'date(created_at)'}
-        ).values('day').annotate(
-            total=Sum('total_amount'),
-            count=Count('id')
-        ).order_by('day')
-        
-        # Top selling products
-        top_products = OrderItem.objects.values(
-            'product__name', 'product__id'
-        ).annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum(F('quantity') * F('price'))
-        ).order_by('-total_quantity')[:5]
-        
+        """
+        Get sales analytics for ``start``..``end`` (ISO dates, default the
+        last 7 days) grouped by ``granularity`` (day, week or month).
+        Served entirely from the sales rollups.
+        """
+        try:
+            end = date.fromisoformat(request.query_params.get('end') or timezone.localdate().isoformat())
+            start = date.fromisoformat(request.query_params.get('start') or (end - timedelta(days=6)).isoformat())
+        except ValueError:
+            return Response({'error': 'start and end must be dates (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': 'start must not be after end'}, status=status.HTTP_400_BAD_REQUEST)
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in rollups.GRANULARITIES:
+            return Response(
+                {'error': f"granularity must be one of: {', '.join(rollups.GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         return Response({
-            'daily_sales': list(daily_sales),
-            'top_products': list(top_products)
+            'start': start,
+            'end': end,
+            'granularity': granularity,
+            **rollups.sales_report(start, end, granularity),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def fulfillment(self, request: Request) -> Response:
+        """
+        Get how long orders stayed in each ``field`` value (status or
+        payment_status) before moving on, for moves made ``start``..``end``
+        (ISO dates, default the last 30 days), with a duration histogram.
+        """
+        field = request.query_params.get('field', 'status')
+        if field not in transitions.GRAPHS:
+            return Response(
+                {'error': f"field must be one of: {', '.join(transitions.GRAPHS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            end = date.fromisoformat(request.query_params.get('end') or timezone.localdate().isoformat())
+            start = date.fromisoformat(request.query_params.get('start') or (end - timedelta(days=29)).isoformat())
+        except ValueError:
+            return Response({'error': 'start and end must be dates (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': 'start must not be after end'}, status=status.HTTP_400_BAD_REQUEST)
+
+        since = timezone.make_aware(datetime.combine(start, time.min))
+        until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        return Response({
+            'field': field,
+            'start': start,
+            'end': end,
+            'states': transitions.time_in_state(field, since, until),
         })
 
 
 class AdminProductViewSet(viewsets.ModelViewSet):
     """ViewSet for product management"""
-    queryset = Product.objects.select_related('category').all()
+    queryset = Product.objects.select_related('category').with_stock()
     serializer_class = AdminProductSerializer
     permission_classes = [IsAdminUser]
     
@@ -114,7 +131,7 @@ class AdminProductViewSet(viewsets.ModelViewSet):
         # Filter by low stock
         low_stock = self.request.query_params.get('filter')
         if low_stock == 'low-stock':
-            queryset = queryset.filter(stock__lt=10)
+            queryset = queryset.filter(stock_on_hand__lt=Product.LOW_STOCK_THRESHOLD)
         
         # Search by name
         search = self.request.query_params.get('search')
@@ -155,15 +172,35 @@ class AdminProductViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            product.stock = int(stock)
-            product.save()
-            serializer = self.get_serializer(product)
-            return Response(serializer.data)
+            set_stock(product, int(stock))
         except ValueError:
             return Response(
                 {'error': 'Invalid stock value'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['post'])
+    def shard_stock(self, request: Request, pk: Any = None) -> Response:
+        """Spread a hot product's stock over N counter rows (0 folds them back)"""
+        product = self.get_object()
+        try:
+            shards = int(request.data.get('shards', 0))
+        except (TypeError, ValueError):
+            shards = -1
+        if not 0 <= shards <= 64:
+            return Response(
+                {'error': 'Shards must be between 0 and 64'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if shards:
+            shard_product(product.pk, shards)
+        else:
+            unshard_product(product.pk)
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data)
 
 
 class AdminUserViewSet(viewsets.ModelViewSet):
@@ -171,11 +208,20 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     serializer_class = AdminUserSerializer
     permission_classes = [IsAdminUser]
     queryset = User.objects.none()
+    # ?ordering= values (prefix "-" for descending); each is backed by an index
+    orderings = {
+        'date_joined': ['date_joined', 'id'],
+        'total_spent': ['customer_stats__total_spent', 'customer_stats__user'],
+        'total_orders': ['customer_stats__order_count', 'customer_stats__user'],
+    }
     
     def get_queryset(self) -> QuerySet[Any]:
+        # Lifetime totals come from the per-customer rollup, not the orders table
         queryset = User.objects.annotate(
-            total_orders=Count('orders'),
-            total_spent=Sum('orders__total_amount', filter=Q(orders__payment_status='paid'))
+            total_orders=F('customer_stats__order_count'),
+            total_spent=F('customer_stats__total_spent'),
+            first_order_at=F('customer_stats__first_order_at'),
+            last_order_at=F('customer_stats__last_order_at'),
         )
         
         # Search by email or name
@@ -198,7 +244,11 @@ class AdminUserViewSet(viewsets.ModelViewSet):
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
-        return queryset.order_by('-date_joined')
+        ordering = self.request.query_params.get('ordering', '-date_joined')
+        fields = self.orderings.get(ordering.lstrip('-'), self.orderings['date_joined'])
+        if ordering.startswith('-') or ordering.lstrip('-') not in self.orderings:
+            fields = [f'-{field}' for field in fields]
+        return queryset.order_by(*fields)
     
     @action(detail=True, methods=['post'])
     def toggle_active(self, request: Request, pk: Any = None) -> Response:
@@ -241,32 +291,39 @@ class AdminOrderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminUser]
     queryset = Order.objects.none()
     
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AdminOrderListSerializer
+        return AdminOrderSerializer
+    
     def get_queryset(self) -> QuerySet[Order]:
-        queryset = Order.objects.select_related('user').prefetch_related('items__product').annotate(
-            items_count=Count('items')
-        )
+        queryset = Order.objects.select_related('user')
+        # The grid shows only the stored items_count; item lines are for single orders
+        if self.action not in ('list', 'timeline'):
+            queryset = queryset.prefetch_related('items')
         
+        return self.filter_orders(queryset, self.request.query_params)
+    
+    def filter_orders(self, queryset: QuerySet[Order], params: Any) -> QuerySet[Order]:
+        """Apply the list filters in ``params`` (query params, or a bulk update's ``filter``)."""
         # Filter by status
-        status_filter = self.request.query_params.get('status')
+        status_filter = params.get('status')
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
         # Filter by payment status
-        payment_status = self.request.query_params.get('payment_status')
+        payment_status = params.get('payment_status')
         if payment_status:
             queryset = queryset.filter(payment_status=payment_status)
         
-        # Search by order number or user email
-        search = self.request.query_params.get('search')
+        # Search by order number, email, phone or postal code (see orders.search)
+        search = params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(order_number__icontains=search) |
-                Q(user__email__icontains=search)
-            )
+            queryset = order_search.search(queryset, search)
         
         # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
+        start_date = params.get('start_date')
+        end_date = params.get('end_date')
         if start_date:
             queryset = queryset.filter(created_at__gte=start_date)
         if end_date:
@@ -277,39 +334,84 @@ class AdminOrderViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def update_status(self, request: Request, pk: Any = None) -> Response:
         """Update order status"""
-        order = self.get_object()
-        new_status = request.data.get('status')
-        
-        valid_statuses = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
-        if new_status not in valid_statuses:
-            return Response(
-                {'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        order.status = new_status
-        order.save()
-        serializer = self.get_serializer(order)
-        return Response(serializer.data)
+        return self.apply_transition(request, 'status')
     
     @action(detail=True, methods=['post'])
     def update_payment_status(self, request: Request, pk: Any = None) -> Response:
         """Update payment status"""
+        return self.apply_transition(request, 'payment_status')
+    
+    def apply_transition(self, request: Request, field: str) -> Response:
         order = self.get_object()
-        new_status = request.data.get('payment_status')
+        new_status = request.data.get(field)
         
-        valid_statuses = ['pending', 'paid', 'failed', 'refunded']
+        valid_statuses = transitions.targets(field)
         if new_status not in valid_statuses:
             return Response(
-                {'error': f'Invalid payment status. Must be one of: {", ".join(valid_statuses)}'},
+                {'error': f'Invalid {field.replace("_", " ")}. Must be one of: {", ".join(valid_statuses)}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        order.payment_status = new_status
-        order.save()
+        try:
+            transitions.transition(order, actor=request.user, **{field: new_status})
+        except transitions.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(order)
         return Response(serializer.data)
-
+    
+    @action(detail=True, methods=['get'])
+    def timeline(self, request: Request, pk: Any = None) -> Response:
+        """Every status and payment-status change of the order, oldest first"""
+        return Response(OrderTimelineSerializer(self.get_object()).data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request: Request) -> Response:
+        """Move many orders to one status: ``{"status", "ids": [...]}`` or ``{"status", "filter": {...}}``"""
+        return self.bulk_update(request, 'status')
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update_payment_status(self, request: Request) -> Response:
+        """Move many orders to one payment status, like ``bulk_update_status``"""
+        return self.bulk_update(request, 'payment_status')
+    
+    def bulk_update(self, request: Request, field: str) -> Response:
+        targets = transitions.targets(field)
+        target = request.data.get(field)
+        if target not in targets:
+            return Response(
+                {'error': f'Invalid {field}. Must be one of: {", ".join(targets)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = BulkOrderSelectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        order_ids = serializer.validated_data.get('ids')
+        if order_ids is None:
+            matching = self.filter_orders(Order.objects.all(), serializer.validated_data['filter'])
+            order_ids = list(matching.order_by('pk').values_list('pk', flat=True)[:bulk_updates.BULK_LIMIT + 1])
+            if len(order_ids) > bulk_updates.BULK_LIMIT:
+                return Response(
+                    {'error': f'The filter matches more than {bulk_updates.BULK_LIMIT} orders'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        previous, updated = bulk_updates.transition(order_ids, field, target, actor=request.user)
+        updated = set(updated)
+        results = []
+        for order_id in dict.fromkeys(order_ids):
+            if order_id not in previous:
+                results.append({'id': order_id, 'result': 'not_found'})
+            elif order_id in updated:
+                results.append({'id': order_id, 'result': 'updated', 'previous': previous[order_id]})
+            elif previous[order_id] == target:
+                results.append({'id': order_id, 'result': 'unchanged'})
+            else:
+                results.append({
+                    'id': order_id,
+                    'result': 'rejected',
+                    'error': f'Cannot change {field} from {previous[order_id]} to {target}',
+                })
+        return Response({field: target, 'updated': len(updated), 'results': results})
 
 class AdminCategoryViewSet(viewsets.ModelViewSet):
     """ViewSet for category management"""
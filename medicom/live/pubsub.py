@@ -0,0 +1,219 @@
+"""
+Publish/subscribe behind the live event streams.
+
+Publishers are synchronous (signal receivers in ``live.signals``, run after
+the transaction commits) and call ``publish(channel, event, data)``; every
+open stream holds a Subscription to its channels, read on the ASGI event
+loop.  Each subscription has a bounded queue of LIVE_QUEUE_SIZE events: a
+client that falls that far behind is cut off with an ``overflow`` marker
+rather than slowing publishers down or buffering without limit, and
+resyncs over REST when it reconnects.
+
+LIVE_BROKER picks the backend: ``memory`` delivers within one process (one
+ASGI worker), ``redis`` relays every event through Redis pub/sub
+(LIVE_REDIS_URL) so streams on any worker see events published on any
+other, including WSGI workers.
+
+Events are best effort: ``publish`` logs a failure instead of raising it
+into a request whose transaction has already committed, and a Redis
+listener that loses its connection reconnects with backoff, then cuts
+its streams off so their clients resync.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+logger = logging.getLogger(__name__)
+
+# ``data`` is encoded once per publish, not once per subscriber
+Message = namedtuple('Message', ['event', 'data'])
+
+OVERFLOW = Message('overflow', '{}')
+
+# Staff streams also listen here; every user's stream listens on user_channel(id)
+ADMIN_CHANNEL = 'admin'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """One stream's view of its channels; create and read it on the stream's event loop."""
+
+    def __init__(self, channels, maxsize):
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Runs on self.loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Drop the backlog; the reader sees the marker next and closes the stream
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self, timeout):
+        """The next message, or None when ``timeout`` seconds pass without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class MemoryBroker:
+    """Fans events out to the subscriptions of the current process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, channels, maxsize=None):
+        subscription = Subscription(channels, maxsize or settings.LIVE_QUEUE_SIZE)
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[channel]
+
+    def subscriber_count(self, channel):
+        with self.lock:
+            return len(self.subscriptions.get(channel, ()))
+
+    def publish(self, channel, event, data):
+        self.dispatch(channel, Message(event, json.dumps(data, cls=DjangoJSONEncoder)))
+
+    def dispatch(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The stream's loop has shut down without unsubscribing
+                self.unsubscribe(subscription)
+
+
+    def resync(self, loop):
+        """Cut off the subscriptions read on ``loop`` so their clients refetch what they missed."""
+        with self.lock:
+            subscribers = {
+                subscription for subscribers in self.subscriptions.values()
+                for subscription in subscribers if subscription.loop is loop
+            }
+        for subscription in subscribers:
+            subscription.deliver(OVERFLOW)
+
+
+class RedisBroker(MemoryBroker):
+    """
+    Publishes through Redis; each event loop with subscriptions runs one
+    listener that hands the messages on to its local subscriptions.
+    """
+    prefix = 'live:'
+    # Publishes run in requests, so a dead Redis must fail them quickly
+    timeout = 2
+    # Listener reconnects back off from retry_delay up to max_retry_delay seconds
+    retry_delay = 0.5
+    max_retry_delay = 30
+
+    def __init__(self, url=None):
+        super().__init__()
+        import redis  # Only needed when LIVE_BROKER is 'redis'
+
+        self.url = url or settings.LIVE_REDIS_URL
+        self.client = redis.Redis.from_url(self.url, socket_timeout=self.timeout, socket_connect_timeout=self.timeout)
+        self.listeners = {}
+
+    def subscribe(self, channels, maxsize=None):
+        subscription = super().subscribe(channels, maxsize)
+        listener = self.listeners.get(subscription.loop)
+        if listener is None or listener.done():
+            self.listeners[subscription.loop] = subscription.loop.create_task(self.listen())
+        return subscription
+
+    def publish(self, channel, event, data):
+        self.client.publish(
+            self.prefix + channel,
+            json.dumps({'event': event, 'data': json.dumps(data, cls=DjangoJSONEncoder)}),
+        )
+
+    async def listen(self):
+        # Runs as long as its loop does; the subscriptions it feeds stay open
+        # across reconnects, so it must not give up on a dropped connection
+        failures = 0
+        while True:
+            try:
+                async for received in self.messages():
+                    if received is None:
+                        # Subscribed again: whatever was published meanwhile is lost
+                        if failures:
+                            self.resync(asyncio.get_running_loop())
+                        failures = 0
+                    else:
+                        self.dispatch(*received)
+            except Exception:
+                logger.warning('Live event listener lost its Redis connection', exc_info=True)
+            failures += 1
+            await asyncio.sleep(min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay))
+
+    async def messages(self):
+        """``(channel, Message)`` pairs from one Redis connection, after a None once subscribed."""
+        from redis import asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.psubscribe(f'{self.prefix}*')
+                yield None
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    payload = json.loads(message['data'])
+                    channel = message['channel'].decode()[len(self.prefix):]
+                    yield channel, Message(payload['event'], payload['data'])
+        finally:
+            await client.aclose()
+
+
+BACKENDS = {
+    'memory': MemoryBroker,
+    'redis': RedisBroker,
+}
+_brokers = {}
+
+
+def get_broker():
+    name = settings.LIVE_BROKER
+    if name not in _brokers:
+        _brokers[name] = BACKENDS[name]()
+    return _brokers[name]
+
+
+def publish(channel, event, data):
+    # Callers run after their transaction commits; a lost event must not fail the request
+    try:
+        get_broker().publish(channel, event, data)
+    except Exception:
+        logger.exception('Could not publish %s to %s', event, channel)
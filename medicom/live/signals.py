@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+from orders.signals import order_transitioned, stock_taken
+from products.models import Product
+from .pubsub import ADMIN_CHANNEL, publish, user_channel
+
+
+def order_summary(order):
+    return {
+        'id': order['id'],
+        'order_number': order['order_number'],
+        'status': order['status'],
+        'payment_status': order['payment_status'],
+        'total_amount': order['total_amount'],
+    }
+
+
+@receiver(post_save, sender=Order)
+def announce_new_order(sender, instance, created, **kwargs):
+    if not created:
+        return
+    order = {
+        'id': instance.pk, 'order_number': instance.order_number, 'status': instance.status,
+        'payment_status': instance.payment_status, 'total_amount': instance.total_amount,
+    }
+    user_id, email = instance.user_id, instance.user.email
+
+    def send():
+        publish(user_channel(user_id), 'order.created', order)
+        publish(ADMIN_CHANNEL, 'order.created', {**order, 'user_email': email, 'created_at': instance.created_at})
+    transaction.on_commit(send, robust=True)
+
+
+@receiver(order_transitioned)
+def announce_transitions(sender, events, **kwargs):
+    changes = [(event.order_id, event.field, event.from_value, event.to_value) for event in events]
+
+    def send():
+        # The state after commit, read once for all the orders involved
+        orders = {
+            order['id']: order
+            for order in Order.objects.filter(pk__in={order_id for order_id, *_ in changes})
+            .values('id', 'user_id', 'order_number', 'status', 'payment_status', 'total_amount')
+        }
+        for order_id, field, from_value, to_value in changes:
+            order = orders.get(order_id)
+            if order is not None:
+                publish(user_channel(order['user_id']), 'order.updated', {
+                    **order_summary(order), 'field': field, 'from_value': from_value, 'to_value': to_value,
+                })
+    transaction.on_commit(send, robust=True)
+
+
+@receiver(stock_taken)
+def announce_low_stock(sender, quantities, **kwargs):
+    def send():
+        threshold = Product.LOW_STOCK_THRESHOLD
+        low = (
+            Product.objects.with_stock().filter(pk__in=quantities, stock_on_hand__lt=threshold)
+            .values('id', 'name', 'slug', 'stock_on_hand')
+        )
+        for product in low:
+            # Only the checkout that took it below the threshold announces it
+            if product['stock_on_hand'] + quantities[product['id']] >= threshold:
+                publish(ADMIN_CHANNEL, 'stock.low', {
+                    'id': product['id'], 'name': product['name'], 'slug': product['slug'],
+                    'stock': product['stock_on_hand'], 'threshold': threshold,
+                })
+    transaction.on_commit(send, robust=True)
@@ -0,0 +1,234 @@
+import asyncio
+import json
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from orders import transitions
+from orders.checkout import place_order
+from orders.models import Order, Cart, CartItem
+from products.models import Product, Category
+from live.pubsub import ADMIN_CHANNEL, OVERFLOW, MemoryBroker, Message, RedisBroker, get_broker, user_channel
+from live.views import SALT
+
+User = get_user_model()
+
+SHIPPING = {
+    'shipping_address': '12 MG Road',
+    'shipping_city': 'Bengaluru',
+    'shipping_country': 'India',
+    'shipping_postal_code': '560001',
+    'phone': '9999999999',
+    'payment_method': 'cod',
+}
+
+
+class FlakyRedisBroker(RedisBroker):
+    """A RedisBroker whose connections drop ``failures`` times before one relays ``relayed``."""
+    retry_delay = 0
+
+    def __init__(self, failures, relayed):
+        MemoryBroker.__init__(self)
+        self.listeners = {}
+        self.failures = failures
+        self.relayed = relayed
+        self.connections = 0
+
+    async def messages(self):
+        self.connections += 1
+        if self.connections <= self.failures:
+            raise ConnectionError('Connection reset by peer')
+        yield None
+        for received in self.relayed:
+            yield received
+        await asyncio.Event().wait()
+
+
+class LiveBrokerTestCase(TestCase):
+    """Test cases for the in-process event broker"""
+
+    async def test_publish_reaches_channel_subscribers(self):
+        """Test that an event published from another thread reaches only its channel's subscribers"""
+        broker = MemoryBroker()
+        customer = broker.subscribe([user_channel(1)])
+        other = broker.subscribe([user_channel(2)])
+        await asyncio.to_thread(broker.publish, user_channel(1), 'order.updated', {'id': 7, 'total': Decimal('9.50')})
+
+        self.assertEqual(await customer.get(1), Message('order.updated', '{"id": 7, "total": "9.50"}'))
+        self.assertIsNone(await other.get(0.01))
+
+        broker.unsubscribe(customer)
+        broker.unsubscribe(other)
+        self.assertEqual(broker.subscriber_count(user_channel(1)), 0)
+        self.assertEqual(broker.subscriptions, {})
+
+    async def test_slow_subscriber_overflows(self):
+        """Test that a subscriber that falls behind is dropped to an overflow marker"""
+        broker = MemoryBroker()
+        slow = broker.subscribe([ADMIN_CHANNEL], maxsize=2)
+        for number in range(5):
+            broker.publish(ADMIN_CHANNEL, 'order.created', {'id': number})
+        await asyncio.sleep(0)
+
+        self.assertIs(await slow.get(1), OVERFLOW)
+        self.assertIsNone(await slow.get(0.01))
+
+    async def test_listener_reconnects_and_resyncs(self):
+        """Test that a Redis listener survives dropped connections and cuts its streams off to resync"""
+        broker = FlakyRedisBroker(2, [(ADMIN_CHANNEL, Message('order.created', '{"id": 1}'))])
+        with self.assertLogs('live.pubsub', 'WARNING') as logs:
+            admin = broker.subscribe([ADMIN_CHANNEL])
+            try:
+                self.assertIs(await admin.get(1), OVERFLOW)
+                self.assertEqual(await admin.get(1), Message('order.created', '{"id": 1}'))
+            finally:
+                broker.listeners[admin.loop].cancel()
+        self.assertEqual(broker.connections, 3)
+        self.assertEqual(len(logs.records), 2)
+
+
+@override_settings(LIVE_HEARTBEAT_SECONDS=0.05)
+class LiveStreamTestCase(TestCase):
+    """Test cases for the server-sent event stream"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@test.com', username='testuser', password='testpass123'
+        )
+
+    def stream_url(self, staff=False):
+        return '/api/live/stream/?ticket=' + signing.dumps({'user': self.user.pk, 'staff': staff}, salt=SALT)
+
+    def test_ticket(self):
+        """Test that only signed-in users get a stream ticket"""
+        client = APIClient()
+        self.assertEqual(client.post('/api/live/ticket/').status_code, status.HTTP_401_UNAUTHORIZED)
+        client.force_authenticate(user=self.user)
+        response = client.post('/api/live/ticket/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        claims = signing.loads(response.data['ticket'], salt=SALT)
+        self.assertEqual(claims, {'user': self.user.pk, 'staff': False})
+
+    async def test_bad_ticket(self):
+        """Test that a stream needs a valid ticket"""
+        for url in ('/api/live/stream/', '/api/live/stream/?ticket=forged'):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_wsgi_stream_is_refused(self):
+        """Test that a stream requested through WSGI gets a 503 instead of pinning the worker"""
+        response = self.client.get(self.stream_url())
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+    async def test_stream(self):
+        """Test that a stream opens with ready, relays its channels' events and sends heartbeats"""
+        response = await self.async_client.get(self.stream_url())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertEqual(await anext(chunks), b'event: ready\ndata: {}\n\n')
+
+        get_broker().publish(ADMIN_CHANNEL, 'order.created', {'id': 1})
+        get_broker().publish(user_channel(self.user.pk), 'order.updated', {'id': 2})
+        self.assertEqual(await anext(chunks), b'event: order.updated\ndata: {"id": 2}\n\n')
+        self.assertEqual(await anext(chunks), b': heartbeat\n\n')
+
+        # A client disconnect cancels the pending read and releases the subscription
+        self.assertEqual(get_broker().subscriber_count(user_channel(self.user.pk)), 1)
+        pending = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(get_broker().subscriber_count(user_channel(self.user.pk)), 0)
+
+    async def test_staff_stream_gets_admin_channel(self):
+        """Test that a staff stream also carries the admin channel"""
+        response = await self.async_client.get(self.stream_url(staff=True))
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)
+        await anext(chunks)
+        get_broker().publish(ADMIN_CHANNEL, 'stock.low', {'id': 3})
+        self.assertEqual(await anext(chunks), b'event: stock.low\ndata: {"id": 3}\n\n')
+        await chunks.aclose()
+
+
+class LiveSignalsTestCase(TestCase):
+    """Test cases for the events published on order and stock changes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@test.com', username='testuser', password='testpass123'
+        )
+        category = Category.objects.create(name='Test Category')
+        self.product = Product.objects.create(
+            name='Test Product', description='Test', price=50, stock=12, category=category
+        )
+
+    def checkout(self, quantity):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=quantity)
+        with self.captureOnCommitCallbacks(execute=True):
+            return place_order(self.user, SHIPPING)
+
+    async def events(self, subscription):
+        received = []
+        while (message := await subscription.get(0.05)) is not None:
+            received.append((message.event, json.loads(message.data)))
+        return received
+
+    async def test_checkout_announces_order_and_low_stock(self):
+        """Test that checkout announces the order, and low stock once it crosses the threshold"""
+        customer = get_broker().subscribe([user_channel(self.user.pk)])
+        admin = get_broker().subscribe([ADMIN_CHANNEL])
+        try:
+            order = await sync_to_async(self.checkout)(3)
+            received = await self.events(admin)
+            self.assertEqual([event for event, _ in received], ['order.created', 'stock.low'])
+            self.assertEqual(received[0][1]['order_number'], order.order_number)
+            self.assertEqual(received[0][1]['user_email'], 'test@test.com')
+            self.assertEqual(received[1][1]['stock'], 9)
+            self.assertEqual([event for event, _ in await self.events(customer)], ['order.created'])
+
+            await sync_to_async(self.checkout)(1)
+            self.assertEqual([event for event, _ in await self.events(admin)], ['order.created'])
+        finally:
+            get_broker().unsubscribe(customer)
+            get_broker().unsubscribe(admin)
+
+    def test_failed_publish_keeps_checkout(self):
+        """Test that a broker failure after commit is logged and the order still goes through"""
+        with mock.patch.object(MemoryBroker, 'publish', side_effect=ConnectionError('Connection refused')):
+            with self.assertLogs('live.pubsub', 'ERROR') as logs:
+                order = self.checkout(3)
+        self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+        self.assertIn('Could not publish order.created', logs.output[0])
+
+    async def test_transitions_reach_customer(self):
+        """Test that each logged transition is announced on the customer's channel after commit"""
+        order = await Order.objects.acreate(user=self.user, total_amount=100, **SHIPPING)
+        customer = get_broker().subscribe([user_channel(self.user.pk)])
+
+        def pay():
+            with self.captureOnCommitCallbacks(execute=True):
+                transitions.transition(order, payment_status='paid', status='processing')
+        try:
+            await sync_to_async(pay)()
+            received = await self.events(customer)
+        finally:
+            get_broker().unsubscribe(customer)
+        self.assertEqual(
+            sorted((data['field'], data['from_value'], data['to_value']) for _, data in received),
+            [('payment_status', 'pending', 'paid'), ('status', 'pending', 'processing')]
+        )
+        self.assertTrue(all(event == 'order.updated' for event, _ in received))
+        self.assertEqual(received[0][1]['status'], 'processing')
@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import stream, ticket
+
+urlpatterns = [
+    path('ticket/', ticket, name='live-ticket'),
+    path('stream/', stream, name='live-stream'),
+]
@@ -0,0 +1,83 @@
+"""
+Server-sent event streams replacing order and dashboard polling.
+
+``EventSource`` cannot send the JWT header, so a client first POSTs to
+``ticket/`` and opens ``stream/?ticket=...`` with the short-lived signed
+ticket it gets back.  A stream carries the user's order events, plus the
+admin channel (new orders, low stock) for staff.  It opens with a
+``ready`` event, after which the client should refetch what it shows,
+since events published while it was disconnected are not replayed.  An
+idle stream sends a comment every LIVE_HEARTBEAT_SECONDS so proxies keep
+it open and dead connections are noticed.
+
+Streams hold a connection open, so they must be served by an ASGI server
+(``uvicorn medicom.asgi:application``, as in the Procfile); under WSGI a
+stream would pin a worker without ever sending a byte, so it is refused
+with a 503 instead.  See ``live.pubsub`` for delivery.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .pubsub import ADMIN_CHANNEL, OVERFLOW, get_broker, user_channel
+
+
+SALT = 'live.stream'
+# How long an EventSource waits before reconnecting, in milliseconds
+RETRY_MS = 3000
+
+
+def encode(event, data):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def ticket(request):
+    """A signed ticket that opens the caller's event stream for LIVE_TICKET_MAX_AGE seconds."""
+    value = signing.dumps({'user': request.user.pk, 'staff': request.user.is_staff}, salt=SALT)
+    return Response({'ticket': value, 'expires_in': settings.LIVE_TICKET_MAX_AGE})
+
+
+async def events(channels):
+    # Subscribing inside the generator ties the subscription to the
+    # response being streamed; its finally runs when the client disconnects
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        yield encode('ready', '{}')
+        while True:
+            message = await subscription.get(settings.LIVE_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ': heartbeat\n\n'
+                continue
+            yield encode(*message)
+            if message is OVERFLOW:
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Live streams need the ASGI server'}, status=503)
+    try:
+        claims = signing.loads(
+            request.GET.get('ticket', ''), salt=SALT, max_age=settings.LIVE_TICKET_MAX_AGE
+        )
+    except signing.BadSignature:
+        return JsonResponse({'error': 'Invalid or expired ticket'}, status=401)
+
+    channels = [user_channel(claims['user'])]
+    if claims['staff']:
+        channels.append(ADMIN_CHANNEL)
+    response = StreamingHttpResponse(events(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,6 +2,8 @@
 ASGI config for medicom project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The live event streams (``/api/live/stream/``) need it, e.g.
+``uvicorn medicom.asgi:application``; see ``live.views``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
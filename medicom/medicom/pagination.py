@@ -0,0 +1,161 @@
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _cursor_value(value):
+    # Full precision: DjangoJSONEncoder truncates datetimes to milliseconds
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} cannot be used in a cursor')
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+
+    Clients opt in with ``?cursor=`` (empty for the first page) and then
+    follow the ``next``/``previous`` links.  A cursor records the ordering
+    values of the last row seen, so the next page is a plain indexed range
+    scan: no ``COUNT(*)`` and no ``OFFSET``.  The queryset's ordering
+    (``?ordering=``, the view's ``order_by`` or ``Meta.ordering``) is used
+    with ``id`` appended as a tie-breaker; it must consist of non-null,
+    non-relational fields on the model.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.cursor_query_param in request.query_params
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_keyset_ordering(queryset)
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            # Walk backwards from the position, then restore display order
+            ordering = [self._flip(field) for field in self.ordering]
+        else:
+            ordering = self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if not self.has_next or self.last_row is None:
+            return None
+        return self._link(self.last_row, reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset_mode:
+            return super().get_previous_link()
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self._link(self.first_row, reverse=True)
+
+    def get_keyset_ordering(self, queryset):
+        query = queryset.query
+        ordering = list(query.order_by or (query.get_meta().ordering if query.default_ordering else []))
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering if isinstance(field, str)):
+            descending = bool(ordering) and isinstance(ordering[-1], str) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+
+        model = queryset.model
+        self.fields = {}
+        for field_name in ordering:
+            if not isinstance(field_name, str) or '__' in field_name or '?' in field_name:
+                raise ParseError('Cursor pagination is not supported for this ordering')
+            name = field_name.lstrip('-')
+            try:
+                field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise ParseError('Cursor pagination is not supported for this ordering')
+            if field.is_relation or field.null:
+                raise ParseError('Cursor pagination is not supported for this ordering')
+            self.fields[name] = field
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.fields[field_name.lstrip('-')].to_python(value)
+                for field_name, value in zip(self.ordering, values)
+            ]
+            return position, bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        values = [getattr(row, self.fields[field_name.lstrip('-')].attname) for field_name in self.ordering]
+        payload = {'v': values}
+        if reverse:
+            payload['r'] = 1
+        data = json.dumps(payload, default=_cursor_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def _link(self, row, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    @staticmethod
+    def _flip(field_name):
+        return field_name[1:] if field_name.startswith('-') else f'-{field_name}'
+
+    def _after(self, ordering, position):
+        """Rows strictly after ``position`` in ``ordering`` (row-value comparison)."""
+        condition = Q()
+        equal = Q()
+        for field_name, value in zip(ordering, position):
+            name = field_name.lstrip('-')
+            lookup = 'lt' if field_name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Redundant bound on the leading column turns the OR chain into an index range scan
+        leading = ordering[0]
+        bound = Q(**{f"{leading.lstrip('-')}__{'lte' if leading.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
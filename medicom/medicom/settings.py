@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'products',
     'orders',
     'admin_panel',
+    'live',
 ]
 
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -142,6 +143,59 @@ DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# ── Cache ─────────────────────────────────────────────────────
+# Shared Redis in production (REDIS_URL), per-process memory otherwise
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Catalog responses (products, categories, FAQs) are invalidated by
+# generation bumps; the timeout only bounds how long dead entries linger
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# ── Cart stock holds ──────────────────────────────────────────
+# Adding to cart holds stock for this long; any cart activity extends it
+CART_HOLD_SECONDS = 15 * 60
+
+# ── Dashboard rollups ─────────────────────────────────────────
+# Each day's rollup rows are split over this many shards so concurrent
+# checkouts do not wait on one row's lock.  After changing it, rerun
+# rebuild_daily_stats and rebuild_sales_rollups so every order's rows sit
+# in its new shard
+ROLLUP_SHARDS = 8
+
+# ── Guest carts ───────────────────────────────────────────────
+# Visitors' carts live in a signed cookie and merge into Cart on login
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_MAX_AGE = 30 * 24 * 60 * 60
+# The storefront is served from another origin, so the cookie must be cross-site
+GUEST_CART_COOKIE_SECURE = not DEBUG
+GUEST_CART_COOKIE_SAMESITE = 'None' if GUEST_CART_COOKIE_SECURE else 'Lax'
+
+# ── Idempotency keys ──────────────────────────────────────────
+# Stored responses to Idempotency-Key requests are replayed for this long
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# ── Live event streams ────────────────────────────────────────
+# Order and dashboard updates over SSE (live app, served under ASGI);
+# Redis relays events between workers, memory only reaches this process
+LIVE_BROKER = 'redis' if os.environ.get('REDIS_URL') else 'memory'
+LIVE_REDIS_URL = os.environ.get('REDIS_URL')
+# Events a stream may fall behind by before it is closed for a resync
+LIVE_QUEUE_SIZE = 100
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_TICKET_MAX_AGE = 60
+
 # ── REST Framework ────────────────────────────────────────────
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -150,7 +204,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'medicom.pagination.KeysetPagination',
     'PAGE_SIZE': 12,
 }
 
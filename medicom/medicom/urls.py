@@ -9,6 +9,7 @@ urlpatterns = [
     path('api/products/', include('products.urls')),
     path('api/orders/', include('orders.urls')),
     path('api/admin-panel/', include('admin_panel.urls')),
+    path('api/live/', include('live.urls')),
 
 ]
 
@@ -0,0 +1,143 @@
+"""
+Checkout: turn a user's cart into an order in one transaction.
+
+The product rows in the cart are locked with ``SELECT ... FOR UPDATE`` in
+primary-key order, so concurrent checkouts over overlapping carts queue up
+instead of deadlocking.  Stock is then decremented for every line in a single
+``UPDATE`` guarded by ``stock - reserved_stock >= quantity`` (crediting the
+buyer's own cart holds, which are consumed); if any line is short the whole
+transaction rolls back.  The number of queries does not depend on cart size.
+
+Sharded hot products (``products.inventory``) are the exception: their rows
+are not locked, and each of their lines takes from a single stock shard.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, ExpressionWrapper, F, IntegerField, PositiveIntegerField, Q, When
+from django.utils import timezone
+
+from products.cache import bump_generation
+from products import inventory
+from products.models import Product, StockShard
+from . import reservations
+from .models import CartItem, Order, OrderItem, StockReservation
+from .signals import stock_taken
+
+
+class CheckoutError(Exception):
+    """The cart cannot be checked out; the message is safe to show the user."""
+
+
+def decrement_stock(quantities, held=None):
+    """
+    Take ``{product_id: quantity}`` out of stock; False if any product is short.
+
+    ``held`` are the buyer's own cart holds, which are moved out of
+    ``reserved_stock`` and count towards what the buyer may take.
+    """
+    held = held or {}
+    enough = reduce(or_, [
+        Q(pk=pk, stock__gte=ExpressionWrapper(
+            F('reserved_stock') + quantity - held.get(pk, 0), output_field=IntegerField()
+        ))
+        for pk, quantity in quantities.items()
+    ] + [Q(pk=pk) for pk in held if pk not in quantities])
+    updates = {
+        'stock': Case(
+            *[When(pk=pk, then=F('stock') - quantity) for pk, quantity in quantities.items()],
+            default=F('stock'),
+        ),
+        'updated_at': timezone.now(),
+    }
+    if held:
+        updates['reserved_stock'] = Case(
+            *[When(pk=pk, then=F('reserved_stock') - quantity) for pk, quantity in held.items()],
+            default=F('reserved_stock'),
+            output_field=PositiveIntegerField(),
+        )
+    updated = Product.objects.filter(enough).update(**updates)
+    return updated == len(set(quantities) | set(held))
+
+
+def take_sharded(product_id, quantity, hold):
+    """Take a line of a sharded product, consuming the buyer's hold ``(shard_id, quantity)``."""
+    shard_id, held = hold
+    if shard_id and inventory.take(shard_id, quantity, credit=min(held, quantity)):
+        if held > quantity:
+            StockShard.objects.filter(pk=shard_id).update(reserved=F('reserved') - (held - quantity))
+        return True
+    if shard_id:
+        StockShard.objects.filter(pk=shard_id).update(reserved=F('reserved') - held)
+    return inventory.acquire(product_id, quantity) is not None
+
+
+def place_order(user, shipping):
+    """Create an order from ``user``'s cart; ``shipping`` is CreateOrderSerializer data."""
+    with transaction.atomic():
+        lines = list(
+            CartItem.objects.filter(cart__user=user)
+            .order_by('product_id')
+            .values_list('cart_id', 'product_id', 'quantity')
+        )
+        if not lines:
+            raise CheckoutError('Cart is empty')
+        cart_id = lines[0][0]
+        quantities = {product_id: quantity for _, product_id, quantity in lines}
+        held_products = StockReservation.objects.filter(cart_id=cart_id).values_list('product_id', flat=True)
+        involved = set(quantities) | set(held_products)
+
+        fields = ('id', 'name', 'slug', 'image', 'price', 'stock', 'reserved_stock', 'stock_shards')
+        products = {product.pk: product for product in Product.objects.filter(pk__in=involved).only(*fields)}
+        if not set(quantities) <= set(products):
+            raise CheckoutError('Some products in your cart are no longer available')
+        # Plain products are locked and re-read under the lock; sharded ones only
+        # lock the shard they take from.  Every product stays in ``products``
+        # whichever way (un)sharding moves it meanwhile.
+        products.update(
+            (product.pk, product)
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=[pk for pk, product in products.items() if not product.stock_shards])
+            .order_by('pk')
+            .only(*fields)
+        )
+        sharded = {pk for pk, product in products.items() if product.stock_shards}
+        held = reservations.consume(cart_id)
+
+        plain_quantities = {pk: quantity for pk, quantity in quantities.items() if pk not in sharded}
+        plain_held = {pk: quantity for pk, (_, quantity) in held.items() if pk not in sharded}
+        for product_id, quantity in plain_quantities.items():
+            product = products[product_id]
+            if product.stock - product.reserved_stock + plain_held.get(product_id, 0) < quantity:
+                raise CheckoutError(f'Insufficient stock for {product.name}')
+
+        if (plain_quantities or plain_held) and not decrement_stock(plain_quantities, plain_held):
+            # Only reachable without row locks (SQLite); the guard caught a race
+            raise CheckoutError('Insufficient stock, please review your cart')
+        for product_id in sorted(set(sharded) & set(quantities)):
+            if not take_sharded(product_id, quantities[product_id], held.pop(product_id, (None, 0))):
+                raise CheckoutError(f'Insufficient stock for {products[product_id].name}')
+        for product_id, (shard_id, quantity) in held.items():
+            if product_id in sharded and shard_id:
+                StockShard.objects.filter(pk=shard_id).update(reserved=F('reserved') - quantity)
+
+        order = Order.objects.create(
+            user=user,
+            total_amount=sum(products[pk].price * quantity for pk, quantity in quantities.items()),
+            items_count=len(quantities),
+            **shipping
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, product_id=pk, quantity=quantity, price=products[pk].price,
+                **OrderItem.snapshot(products[pk])
+            )
+            for pk, quantity in quantities.items()
+        ])
+        CartItem.objects.filter(cart_id=cart_id).delete()
+
+        # Stock changed without Product.save(), so no signal bumps the catalog cache
+        bump_generation()
+        stock_taken.send(sender=Order, quantities=quantities)
+    return order
@@ -0,0 +1,222 @@
+"""
+Carts for visitors who are not logged in.
+
+A guest cart lives entirely in a signed cookie (``{product_id: quantity}``),
+so browsing visitors can fill a cart without any database writes.  Guest
+lines are checked against available stock when they change but do not
+hold stock; on login or registration ``merge`` folds them into the user's
+Cart in one bulk write, and the holds are placed as the shopper next
+touches those lines (checkout accepts unheld lines it has stock for).
+
+Merge rules: quantities for a product already in the cart are added
+together, then capped at what is available to the user (their own holds
+included); lines for unavailable or sold-out products are dropped.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from products.models import Product
+from .models import Cart, CartItem, StockReservation
+from .serializers import CartProductSerializer, CartAddSerializer, CartUpdateSerializer
+
+
+SALT = 'orders.guest_cart'
+MAX_LINES = 50
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load(request):
+    """The guest cart in ``request``'s cookie as ``{product_id: quantity}``."""
+    value = request.COOKIES.get(settings.GUEST_CART_COOKIE)
+    if not value:
+        return {}
+    try:
+        lines = signing.loads(value, salt=SALT, max_age=settings.GUEST_CART_MAX_AGE)
+        return {int(pk): int(quantity) for pk, quantity in lines.items()}
+    except (signing.BadSignature, AttributeError, TypeError, ValueError):
+        return {}
+
+
+def store(response, lines):
+    """Write ``lines`` to the cookie on ``response`` (or drop the cookie when empty)."""
+    if not lines:
+        forget(response)
+        return
+    response.set_cookie(
+        settings.GUEST_CART_COOKIE,
+        signing.dumps({str(pk): quantity for pk, quantity in lines.items()}, salt=SALT, compress=True),
+        max_age=settings.GUEST_CART_MAX_AGE,
+        httponly=True,
+        secure=settings.GUEST_CART_COOKIE_SECURE,
+        samesite=settings.GUEST_CART_COOKIE_SAMESITE,
+    )
+
+
+def forget(response):
+    response.delete_cookie(settings.GUEST_CART_COOKIE, samesite=settings.GUEST_CART_COOKIE_SAMESITE)
+
+
+def products_for(lines):
+    return {
+        product.pk: product
+        for product in Product.objects.with_stock().select_related('category').filter(pk__in=lines)
+    }
+
+
+def merge(user, lines):
+    """
+    Fold guest ``lines`` into ``user``'s cart; returns what changed.
+
+    ``{'merged': [product ids], 'adjusted': [{'product_id', 'requested', 'quantity'}],
+    'dropped': [product ids]}``
+    """
+    report = {'merged': [], 'adjusted': [], 'dropped': []}
+    if not lines:
+        return report
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        existing = {item.product_id: item for item in CartItem.objects.select_for_update().filter(cart=cart)}
+        own_holds = dict(
+            StockReservation.objects.filter(cart=cart, product_id__in=lines).values_list('product_id', 'quantity')
+        )
+        products = products_for(lines)
+
+        created, updated = [], []
+        for product_id, quantity in sorted(lines.items()):
+            product = products.get(product_id)
+            item = existing.get(product_id)
+            requested = quantity + (item.quantity if item else 0)
+            room = 0
+            if product is not None and product.is_available:
+                room = product.available_stock + own_holds.get(product_id, 0)
+            merged = min(requested, room)
+            if merged <= 0:
+                report['dropped'].append(product_id)
+                continue
+            if merged < requested:
+                report['adjusted'].append({'product_id': product_id, 'requested': requested, 'quantity': merged})
+            report['merged'].append(product_id)
+            if item is None:
+                created.append(CartItem(cart=cart, product_id=product_id, quantity=merged))
+            elif item.quantity != merged:
+                item.quantity = merged
+                updated.append(item)
+        CartItem.objects.bulk_create(created)
+        CartItem.objects.bulk_update(updated, ['quantity'])
+    return report
+
+
+def representation(lines, products):
+    """The guest cart in CartSerializer's shape; line ids are product ids."""
+    items = [
+        {
+            'id': product_id,
+            'product': CartProductSerializer(products[product_id]).data,
+            'quantity': quantity,
+            'subtotal': products[product_id].price * quantity,
+        }
+        for product_id, quantity in lines.items()
+    ]
+    return {
+        'id': None,
+        'items': items,
+        'total': sum((item['subtotal'] for item in items), Decimal('0.00')),
+        'item_count': sum(lines.values()),
+        'created_at': None,
+        'updated_at': None,
+    }
+
+
+class GuestCartMixin:
+    """
+    Cart endpoints for anonymous visitors, backed by the guest cart cookie.
+    Line ``item_id``s are product ids; responses match the stored cart's.
+    """
+
+    def guest_response(self, request, lines, product_id=None, status_code=status.HTTP_200_OK):
+        products = products_for(lines)
+        # Products deleted since they were added just fall out of the cart
+        lines = {pk: quantity for pk, quantity in lines.items() if pk in products}
+        data = representation(lines, products)
+        if request.query_params.get('compact') in ('1', 'true'):
+            item = next((item for item in data['items'] if item['id'] == product_id), None)
+            data = {'item': item, 'total': data['total'], 'item_count': data['item_count']}
+        response = Response(data, status=status_code)
+        store(response, lines)
+        return response
+
+    def guest_set(self, request, lines, product_id, quantity, status_code=status.HTTP_200_OK):
+        product = Product.objects.with_stock().filter(pk=product_id).first()
+        if product is None:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        if product_id not in lines and len(lines) >= MAX_LINES:
+            return Response({'error': 'Cart is full'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity > product.available_stock:
+            return Response({'error': 'Insufficient stock'}, status=status.HTTP_400_BAD_REQUEST)
+        lines[product_id] = quantity
+        return self.guest_response(request, lines, product_id, status_code)
+
+    def guest_list(self, request):
+        return self.guest_response(request, load(request))
+
+    def guest_create(self, request):
+        # The quantity ends up in the cookie, so it is checked before anything else
+        serializer = CartAddSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        lines = load(request)
+        product_id, quantity = serializer.validated_data['product_id'], serializer.validated_data['quantity']
+        return self.guest_set(
+            request, lines, product_id, lines.get(product_id, 0) + quantity, status.HTTP_201_CREATED
+        )
+
+    def guest_update_item(self, request):
+        serializer = CartUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        lines = load(request)
+        product_id, quantity = serializer.validated_data['item_id'], serializer.validated_data['quantity']
+        if product_id not in lines:
+            return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+        if quantity <= 0:
+            del lines[product_id]
+            return self.guest_response(request, lines)
+        return self.guest_set(request, lines, product_id, quantity)
+
+    def guest_remove_item(self, request):
+        lines = load(request)
+        if lines.pop(_as_id(request.data.get('item_id')), None) is None:
+            return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
+        return self.guest_response(request, lines)
+
+    def guest_clear(self, request):
+        return self.guest_response(request, {})
+
+    def guest_batch(self, request, changes, positions):
+        lines = load(request)
+        products = products_for([pk for pk, quantity in changes.items() if quantity])
+        errors = [
+            {'index': positions[pk], 'product_id': pk, 'error': 'Insufficient stock'}
+            for pk, quantity in changes.items() if quantity and quantity > products[pk].available_stock
+        ]
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        for product_id, quantity in changes.items():
+            if quantity:
+                lines[product_id] = quantity
+            else:
+                lines.pop(product_id, None)
+        if len(lines) > MAX_LINES:
+            return Response({'errors': [{'index': None, 'error': 'Cart is full'}]}, status=status.HTTP_400_BAD_REQUEST)
+        return self.guest_response(request, lines)
@@ -0,0 +1,109 @@
+"""
+Idempotency-Key support for unsafe order endpoints.
+
+A client that may retry a request sends an ``Idempotency-Key`` header.  The
+first request with a key claims it by inserting an IdempotencyKey row in the
+same transaction as the view's own work and stores the response there, so a
+retry either replays that response or, while the first request is still in
+flight, waits on the row's unique index until it commits.  A key reused
+for a different request (method, path or body) is refused with 422.
+
+Requests that raise (validation errors, 404s) or answer 5xx are not stored,
+so they can be retried for real.  Keys expire after IDEMPOTENCY_KEY_TTL seconds; ``prune_idempotency_keys``
+deletes expired rows.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    payload = '\n'.join([request.method, request.path, body])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(user, key, request_fingerprint):
+    """Insert the key row, or return the existing unexpired one (``created`` False)."""
+    expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=request_fingerprint, expires_at=expires_at
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                continue
+            if record.expires_at > timezone.now():
+                return record, False
+            record.delete()
+    raise IntegrityError(f'Could not claim idempotency key {key!r}')
+
+
+def idempotent(view):
+    """Make a viewset action replay its response for a repeated Idempotency-Key."""
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_fingerprint = fingerprint(request)
+        with transaction.atomic():
+            record, created = _claim(request.user, key, request_fingerprint)
+            if not created:
+                if record.fingerprint != request_fingerprint:
+                    return Response(
+                        {'error': f'{HEADER} was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record.response_status is None:
+                    return Response(
+                        {'error': 'A request with this key is still in progress'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                return Response(
+                    record.response_body,
+                    status=record.response_status,
+                    headers={REPLAYED_HEADER: 'true'}
+                )
+
+            response = view(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                record.delete()
+            else:
+                record.response_status = response.status_code
+                record.response_body = response.data
+                record.save(update_fields=['response_status', 'response_body'])
+        return response
+    return wrapper
+
+
+def prune_expired(batch_size=1000):
+    """Delete up to ``batch_size`` expired keys; returns how many were deleted."""
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)
+    deleted, _ = IdempotencyKey.objects.filter(pk__in=list(expired[:batch_size])).delete()
+    return deleted
@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from orders import search
+from orders.models import Order
+
+
+User = get_user_model()
+
+FIRST_NAMES = ['asha', 'ravi', 'priya', 'arjun', 'meera', 'vikram', 'neha', 'rahul', 'kavya', 'sanjay',
+               'divya', 'karan', 'anita', 'rohit', 'pooja', 'amit', 'sneha', 'manoj', 'deepa', 'suresh']
+LAST_NAMES = ['sharma', 'iyer', 'patel', 'reddy', 'nair', 'gupta', 'singh', 'menon', 'rao', 'das',
+              'kumar', 'joshi', 'verma', 'pillai', 'bose', 'shah', 'mehta', 'kapoor', 'bhat', 'sen']
+
+
+class Command(BaseCommand):
+    help = 'Measure admin order search latency per query shape on a synthetic order table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--customers', type=int, default=200000)
+        parser.add_argument('--queries', type=int, default=200, help='Queries per shape')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--explain', action='store_true', help='Print the plan of one query per shape')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Everything is inserted in one transaction and rolled back afterwards
+        with transaction.atomic():
+            started = time.perf_counter()
+            users, orders = self._populate(rng, options['customers'], options['orders'])
+            self.stdout.write(
+                f'Inserted {len(users)} customers and {len(orders)} orders '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
+            shapes = self._queries(rng, users, orders, options['queries'])
+            for shape, queries in shapes.items():
+                if options['explain']:
+                    self._explain(queries[0])
+                self._report(shape, queries)
+            transaction.set_rollback(True)
+
+    def _populate(self, rng, customers, count, batch_size=5000):
+        users = []
+        for start in range(0, customers, batch_size):
+            batch = [
+                User(
+                    username=f'benchmark-order-search-{i}',
+                    email=f'{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}{i}@example.com',
+                    password='!',
+                )
+                for i in range(start, min(start + batch_size, customers))
+            ]
+            users.extend(User.objects.bulk_create(batch))
+
+        first_day = date.today() - timedelta(days=730)
+        orders = []
+        for start in range(0, count, batch_size):
+            batch = []
+            for _ in range(start, min(start + batch_size, count)):
+                day = first_day + timedelta(days=rng.randrange(730))
+                phone = f'{rng.choice("6789")}{rng.randrange(10 ** 9):09d}'
+                batch.append(Order(
+                    user_id=rng.choice(users).pk,
+                    order_number=f"ORD-{day:%Y%m%d}-{rng.getrandbits(32):08X}",
+                    total_amount=rng.randrange(50, 5000),
+                    shipping_address='Benchmark',
+                    shipping_city='Benchmark',
+                    shipping_country='India',
+                    shipping_postal_code=f'{rng.randrange(110001, 855117):06d}',
+                    # bulk_create skips Order.save, which fills phone_digits
+                    phone=phone,
+                    phone_digits=phone,
+                ))
+            Order.objects.bulk_create(batch)
+            orders.extend((order.order_number, order.phone, order.shipping_postal_code) for order in batch)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'ANALYZE {User._meta.db_table}')
+                cursor.execute(f'ANALYZE {Order._meta.db_table}')
+        return users, orders
+
+    def _queries(self, rng, users, orders, count):
+        sample = [rng.choice(orders) for _ in range(count)]
+        emails = [rng.choice(users).email for _ in range(count)]
+        return {
+            'order number': [number for number, _, _ in sample],
+            'order prefix': [number[:15] for number, _, _ in sample],
+            'suffix': [number[-8:-2] for number, _, _ in sample],
+            'postal code': [postal_code for _, _, postal_code in sample],
+            'phone': [phone for _, phone, _ in sample],
+            'phone prefix': [phone[:7] for _, phone, _ in sample],
+            'email': [email.upper() for email in emails],
+            'email prefix': [email.split('@')[0] for email in emails],
+        }
+
+    def _page(self, query):
+        # The admin orders grid's query: one page, newest first
+        queryset = search.search(Order.objects.select_related('user'), query)
+        return queryset.order_by('-created_at')[:12]
+
+    def _explain(self, query):
+        self.stdout.write(f'{query!r} ({search.classify(query)[0]}):')
+        self.stdout.write(self._page(query).explain())
+
+    def _report(self, shape, queries):
+        list(self._page(queries[0]))  # warm up
+        timings = []
+        hits = 0
+        for query in queries:
+            started = time.perf_counter()
+            rows = list(self._page(query))
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += bool(rows)
+
+        timings.sort()
+
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{shape:>13}: {len(queries)} queries, {hits} with results: '
+            f'mean {statistics.mean(timings):.2f}ms  p50 {percentile(0.50):.2f}ms  '
+            f'p95 {percentile(0.95):.2f}ms  p99 {percentile(0.99):.2f}ms'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from orders.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Release expired cart stock holds back to available stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            # One short transaction per batch keeps product locks brief
+            count = release_expired(batch_size=options['batch_size'])
+            released += count
+            if count < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired stock holds'))
@@ -0,0 +1,121 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+
+from orders.checkout import CheckoutError, place_order
+from orders.models import Cart, CartItem, Order, StockReservation
+from orders.reservations import InsufficientStock, reserve
+from products.models import Category, Product
+
+
+User = get_user_model()
+
+SHIPPING = {
+    'shipping_address': 'Load test',
+    'shipping_city': 'Load test',
+    'shipping_country': 'India',
+    'shipping_postal_code': '000000',
+    'phone': '0000000000',
+}
+
+
+class Command(BaseCommand):
+    help = 'Simulate a flash sale: many carts contending for holds on one hot SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=50)
+        parser.add_argument('--shoppers', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--checkout-ratio', type=float, default=0.6)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Rows must be committed for the worker threads to see them, so the
+        # run creates its own data and deletes it afterwards
+        category = Category.objects.create(name='Load test')
+        product = Product.objects.create(
+            category=category, name='Load test hot SKU', description='Load test',
+            price=100, stock=options['stock'],
+        )
+        User.objects.bulk_create([
+            User(username=f'loadtest-{i}', email=f'loadtest-{i}@example.com')
+            for i in range(options['shoppers'])
+        ])
+        users = list(User.objects.filter(username__startswith='loadtest-').order_by('pk'))
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        plans = [(user, cart, rng.random() < options['checkout_ratio']) for user, cart in zip(users, carts)]
+
+        counters = {'held': 0, 'refused': 0, 'ordered': 0, 'failed_checkout': 0}
+        lock = threading.Lock()
+        timings = []
+
+        def shop(plan):
+            user, cart, checks_out = plan
+            outcomes = []
+            try:
+                started = time.perf_counter()
+                try:
+                    reserve(cart, product.pk, 1)
+                    CartItem.objects.create(cart=cart, product=product, quantity=1)
+                    outcomes.append('held')
+                except InsufficientStock:
+                    outcomes.append('refused')
+                elapsed = (time.perf_counter() - started) * 1000
+                if outcomes == ['held'] and checks_out:
+                    try:
+                        place_order(user, SHIPPING)
+                        outcomes.append('ordered')
+                    except CheckoutError:
+                        outcomes.append('failed_checkout')
+                with lock:
+                    for outcome in outcomes:
+                        counters[outcome] += 1
+                    timings.append(elapsed)
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(shop, plans))
+            duration = time.perf_counter() - started
+
+            product.refresh_from_db()
+            holds = StockReservation.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+            orders = Order.objects.filter(user__in=users).count()
+            timings.sort()
+            self.stdout.write(
+                f"{len(plans)} shoppers in {duration:.2f}s: {counters['held']} holds granted, "
+                f"{counters['refused']} refused, {counters['ordered']} orders, "
+                f"{counters['failed_checkout']} late checkout failures"
+            )
+            self.stdout.write(
+                f'reserve latency mean {statistics.mean(timings):.2f}ms  '
+                f'p95 {timings[int(len(timings) * 0.95)]:.2f}ms'
+            )
+            self.stdout.write(
+                f'stock {product.stock}  reserved {product.reserved_stock}  open holds {holds}'
+            )
+
+            consistent = (
+                product.stock == options['stock'] - orders
+                and product.reserved_stock == holds
+                and product.stock >= product.reserved_stock
+                and counters['failed_checkout'] == 0
+            )
+            if consistent:
+                self.stdout.write(self.style.SUCCESS('No oversell, counters consistent'))
+            else:
+                self.stdout.write(self.style.ERROR('Inconsistent stock counters'))
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            product.delete()
+            category.delete()
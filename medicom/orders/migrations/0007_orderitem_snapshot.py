@@ -0,0 +1,51 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:28
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_item_snapshots(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    last_pk = 0
+    while True:
+        items = list(
+            OrderItem.objects.filter(pk__gt=last_pk).select_related('product')
+            .order_by('pk')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        for item in items:
+            product = item.product
+            item.product_name = product.name
+            item.product_slug = product.slug
+            item.product_image = product.image.url if product.image else ''
+        OrderItem.objects.bulk_update(items, ['product_name', 'product_slug', 'product_image'])
+        last_pk = items[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_image',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_slug',
+            field=models.SlugField(blank=True),
+        ),
+        migrations.RunPython(backfill_item_snapshots, migrations.RunPython.noop),
+    ]
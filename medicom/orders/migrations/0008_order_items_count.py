@@ -0,0 +1,40 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_items_count(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    line_count = Subquery(
+        OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+        .values('order').annotate(total=Count('id')).values('total')
+    )
+    last_pk = 0
+    while True:
+        batch = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        Order.objects.filter(pk__in=batch).update(items_count=Coalesce(line_count, 0))
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_orderitem_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_items_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_expression_indexes(apps, schema_editor):
+    # Other databases serve these lookups with scans
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    user_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS order_number_suffix_like_idx "
+        "ON orders_order (right(order_number, 8) text_pattern_ops)"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS user_email_lower_like_idx "
+        f"ON {schema_editor.quote_name(user_table)} (lower(email) text_pattern_ops)"
+    )
+
+
+def drop_expression_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS order_number_suffix_like_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS user_email_lower_like_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_items_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_number'], name='order_number_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone'], name='order_phone_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['shipping_postal_code'], name='order_postal_code_idx'),
+        ),
+        migrations.RunPython(create_expression_indexes, drop_expression_indexes),
+    ]
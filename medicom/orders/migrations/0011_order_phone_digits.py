@@ -0,0 +1,45 @@
+# Generated by Django 5.2.10 on 2026-10-18 21:38
+
+from django.db import migrations, models
+
+from orders.search import normalize_phone
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_phone_digits(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    last_pk = 0
+    while True:
+        batch = list(Order.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'phone')[:BATCH_SIZE])
+        if not batch:
+            break
+        for order in batch:
+            order.phone_digits = normalize_phone(order.phone)
+        Order.objects.bulk_update(batch, ['phone_digits'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_order_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='phone_digits',
+            field=models.CharField(blank=True, editable=False, max_length=15),
+        ),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_phone_like_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone_digits'], name='order_phone_digits_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
-from products.models import Product
+from rest_framework.utils.encoders import JSONEncoder
+from products.models import Product, StockShard
+from .search import normalize_phone
 import uuid
 
 User = get_user_model()
@@ -21,6 +25,21 @@ class Order(models.Model):
         ('refunded', 'Refunded'),
     ]
     
+    # Allowed moves (see orders.transitions); terminal values map to nothing
+    STATUS_TRANSITIONS = {
+        'pending': {'processing', 'shipped', 'cancelled'},
+        'processing': {'shipped', 'cancelled'},
+        'shipped': {'delivered'},
+        'delivered': set(),
+        'cancelled': set(),
+    }
+    PAYMENT_STATUS_TRANSITIONS = {
+        'pending': {'paid', 'failed'},
+        'failed': {'paid'},
+        'paid': {'refunded'},
+        'refunded': set(),
+    }
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     order_number = models.CharField(max_length=100, unique=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -36,6 +55,8 @@ class Order(models.Model):
     shipping_pincode = models.CharField(max_length=20, blank=True)
     shipping_phone = models.CharField(max_length=15, blank=True)
     phone = models.CharField(max_length=15)
+    # ``phone`` as national digits (orders.search.normalize_phone), set on save
+    phone_digits = models.CharField(max_length=15, blank=True, editable=False)
     
     # Payment information
     payment_method = models.CharField(max_length=50, default='card')
@@ -45,11 +66,23 @@ class Order(models.Model):
     # Tracking
     tracking_number = models.CharField(max_length=100, blank=True)
     
+    # Number of item lines; set by checkout, kept up to date by orders.signals
+    items_count = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination for the admin list and per-customer history
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_id_idx'),
+            # Support lookups (orders.search); LIKE 'x%' needs the pattern opclass on PostgreSQL
+            models.Index(fields=['order_number'], name='order_number_like_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone_digits'], name='order_phone_digits_like_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['shipping_postal_code'], name='order_postal_code_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.order_number:
@@ -64,6 +97,11 @@ class Order(models.Model):
             self.payment_status = 'paid'
         elif self.payment_status == 'paid' and not self.is_paid:
             self.is_paid = True
+        
+        self.phone_digits = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_digits'}
             
         super().save(*args, **kwargs)
     
@@ -74,14 +112,72 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    # Unit price at checkout
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Snapshot of the product as bought; order history reads these, not the product
+    product_name = models.CharField(max_length=200, blank=True)
+    product_slug = models.SlugField(max_length=50, blank=True)
+    product_image = models.CharField(max_length=500, blank=True)
     
     def __str__(self):
-        return f'{self.quantity} x {self.product.name}'
+        return f'{self.quantity} x {self.product_name}'
     
     def get_subtotal(self):
         return self.quantity * self.price
 
+    @staticmethod
+    def snapshot(product):
+        """Snapshot fields for an item of ``product``."""
+        return {
+            'product_name': product.name,
+            'product_slug': product.slug,
+            'product_image': product.image.url if product.image else '',
+        }
+
+class OrderEvent(models.Model):
+    """
+    One status or payment-status transition of an order, written by
+    ``orders.transitions`` in the transition's transaction.  Rows are only
+    ever inserted.
+    """
+    FIELD_CHOICES = [
+        ('status', 'Status'),
+        ('payment_status', 'Payment status'),
+    ]
+    
+    order = models.ForeignKey(Order, related_name='events', on_delete=models.CASCADE)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    from_value = models.CharField(max_length=20)
+    to_value = models.CharField(max_length=20)
+    # When the order entered from_value, so time in a state needs no self-join
+    entered_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    actor = models.ForeignKey(User, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            # An order's timeline, and the latest event per field
+            models.Index(fields=['order', 'field', '-created_at'], name='order_event_order_idx'),
+            # Time-in-state aggregates over a period
+            models.Index(fields=['field', 'from_value', 'created_at'], name='order_event_state_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order events are append-only')
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f'{self.order_id}: {self.field} {self.from_value} -> {self.to_value}'
+
+def line_subtotal(prefix=''):
+    """``quantity * product.price`` of a cart line, computed in SQL."""
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}product__price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -90,13 +186,30 @@ class Cart(models.Model):
     def __str__(self):
         return f'Cart for {self.user.email}'
     
+    def get_totals(self):
+        """``{'total', 'item_count'}`` of the cart in one aggregate query."""
+        return self.items.aggregate(
+            total=Coalesce(Sum(line_subtotal()), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            item_count=Coalesce(Sum('quantity'), Value(0)),
+        )
+    
     def get_total(self):
-        return sum([item.get_subtotal() for item in self.items.all()])
+        return self.get_totals()['total']
+
+class CartItemQuerySet(models.QuerySet):
+    def with_subtotals(self):
+        return self.annotate(line_subtotal=line_subtotal())
+
+    def for_display(self):
+        """Lines as the cart API renders them: subtotal and product in one query."""
+        return self.with_subtotals().select_related('product__category').order_by('id')
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+
+    objects = CartItemQuerySet.as_manager()
     
     class Meta:
         unique_together = ('cart', 'product')
@@ -105,4 +218,51 @@ class CartItem(models.Model):
         return f'{self.quantity} x {self.product.name}'
     
     def get_subtotal(self):
-        return self.quantity * self.product.price
\ No newline at end of file
+        if 'line_subtotal' in self.__dict__:
+            return self.line_subtotal
+        return self.quantity * self.product.price
+
+class StockReservation(models.Model):
+    """
+    A time-boxed hold of ``quantity`` units of a product by a cart.
+
+    Holds are counted into ``Product.reserved_stock`` (or their shard's
+    ``reserved``) while the row exists; see ``orders.reservations``.
+    """
+    cart = models.ForeignKey(Cart, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    # Set for sharded products: the StockShard whose ``reserved`` counts this hold
+    shard = models.ForeignKey(StockShard, null=True, blank=True, related_name='reservations', on_delete=models.SET_NULL)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('cart', 'product')
+
+    def __str__(self):
+        return f'{self.quantity} x {self.product_id} held by cart {self.cart_id}'
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a request sent with an ``Idempotency-Key`` header.
+
+    Retries with the same key replay the stored response instead of running
+    the request again; see ``orders.idempotency``.
+    """
+    user = models.ForeignKey(User, related_name='idempotency_keys', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body, so a key cannot be reused for another request
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    # Encoded like the API renders it, so replays match the original bytes
+    response_body = models.JSONField(null=True, encoder=JSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f'{self.key} for user {self.user_id}'
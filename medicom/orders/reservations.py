@@ -0,0 +1,253 @@
+"""
+Time-boxed stock holds for carts.
+
+Adding a product to a cart holds the requested units for
+``settings.CART_HOLD_SECONDS``; any cart activity pushes the deadline out,
+and checkout or removal from the cart releases the hold.  Every hold row is
+counted into ``Product.reserved_stock``, so availability is a column read
+(``stock - reserved_stock``) rather than a sum over holds.
+
+Holds on sharded products (``products.inventory``) are counted into one
+shard's ``reserved`` instead, recorded on the hold, and never lock the
+product row.
+
+Expired holds keep counting until ``manage.py expire_stock_holds`` (run it
+every minute) or a reservation that would otherwise fail releases them.
+Locks are always taken product row first, then hold rows, then shards, the
+same order as checkout.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, When
+from django.utils import timezone
+
+from products import inventory
+from products.models import Product, StockShard
+from .models import StockReservation
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def hold_deadline():
+    return timezone.now() + timedelta(seconds=settings.CART_HOLD_SECONDS)
+
+
+def reserve(cart, product_id, quantity):
+    """Make ``cart``'s hold on ``product_id`` exactly ``quantity`` units."""
+    if quantity < 0:
+        raise ValueError(f'Cannot hold {quantity} units')
+    with transaction.atomic():
+        for attempt in range(2):
+            if Product.objects.filter(pk=product_id, stock_shards__gt=0).exists():
+                shard_id = _reserve_on_shard(cart, product_id, quantity)
+                if shard_id is not None:
+                    return
+            else:
+                product = Product.objects.select_for_update().only(
+                    'id', 'stock', 'reserved_stock', 'stock_shards'
+                ).get(pk=product_id)
+                if product.stock_shards:
+                    continue  # sharded while we waited for the lock
+                hold = StockReservation.objects.select_for_update().filter(cart=cart, product_id=product_id).first()
+                delta = quantity - (hold.quantity if hold else 0)
+                if delta <= 0 or product.stock - product.reserved_stock >= delta:
+                    if delta:
+                        Product.objects.filter(pk=product_id).update(reserved_stock=F('reserved_stock') + delta)
+                    _save_hold(hold, cart, product_id, quantity)
+                    return
+            # Expired holds may still be counted; release them once and retry
+            if attempt or not release_expired(product_ids=[product_id]):
+                raise InsufficientStock
+        raise InsufficientStock
+
+
+def reserve_many(cart, quantities):
+    """
+    Make ``cart``'s holds exactly ``{product_id: quantity}`` (0 drops the hold).
+
+    Plain products are checked under one locking read and updated in bulk;
+    sharded ones go through ``reserve``.  If any product is short nothing
+    changes and InsufficientStock is raised with the short product ids.
+    """
+    with transaction.atomic():
+        for attempt in range(2):
+            products = {
+                product.pk: product
+                for product in Product.objects.select_for_update()
+                .filter(pk__in=quantities, stock_shards=0)
+                .order_by('pk')
+                .only('id', 'stock', 'reserved_stock', 'stock_shards')
+            }
+            holds = {
+                hold.product_id: hold
+                for hold in StockReservation.objects.select_for_update().filter(cart=cart, product_id__in=products)
+            }
+            deltas = {
+                pk: quantities[pk] - (holds[pk].quantity if pk in holds else 0) for pk in products
+            }
+            short = [
+                pk for pk, delta in deltas.items()
+                if delta > 0 and products[pk].stock - products[pk].reserved_stock < delta
+            ]
+            if not short:
+                break
+            # Expired holds may still be counted; release them once and retry
+            if attempt or not release_expired(product_ids=short):
+                raise InsufficientStock(short)
+
+        changed = {pk: delta for pk, delta in deltas.items() if delta}
+        if changed:
+            Product.objects.filter(pk__in=changed).update(reserved_stock=Case(
+                *[When(pk=pk, then=F('reserved_stock') + delta) for pk, delta in changed.items()],
+                output_field=PositiveIntegerField(),
+            ))
+        deadline = hold_deadline()
+        kept = []
+        for pk, hold in holds.items():
+            hold.quantity, hold.expires_at = quantities[pk], deadline
+            if hold.quantity:
+                kept.append(hold)
+        StockReservation.objects.bulk_update(kept, ['quantity', 'expires_at'])
+        StockReservation.objects.filter(pk__in=[hold.pk for hold in holds.values() if not hold.quantity]).delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(cart=cart, product_id=pk, quantity=quantities[pk], expires_at=deadline)
+            for pk in products if pk not in holds and quantities[pk]
+        ])
+
+        short = []
+        sharded = Product.objects.filter(pk__in=quantities, stock_shards__gt=0).order_by('pk')
+        for pk in sharded.values_list('pk', flat=True):
+            if not quantities[pk]:
+                release(cart, [pk])
+                continue
+            try:
+                reserve(cart, pk, quantities[pk])
+            except InsufficientStock:
+                short.append(pk)
+        if short:
+            raise InsufficientStock(short)
+
+
+def _reserve_on_shard(cart, product_id, quantity):
+    """Place the hold on one shard; returns the shard id, or None if no shard has room."""
+    hold = StockReservation.objects.select_for_update().filter(cart=cart, product_id=product_id).first()
+    held = hold.quantity if hold else 0
+    shard_id = hold.shard_id if hold else None
+    delta = quantity - held
+
+    if delta < 0:
+        StockShard.objects.filter(pk=shard_id).update(reserved=F('reserved') + delta)
+    elif delta > 0 and not (shard_id and inventory.take(shard_id, delta, reserve=True)):
+        # The hold's shard is full: move the whole hold to a shard with room
+        new_shard_id = inventory.acquire(product_id, quantity, reserve=True)
+        if new_shard_id is None:
+            return None
+        if shard_id:
+            StockShard.objects.filter(pk=shard_id).update(reserved=F('reserved') - held)
+        shard_id = new_shard_id
+    _save_hold(hold, cart, product_id, quantity, shard_id)
+    return shard_id
+
+
+def _save_hold(hold, cart, product_id, quantity, shard_id=None):
+    if hold:
+        hold.quantity = quantity
+        hold.shard_id = shard_id
+        hold.expires_at = hold_deadline()
+        hold.save(update_fields=['quantity', 'shard', 'expires_at'])
+    else:
+        StockReservation.objects.create(
+            cart=cart, product_id=product_id, shard_id=shard_id, quantity=quantity, expires_at=hold_deadline()
+        )
+
+
+def extend(cart):
+    """Push every hold of ``cart`` out to a fresh deadline."""
+    StockReservation.objects.filter(cart=cart).update(expires_at=hold_deadline())
+
+
+def release(cart, product_ids=None):
+    """Drop ``cart``'s holds (on ``product_ids`` only, if given)."""
+    with transaction.atomic():
+        holds = StockReservation.objects.filter(cart=cart)
+        if product_ids is not None:
+            holds = holds.filter(product_id__in=product_ids)
+        held_products = list(holds.filter(shard__isnull=True).values_list('product_id', flat=True))
+        _lock_products(held_products)
+        rows = list(holds.select_for_update().values_list('product_id', 'shard_id', 'quantity'))
+        if rows:
+            _return_to_stock(rows)
+            holds.delete()
+
+
+def release_expired(batch_size=1000, product_ids=None):
+    """Release up to ``batch_size`` expired holds; returns how many were released."""
+    with transaction.atomic():
+        expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+        if product_ids is not None:
+            expired = expired.filter(product_id__in=product_ids)
+        candidates = list(
+            expired.order_by('expires_at').values_list('product_id', 'shard_id')[:batch_size]
+        )
+        if not candidates:
+            return 0
+        _lock_products([product_id for product_id, shard_id in candidates if shard_id is None])
+        # Re-read under the locks: a hold may have been renewed meanwhile
+        rows = list(
+            expired.filter(product_id__in={product_id for product_id, _ in candidates})
+            .select_for_update()
+            .order_by('expires_at')
+            .values_list('id', 'product_id', 'shard_id', 'quantity')[:batch_size]
+        )
+        if rows:
+            _return_to_stock([row[1:] for row in rows])
+        StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        return len(rows)
+
+
+def consume(cart_id):
+    """
+    Return ``{product_id: (shard_id, held quantity)}`` for checkout and delete the holds.
+
+    The caller holds the product locks and moves the units out of
+    ``reserved_stock`` (or the shard's ``reserved``) in its own stock update.
+    """
+    holds = StockReservation.objects.filter(cart_id=cart_id)
+    held = {
+        product_id: (shard_id, quantity)
+        for product_id, shard_id, quantity in holds.values_list('product_id', 'shard_id', 'quantity')
+    }
+    if held:
+        holds.delete()
+    return held
+
+
+def _lock_products(product_ids):
+    if product_ids:
+        list(Product.objects.select_for_update().filter(pk__in=set(product_ids)).order_by('pk').values_list('pk'))
+
+
+def _return_to_stock(rows):
+    """Give back ``(product_id, shard_id, quantity)`` holds to their counters."""
+    by_product, by_shard = {}, {}
+    for product_id, shard_id, quantity in rows:
+        if shard_id is None:
+            by_product[product_id] = by_product.get(product_id, 0) + quantity
+        else:
+            by_shard[shard_id] = by_shard.get(shard_id, 0) + quantity
+    if by_product:
+        Product.objects.filter(pk__in=by_product).update(
+            reserved_stock=Case(*[
+                When(pk=pk, then=F('reserved_stock') - quantity) for pk, quantity in by_product.items()
+            ], output_field=PositiveIntegerField())
+        )
+    if by_shard:
+        StockShard.objects.filter(pk__in=by_shard).update(
+            reserved=Case(*[
+                When(pk=pk, then=F('reserved') - quantity) for pk, quantity in by_shard.items()
+            ], output_field=PositiveIntegerField())
+        )
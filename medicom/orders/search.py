@@ -0,0 +1,88 @@
+"""
+Order lookup for support staff.
+
+A support query is one of a handful of shapes, so rather than ``ILIKE
+'%x%'`` over several columns (a join plus sequential scans) ``search``
+recognizes the shape and runs one prefix or equality lookup that an index
+serves:
+
+==============================  =====================================  ==============================
+query                           lookup                                 PostgreSQL index
+==============================  =====================================  ==============================
+``ORD-20261018-A1B2``           order number prefix                    ``order_number_like_idx``
+``A1B2``, ``a1b2c3d4``          prefix of the 8-character suffix       ``order_number_suffix_like_idx``
+``560001``                      postal code, or suffix prefix          ``order_postal_code_idx`` + above
+``98450 12345``, ``9845012``    phone prefix, as digits                ``order_phone_digits_like_idx``
+``asha@example.com``, ``asha``  customer email prefix, any case        ``user_email_lower_like_idx``
+==============================  =====================================  ==============================
+
+Phones are matched on ``Order.phone_digits``, the stored phone reduced by
+``normalize_phone`` to its national number's digits, so ``+91 98450-12345``
+is found by ``9845012345`` and the other way round.
+
+``LIKE 'x%'`` needs ``varchar_pattern_ops``/``text_pattern_ops`` indexes on
+PostgreSQL; the two expression indexes are created by orders migration 0009
+there only, and other databases get the same results from scans.
+``manage.py benchmark_order_search`` measures the lookups.
+"""
+import re
+
+from django.db.models import Q
+from django.db.models.functions import Lower, Right
+
+
+ORDER_NUMBER_RE = re.compile(r'^ORD(-\d{0,8}(-[0-9A-F]{0,8})?)?$')
+SUFFIX_RE = re.compile(r'^(?=.*\d)[0-9A-F]{4,8}$')
+PHONE_RE = re.compile(r'^\+?[\d\s()-]+$')
+POSTAL_CODE_LENGTH = 6
+MIN_PHONE_DIGITS = 7
+COUNTRY_CODE = '91'
+NATIONAL_PHONE_DIGITS = 10
+SUFFIX_LENGTH = 8
+
+
+def normalize_phone(phone):
+    """The digits of ``phone`` without a +91 country code or trunk 0, as stored in ``Order.phone_digits``."""
+    digits = re.sub(r'\D', '', phone)
+    if phone.lstrip().startswith('+') and digits.startswith(COUNTRY_CODE):
+        digits = digits[len(COUNTRY_CODE):]
+    # National numbers never start with 0; a leading one is the trunk prefix
+    return digits.removeprefix('0')[-NATIONAL_PHONE_DIGITS:]
+
+
+def classify(query):
+    """Return ``(kind, value)`` for a support query; ``kind`` is None for an empty one."""
+    query = query.strip()
+    if not query:
+        return None, ''
+    upper = query.upper()
+    if ORDER_NUMBER_RE.match(upper):
+        return 'order_number', upper
+    if PHONE_RE.match(query):
+        digits = re.sub(r'\D', '', query)
+        if len(digits) == POSTAL_CODE_LENGTH:
+            return 'postal_code', digits
+        if len(digits) >= MIN_PHONE_DIGITS:
+            return 'phone', normalize_phone(query)
+    if SUFFIX_RE.match(upper):
+        return 'suffix', upper
+    return 'email', query.lower()
+
+
+def search(queryset, query):
+    """Filter an Order ``queryset`` to the orders matching a support ``query``."""
+    kind, value = classify(query)
+    if kind is None:
+        return queryset
+    if kind == 'order_number':
+        return queryset.filter(order_number__startswith=value)
+    if kind in ('suffix', 'postal_code'):
+        queryset = queryset.annotate(order_number_suffix=Right('order_number', SUFFIX_LENGTH))
+        suffix = Q(order_number_suffix__startswith=value)
+        if kind == 'postal_code':
+            # Six digits may also start a suffix; the two index scans are OR-ed
+            return queryset.filter(Q(shipping_postal_code=value) | suffix)
+        return queryset.filter(suffix)
+    if kind == 'phone':
+        return queryset.filter(phone_digits__startswith=value)
+    return queryset.annotate(user_email_lower=Lower('user__email')).filter(user_email_lower__startswith=value)
@@ -1,14 +1,19 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Order, OrderItem, Cart, CartItem
-from products.serializers import ProductSerializer
+from .models import Order, OrderEvent, OrderItem, Cart, CartItem
+from products.models import Product
+from products.serializers import CategorySummarySerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    """An order line as bought: reads only the snapshot, never the live product."""
     subtotal = serializers.SerializerMethodField()
     
     class Meta:
         model = OrderItem
-        fields = ('id', 'product', 'quantity', 'price', 'subtotal')
+        fields = ('id', 'product', 'product_name', 'product_slug', 'product_image',
+                  'quantity', 'price', 'subtotal')
+        read_only_fields = fields
     
     def get_subtotal(self, obj):
         return obj.get_subtotal()
@@ -23,7 +28,25 @@ class OrderSerializer(serializers.ModelSerializer):
                   'shipping_city', 'shipping_country', 'shipping_postal_code', 
                   'phone', 'payment_method', 'is_paid', 'paid_at', 
                   'tracking_number', 'created_at', 'updated_at', 'items')
-        read_only_fields = ('id', 'user', 'created_at', 'updated_at', 'paid_at')
+        # Status moves go through orders.transitions, never a plain write
+        read_only_fields = ('id', 'user', 'status', 'is_paid', 'created_at', 'updated_at', 'paid_at')
+
+class OrderEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderEvent
+        fields = ('id', 'field', 'from_value', 'to_value', 'entered_at', 'created_at')
+        read_only_fields = fields
+
+class OrderTimelineSerializer(serializers.ModelSerializer):
+    """An order's status and payment-status changes, oldest first."""
+    order = serializers.IntegerField(source='id', read_only=True)
+    placed_at = serializers.DateTimeField(source='created_at', read_only=True)
+    events = OrderEventSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Order
+        fields = ('order', 'order_number', 'status', 'payment_status', 'placed_at', 'events')
+        read_only_fields = fields
 
 class CreateOrderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,8 +54,21 @@ class CreateOrderSerializer(serializers.ModelSerializer):
         fields = ('shipping_address', 'shipping_city', 'shipping_country', 
                   'shipping_postal_code', 'phone', 'payment_method')
 
+class CartProductSerializer(serializers.ModelSerializer):
+    """The product fields a cart line needs; no reviews or descriptions."""
+    category = CategorySummarySerializer(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'slug', 'name', 'price', 'image', 'is_available', 'category')
+        read_only_fields = fields
+
 class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+    """
+    A cart line.  Expects ``CartItem.objects.for_display()`` rows, whose
+    subtotal is computed in SQL and product fetched in the same query.
+    """
+    product = CartProductSerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     subtotal = serializers.SerializerMethodField()
     
@@ -45,13 +81,33 @@ class CartItemSerializer(serializers.ModelSerializer):
         return obj.get_subtotal()
 
 class CartSerializer(serializers.ModelSerializer):
+    """Expects ``items`` prefetched with ``CartItem.objects.for_display()``."""
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.SerializerMethodField()
+    item_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Cart
-        fields = ('id', 'items', 'total', 'created_at', 'updated_at')
+        fields = ('id', 'items', 'total', 'item_count', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
     
     def get_total(self, obj):
-        return obj.get_total()
\ No newline at end of file
+        return sum((item.get_subtotal() for item in obj.items.all()), Decimal('0.00'))
+
+    def get_item_count(self, obj):
+        return sum(item.quantity for item in obj.items.all())
+
+class CartAddSerializer(serializers.Serializer):
+    """A cart add: ``quantity`` more units of ``product_id``."""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class CartUpdateSerializer(serializers.Serializer):
+    """A cart line change: set ``item_id``'s line to ``quantity`` (0 removes)."""
+    item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+class CartBatchLineSerializer(serializers.Serializer):
+    """One operation of a cart batch: set ``product_id``'s line to ``quantity`` (0 removes)."""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
@@ -0,0 +1,37 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_delete, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from . import reservations
+from .models import Cart, Order, OrderItem
+
+
+# Sent with ``events`` (the OrderEvents written) inside the transition's transaction
+order_transitioned = Signal()
+# Sent by checkout with ``quantities`` ({product_id: units}) inside its transaction
+stock_taken = Signal()
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_holds(sender, instance, **kwargs):
+    """Hand a deleted cart's held units back before its holds cascade away."""
+    reservations.release(instance)
+
+
+def recount_items(order_id):
+    lines = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(total=Count('id'))
+    Order.objects.filter(pk=order_id).update(items_count=Coalesce(Subquery(lines.values('total')), 0))
+
+
+@receiver(post_save, sender=OrderItem)
+def count_order_item(sender, instance, created, **kwargs):
+    # Checkout bulk-creates its items and sets items_count itself
+    if created:
+        recount_items(instance.order_id)
+
+
+@receiver(post_delete, sender=OrderItem)
+def uncount_order_item(sender, instance, **kwargs):
+    # A recount rather than a decrement: bulk-created lines never counted themselves in
+    recount_items(instance.order_id)
@@ -1,3 +1,974 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from products.inventory import set_stock, shard_product, unshard_product
+from products.models import Product, Category, Review, StockShard
+from orders import transitions
+from orders.models import Order, OrderEvent, Cart, CartItem, IdempotencyKey, StockReservation
+from orders.reservations import InsufficientStock, reserve
+
+User = get_user_model()
+
+SHIPPING = {
+    'shipping_address': '12 MG Road',
+    'shipping_city': 'Bengaluru',
+    'shipping_country': 'India',
+    'shipping_postal_code': '560001',
+    'phone': '9999999999',
+    'payment_method': 'cod',
+}
+
+
+def fill_cart(user, lines):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=quantity) for product, quantity in lines
+    ])
+    return cart
+
+
+# One rollup shard, so every checkout books into the day row the customer's signup created
+@override_settings(ROLLUP_SHARDS=1)
+class CheckoutTestCase(TestCase):
+    """Test cases for placing an order from the cart"""
+
+    def setUp(self):
+        """Set up a customer and a few products"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='buyer@test.com',
+            username='buyer',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Pain Relief')
+        self.products = [
+            Product.objects.create(
+                name=f'Medicine {i}',
+                description='Tablets',
+                price=10 + i,
+                stock=10,
+                category=self.category
+            )
+            for i in range(6)
+        ]
+
+    def test_checkout_moves_cart_into_order(self):
+        """Test that checkout creates items, takes stock and empties the cart"""
+        fill_cart(self.user, [(self.products[0], 2), (self.products[1], 3)])
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total_amount, 2 * 10 + 3 * 11)
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'quantity', 'price')),
+            [(self.products[0].id, 2, 10), (self.products[1].id, 3, 11)]
+        )
+        self.products[0].refresh_from_db()
+        self.products[1].refresh_from_db()
+        self.assertEqual((self.products[0].stock, self.products[1].stock), (8, 7))
+        self.assertFalse(CartItem.objects.filter(cart__user=self.user).exists())
+
+    def test_insufficient_stock_changes_nothing(self):
+        """Test that a short line rolls back the whole checkout"""
+        fill_cart(self.user, [(self.products[0], 2), (self.products[1], 11)])
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Insufficient stock for Medicine 1')
+
+        self.assertFalse(Order.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 10)
+        self.assertEqual(CartItem.objects.filter(cart__user=self.user).count(), 2)
+
+    def test_empty_cart(self):
+        """Test that an empty cart cannot be checked out"""
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Cart is empty')
+
+    def checkout_queries(self, lines):
+        fill_cart(self.user, lines)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return len(queries)
+
+    def test_query_count_independent_of_cart_size(self):
+        """Test that a six-line cart costs the same queries as a one-line cart"""
+        small = self.checkout_queries([(self.products[0], 1)])
+        large = self.checkout_queries([(product, 1) for product in self.products])
+        self.assertEqual(small, large)
+
+
+class OrderHistoryTestCase(TestCase):
+    """Test cases for the customer order history"""
+
+    def setUp(self):
+        """Set up a customer and reviewed products"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='history@test.com',
+            username='history',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Vitamins')
+        self.products = [
+            Product.objects.create(
+                name=f'Vitamin {letter}', description='Tablets', price=50, stock=100, category=category
+            )
+            for letter in 'ABC'
+        ]
+        for product in self.products:
+            Review.objects.create(product=product, user=self.user, rating=5, comment='Good')
+
+    def place(self, lines):
+        fill_cart(self.user, lines)
+        return self.client.post('/api/orders/orders/', SHIPPING, format='json')
+
+    def test_items_show_product_as_bought(self):
+        """Test that order lines keep the name and price from checkout"""
+        self.place([(self.products[0], 2)])
+        Product.objects.filter(pk=self.products[0].pk).update(name='Vitamin A Forte', price=80)
+
+        item = self.client.get('/api/orders/orders/').data['results'][0]['items'][0]
+        self.assertEqual(item['product'], self.products[0].id)
+        self.assertEqual(item['product_name'], 'Vitamin A')
+        self.assertEqual(item['product_slug'], self.products[0].slug)
+        self.assertEqual(item['price'], '50.00')
+
+    def test_history_query_count_independent_of_orders(self):
+        """Test that the order list costs the same queries for one or many orders"""
+        self.place([(self.products[0], 1)])
+
+        def history_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/orders/orders/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        one = history_queries()
+        for _ in range(3):
+            self.place([(product, 1) for product in self.products])
+        self.assertEqual(history_queries(), one)
+
+
+class CartTotalsTestCase(TestCase):
+    """Test cases for cart totals and compact cart responses"""
+
+    def setUp(self):
+        """Set up a shopper with a three-line cart"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='cart@test.com',
+            username='cart',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='First Aid')
+        self.products = [
+            Product.objects.create(
+                name=f'Bandage {i}', description='Sterile', price='12.50', stock=50, category=category
+            )
+            for i in range(6)
+        ]
+        for product in self.products:
+            Review.objects.create(product=product, user=self.user, rating=4, comment='Fine')
+        self.cart = fill_cart(self.user, [(product, 2) for product in self.products[:3]])
+
+    def test_cart_totals(self):
+        """Test that subtotals and totals match quantity times price"""
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['subtotal'] for item in response.data['items']], [25, 25, 25])
+        self.assertEqual((response.data['total'], response.data['item_count']), (75, 6))
+        self.assertNotIn('reviews', response.data['items'][0]['product'])
+        self.assertEqual(self.cart.get_totals(), {'total': 75, 'item_count': 6})
+
+    def test_compact_mutations(self):
+        """Test that ?compact=1 returns only the changed line and new totals"""
+        item = CartItem.objects.get(cart=self.cart, product=self.products[0])
+        response = self.client.put(
+            '/api/orders/cart/update_item/?compact=1', {'item_id': item.id, 'quantity': 4}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['item']['id'], item.id)
+        self.assertEqual(response.data['item']['subtotal'], 50)
+        self.assertEqual((response.data['total'], response.data['item_count']), (100, 8))
+
+        response = self.client.delete(
+            '/api/orders/cart/remove_item/?compact=1', {'item_id': item.id}, format='json'
+        )
+        self.assertIsNone(response.data['item'])
+        self.assertEqual((response.data['total'], response.data['item_count']), (50, 4))
+
+    def test_query_count_independent_of_cart_size(self):
+        """Test that reading and updating a cart costs the same queries at any size"""
+        item = CartItem.objects.get(cart=self.cart, product=self.products[0])
+
+        def cart_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/orders/cart/')
+                self.client.put(
+                    '/api/orders/cart/update_item/?compact=1', {'item_id': item.id, 'quantity': 1}, format='json'
+                )
+            return len(queries)
+
+        cart_queries()  # the first update creates the line's hold
+        small = cart_queries()
+        fill_cart(self.user, [(product, 1) for product in self.products[3:]])
+        self.assertEqual(cart_queries(), small)
+
+
+class CartBatchTestCase(TestCase):
+    """Test cases for the batch cart endpoint"""
+
+    def setUp(self):
+        """Set up a shopper whose cart holds two products"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='batch@test.com',
+            username='batch',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Baby Care')
+        self.products = [
+            Product.objects.create(
+                name=f'Baby Lotion {i}', description='Mild', price=60, stock=5, category=category
+            )
+            for i in range(8)
+        ]
+        self.cart = Cart.objects.create(user=self.user)
+        for product in self.products[:2]:
+            reserve(self.cart, product.id, 2)
+        fill_cart(self.user, [(product, 2) for product in self.products[:2]])
+
+    def batch(self, items, client=None):
+        return (client or self.client).put('/api/orders/cart/batch/', {'items': items}, format='json')
+
+    def lines(self):
+        return list(CartItem.objects.filter(cart=self.cart).order_by('product_id').values_list('product_id', 'quantity'))
+
+    def test_batch_applies_every_line(self):
+        """Test that one request updates, removes and adds lines and their holds"""
+        first, second, third = self.products[:3]
+        response = self.batch([
+            {'product_id': first.id, 'quantity': 5},
+            {'product_id': second.id, 'quantity': 0},
+            {'product_id': third.id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['item_count'], 6)
+        self.assertEqual(self.lines(), [(first.id, 5), (third.id, 1)])
+        self.assertEqual(
+            list(StockReservation.objects.order_by('product_id').values_list('product_id', 'quantity')),
+            [(first.id, 5), (third.id, 1)]
+        )
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[first.id, second.id, third.id]).order_by('pk')
+                 .values_list('reserved_stock', flat=True)),
+            [5, 0, 1]
+        )
+
+    def test_short_line_rejects_whole_batch(self):
+        """Test that a line short of stock changes nothing and is reported by index"""
+        response = self.batch([
+            {'product_id': self.products[1].id, 'quantity': 0},
+            {'product_id': self.products[0].id, 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'], [
+            {'index': 1, 'product_id': self.products[0].id, 'error': 'Insufficient stock'}
+        ])
+        self.assertEqual(self.lines(), [(self.products[0].id, 2), (self.products[1].id, 2)])
+        self.products[1].refresh_from_db()
+        self.assertEqual(self.products[1].reserved_stock, 2)
+
+    def test_invalid_lines_are_reported(self):
+        """Test that malformed, unknown and duplicate lines come back per index"""
+        response = self.batch([{'product_id': self.products[0].id, 'quantity': -1}])
+        self.assertEqual(response.data['errors'][0]['index'], 0)
+        self.assertIn('quantity', response.data['errors'][0]['error'])
+
+        response = self.batch([
+            {'product_id': 999999, 'quantity': 1},
+            {'product_id': self.products[0].id, 'quantity': 1},
+            {'product_id': self.products[0].id, 'quantity': 2},
+        ])
+        self.assertEqual(
+            [(error['index'], error['error']) for error in response.data['errors']],
+            [(0, 'Product not found'), (2, 'Duplicate product')]
+        )
+
+    def test_query_count_independent_of_batch_size(self):
+        """Test that a batch of six lines costs the same queries as a batch of two"""
+        def batch_queries(products):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch([{'product_id': product.id, 'quantity': 3} for product in products])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        self.assertEqual(batch_queries(self.products[2:4]), batch_queries(self.products[4:]))
+
+    def test_guest_batch(self):
+        """Test that visitors can batch-edit their cookie cart"""
+        guest = APIClient()
+        response = self.batch([
+            {'product_id': self.products[0].id, 'quantity': 2},
+            {'product_id': self.products[1].id, 'quantity': 1},
+        ], guest)
+        self.assertEqual(response.data['item_count'], 3)
+        response = self.batch([{'product_id': self.products[0].id, 'quantity': 0}], guest)
+        self.assertEqual([item['id'] for item in response.data['items']], [self.products[1].id])
+
+
+class GuestCartTestCase(TestCase):
+    """Test cases for cookie-backed guest carts"""
+
+    def setUp(self):
+        """Set up a visitor and two products"""
+        self.client = APIClient()
+        category = Category.objects.create(name='Skin Care')
+        self.cream = Product.objects.create(
+            name='Aloe Cream', description='Soothing', price=120, stock=5, category=category
+        )
+        self.soap = Product.objects.create(
+            name='Neem Soap', description='Herbal', price=40, stock=20, category=category
+        )
+        self.user = User.objects.create_user(
+            email='guest@test.com',
+            username='guest',
+            password='testpass123'
+        )
+
+    def add(self, product, quantity):
+        return self.client.post('/api/orders/cart/', {'product_id': product.id, 'quantity': quantity}, format='json')
+
+    def test_guest_cart_lives_in_cookie(self):
+        """Test that a visitor's cart round-trips through the cookie without writes"""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.add(self.cream, 2).status_code, status.HTTP_201_CREATED)
+            self.add(self.soap, 1)
+            response = self.client.put(
+                '/api/orders/cart/update_item/?compact=1', {'item_id': self.soap.id, 'quantity': 3}, format='json'
+            )
+        self.assertFalse([query for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertEqual(response.data['item']['subtotal'], 120)
+        self.assertEqual((response.data['total'], response.data['item_count']), (360, 5))
+
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual([item['id'] for item in response.data['items']], [self.cream.id, self.soap.id])
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.add(self.cream, 4).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bad_quantities_are_rejected(self):
+        """Test that non-positive or non-integer guest quantities get a 400 and leave no cookie"""
+        for quantity in (0, -2, 'two', None, [1]):
+            with self.subTest(quantity=quantity):
+                response = self.add(self.cream, quantity)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('quantity', response.data)
+        self.assertNotIn('guest_cart', self.client.cookies)
+
+        self.add(self.cream, 1)
+        for quantity in (-1, 'lots'):
+            with self.subTest(quantity=quantity):
+                response = self.client.put(
+                    '/api/orders/cart/update_item/', {'item_id': self.cream.id, 'quantity': quantity}, format='json'
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual([item['quantity'] for item in response.data['items']], [1])
+
+    def test_tampered_cookie_is_ignored(self):
+        """Test that an unsigned cookie reads as an empty cart"""
+        self.client.cookies['guest_cart'] = '{"1": 99}'
+        response = self.client.get('/api/orders/cart/')
+        self.assertEqual(response.data['items'], [])
+
+    def test_login_merges_guest_cart(self):
+        """Test that login folds guest lines into the cart, capped at available stock"""
+        fill_cart(self.user, [(self.cream, 3)])
+        self.add(self.cream, 4)
+        self.add(self.soap, 2)
+        Product.objects.filter(pk=self.soap.pk).update(is_available=False)
+
+        response = self.client.post(
+            '/api/auth/login/', {'username': 'guest', 'password': 'testpass123'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cart_merge'], {
+            'merged': [self.cream.id],
+            'adjusted': [{'product_id': self.cream.id, 'requested': 7, 'quantity': 5}],
+            'dropped': [self.soap.id],
+        })
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity')),
+            [(self.cream.id, 5)]
+        )
+        self.assertEqual(self.client.cookies['guest_cart'].value, '')
+
+    def test_registration_merges_guest_cart(self):
+        """Test that a new account starts with the visitor's cart"""
+        self.add(self.soap, 2)
+        response = self.client.post('/api/auth/register/', {
+            'username': 'newbie',
+            'email': 'newbie@test.com',
+            'password': 'Str0ng-passw0rd',
+            'password2': 'Str0ng-passw0rd',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['cart_merge']['merged'], [self.soap.id])
+        self.assertEqual(CartItem.objects.get(cart__user__username='newbie').quantity, 2)
+
+
+class StockReservationTestCase(TestCase):
+    """Test cases for cart stock holds"""
+
+    def setUp(self):
+        """Set up two shoppers and a product with three units"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='first@test.com',
+            username='first',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            email='second@test.com',
+            username='second',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Flash Sale')
+        self.product = Product.objects.create(
+            name='Limited Inhaler',
+            description='Flash sale',
+            price=250,
+            stock=3,
+            category=category
+        )
+
+    def add(self, user, quantity):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.post('/api/orders/cart/', {'product_id': self.product.id, 'quantity': quantity}, format='json')
+
+    def test_add_to_cart_holds_stock(self):
+        """Test that held units are not available to other carts"""
+        self.assertEqual(self.add(self.user, 2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.add(self.user, 1).status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 3)
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+
+        response = self.add(self.other, 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/products/availability/', {'ids': str(self.product.id)})
+        self.assertEqual(response.data, [{'id': self.product.id, 'available_stock': 0}])
+
+    def test_lowering_and_removing_release_units(self):
+        """Test that shrinking or removing a line returns units"""
+        self.add(self.user, 3)
+        item = CartItem.objects.get()
+        self.client.put('/api/orders/cart/update_item/', {'item_id': item.id, 'quantity': 1}, format='json')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 1)
+
+        self.client.delete('/api/orders/cart/remove_item/', {'item_id': item.id}, format='json')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_quantities_are_validated(self):
+        """Test that numeric strings are accepted and negative or non-integer quantities get a 400"""
+        self.assertEqual(self.add(self.user, '2').status_code, status.HTTP_201_CREATED)
+        for quantity in (0, -1, 'two', None):
+            with self.subTest(quantity=quantity):
+                response = self.add(self.user, quantity)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('quantity', response.data)
+
+        item = CartItem.objects.get()
+        for quantity in (-1, 'lots'):
+            with self.subTest(quantity=quantity):
+                response = self.client.put(
+                    '/api/orders/cart/update_item/', {'item_id': item.id, 'quantity': quantity}, format='json'
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.put('/api/orders/cart/update_item/', {'item_id': item.id, 'quantity': '1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual((CartItem.objects.get().quantity, self.product.reserved_stock), (1, 1))
+        with self.assertRaises(ValueError):
+            reserve(item.cart, self.product.id, -1)
+
+    def test_expired_holds_are_released(self):
+        """Test that the sweeper and a contended reservation free expired holds"""
+        self.add(self.user, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.other, 2).status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 2)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('expire_stock_holds', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_consumes_own_holds(self):
+        """Test that a buyer's own holds count towards checkout and are cleared"""
+        self.add(self.user, 3)
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (0, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_respects_other_holds(self):
+        """Test that a legacy cart line cannot take units held by another cart"""
+        self.add(self.other, 2)
+        fill_cart(self.user, [(self.product, 2)])
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IdempotencyKeyTestCase(TestCase):
+    """Test cases for Idempotency-Key retries"""
+
+    def setUp(self):
+        """Set up a customer with a product in the cart"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='retry@test.com',
+            username='retry',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Diabetes Care')
+        self.product = Product.objects.create(
+            name='Glucose Strips',
+            description='Pack of 50',
+            price=400,
+            stock=10,
+            category=category
+        )
+        fill_cart(self.user, [(self.product, 2)])
+
+    def checkout(self, key, data=SHIPPING):
+        return self.client.post('/api/orders/orders/', data, format='json', headers={'Idempotency-Key': key})
+
+    def test_retry_replays_order(self):
+        """Test that a retried checkout returns the first order without a second one"""
+        first = self.checkout('checkout-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        retry = self.checkout('checkout-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_key_reused_for_other_request(self):
+        """Test that a key cannot be replayed for a different body or endpoint"""
+        order_id = self.checkout('checkout-1').data['id']
+        response = self.checkout('checkout-1', dict(SHIPPING, shipping_city='Mysuru'))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = self.client.post(
+            f'/api/orders/orders/{order_id}/mark_paid/', headers={'Idempotency-Key': 'checkout-1'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_mark_paid_replay(self):
+        """Test that a retried mark_paid replays the first response"""
+        order = Order.objects.get(pk=self.checkout('checkout-1').data['id'])
+        url = f'/api/orders/orders/{order.id}/mark_paid/'
+        first = self.client.post(url, headers={'Idempotency-Key': 'pay-1'})
+        Order.objects.filter(pk=order.pk).update(status='shipped')
+        retry = self.client.post(url, headers={'Idempotency-Key': 'pay-1'})
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.json(), first.json())
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'shipped')
+
+    def test_expired_keys_are_pruned(self):
+        """Test that expired keys are deleted and can be claimed again"""
+        self.checkout('checkout-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.checkout('checkout-1').data['error'], 'Cart is empty')
+
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class StockShardTestCase(TestCase):
+    """Test cases for sharded stock counters"""
+
+    def setUp(self):
+        """Set up a shopper and a hot product with forty units"""
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='hot@test.com',
+            username='hot',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Hot Deals')
+        self.product = Product.objects.create(
+            name='Hot Thermometer',
+            description='Digital',
+            price=300,
+            stock=40,
+            category=category
+        )
+
+    def totals(self):
+        self.product.refresh_from_db()
+        return self.product.current_stock, self.product.available_stock
+
+    def test_set_stock_keeps_concurrent_holds(self):
+        """Test that setting stock from a stale instance leaves holds taken meanwhile alone"""
+        stale = Product.objects.get(pk=self.product.pk)
+        reserve(Cart.objects.create(user=self.user), self.product.id, 3)
+        set_stock(stale, 25)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (25, 3))
+
+    def test_sharding_preserves_stock_and_holds(self):
+        """Test that sharding moves stock and holds onto shards and back"""
+        reserve(Cart.objects.create(user=self.user), self.product.id, 3)
+        shard_product(self.product.id, 4)
+        self.assertEqual(
+            list(StockShard.objects.filter(product=self.product).values_list('stock', 'reserved')),
+            [(13, 3), (9, 0), (9, 0), (9, 0)]
+        )
+        self.assertEqual(self.totals(), (40, 37))
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (0, 0))
+        self.assertEqual(StockReservation.objects.get().shard.index, 0)
+
+        unshard_product(self.product.id)
+        self.assertEqual(self.totals(), (40, 37))
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (40, 3))
+        self.assertFalse(StockShard.objects.exists())
+        self.assertIsNone(StockReservation.objects.get().shard)
+
+    def test_hold_and_checkout_take_from_shards(self):
+        """Test that holds land on a shard and checkout consumes them there"""
+        shard_product(self.product.id, 4)
+        self.client.post('/api/orders/cart/', {'product_id': self.product.id, 'quantity': 5}, format='json')
+        shard = StockReservation.objects.get().shard
+        self.assertEqual(shard.reserved, 5)
+        self.assertEqual(self.totals(), (40, 35))
+
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.totals(), (35, 35))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(StockShard.objects.filter(reserved__gt=0).exists())
+
+    def test_checkout_gathers_units_across_shards(self):
+        """Test that a line larger than any one shard still checks out"""
+        shard_product(self.product.id, 4)
+        fill_cart(self.user, [(self.product, 30)])
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.totals(), (10, 10))
+
+        fill_cart(self.user, [(self.product, 11)])
+        response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.totals(), (10, 10))
+
+    def test_checkout_survives_unsharding(self):
+        """Test that a product unsharded while checkout reads its products is still bought"""
+        shard_product(self.product.id, 4)
+        fill_cart(self.user, [(self.product, 5)])
+        read = Product.objects.filter
+        unsharded = []
+
+        def unshard_first(*args, **kwargs):
+            if not unsharded:
+                unsharded.append(True)
+                unshard_product(self.product.id)
+            return read(*args, **kwargs)
+        with mock.patch.object(Product.objects, 'filter', side_effect=unshard_first):
+            response = self.client.post('/api/orders/orders/', SHIPPING, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(unsharded)
+        self.assertEqual(self.totals(), (35, 35))
+
+    def test_readers_see_consolidated_stock(self):
+        """Test that the product API and availability report the shard total"""
+        shard_product(self.product.id, 4)
+        response = self.client.get(f'/api/products/{self.product.slug}/')
+        self.assertEqual(response.data['stock'], 40)
+        response = self.client.get('/api/products/availability/', {'ids': str(self.product.id)})
+        self.assertEqual(response.data, [{'id': self.product.id, 'available_stock': 40}])
+
+
+class OrderEventTestCase(TestCase):
+    """Test cases for the order state machine and its event log"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@test.com', username='testuser', password='testpass123'
+        )
+        self.admin = User.objects.create_superuser(
+            email='admin@test.com', username='admin', password='adminpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+    
+    def order(self, **fields):
+        return Order.objects.create(user=self.user, total_amount=100, **dict(SHIPPING, **fields))
+    
+    def test_mark_paid_logs_events(self):
+        """Test that mark_paid logs both moves, each timed from when the order was placed"""
+        order = self.order()
+        response = self.client.post(f'/api/orders/orders/{order.id}/mark_paid/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['is_paid']), ('processing', True))
+        events = list(OrderEvent.objects.filter(order=order).order_by('field'))
+        self.assertEqual(
+            [(event.field, event.from_value, event.to_value) for event in events],
+            [('payment_status', 'pending', 'paid'), ('status', 'pending', 'processing')]
+        )
+        self.assertTrue(all(event.entered_at == order.created_at for event in events))
+        self.assertTrue(all(event.actor == self.user for event in events))
+        
+        response = self.client.post(f'/api/orders/orders/{order.id}/mark_paid/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(OrderEvent.objects.count(), 2)
+    
+    def test_invalid_transition_changes_nothing(self):
+        """Test that a move outside the transition graph is refused without side effects"""
+        order = self.order(status='shipped')
+        with self.assertRaises(transitions.InvalidTransition):
+            transitions.transition(order, status='delivered', payment_status='refunded')
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_status), ('shipped', 'pending'))
+        self.assertFalse(OrderEvent.objects.exists())
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(
+            f'/api/admin-panel/orders/{order.id}/update_status/', {'status': 'pending'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            f'/api/admin-panel/orders/{order.id}/update_status/', {'status': 'processing'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Cannot change status from shipped to processing')
+    
+    def test_status_is_not_writable(self):
+        """Test that a plain update cannot move the status around the state machine"""
+        order = self.order()
+        self.client.patch(f'/api/orders/orders/{order.id}/', {'status': 'delivered'}, format='json')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+    
+    def test_timeline(self):
+        """Test that the timeline chains each event to the one before it, oldest first"""
+        order = self.order()
+        self.client.force_authenticate(user=self.admin)
+        for new_status in ('processing', 'shipped', 'delivered'):
+            response = self.client.post(
+                f'/api/admin-panel/orders/{order.id}/update_status/', {'status': new_status}, format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        response = self.client.get(f'/api/admin-panel/orders/{order.id}/timeline/')
+        events = response.data['events']
+        self.assertEqual([event['to_value'] for event in events], ['processing', 'shipped', 'delivered'])
+        self.assertEqual(events[0]['entered_at'], response.data['placed_at'])
+        for previous, event in zip(events, events[1:]):
+            self.assertEqual(event['entered_at'], previous['created_at'])
+        
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/orders/orders/{order.id}/timeline/')
+        self.assertEqual(response.data['status'], 'delivered')
+        self.assertEqual(len(response.data['events']), 3)
+        other = User.objects.create_user(email='other@test.com', username='other', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(f'/api/orders/orders/{order.id}/timeline/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_events_are_append_only(self):
+        """Test that a logged event cannot be saved again"""
+        order = self.order()
+        event, = transitions.transition(order, status='processing')
+        event.to_value = 'shipped'
+        with self.assertRaises(ValueError):
+            event.save()
+    
+    def test_time_in_state(self):
+        """Test that time-in-state statistics and histogram come from one query"""
+        now = timezone.now()
+        for hours in (0.5, 2, 30, 100):
+            order = self.order()
+            event = OrderEvent.objects.create(
+                order=order, field='status', from_value='pending', to_value='processing', entered_at=now
+            )
+            OrderEvent.objects.filter(pk=event.pk).update(created_at=now + timedelta(hours=hours))
+        OrderEvent.objects.create(
+            order=order, field='payment_status', from_value='pending', to_value='paid', entered_at=now
+        )
+        
+        with self.assertNumQueries(1):
+            states = transitions.time_in_state('status', now - timedelta(days=1), now + timedelta(days=7))
+        self.assertEqual(len(states), 1)
+        self.assertEqual(states[0]['state'], 'pending')
+        self.assertEqual(states[0]['transitions'], 4)
+        self.assertEqual(states[0]['min_seconds'], 1800)
+        self.assertEqual(states[0]['max_seconds'], 360000)
+        self.assertEqual(states[0]['histogram'], {'0-1h': 1, '1-6h': 1, '6-24h': 0, '24-72h': 1, '72h+': 1})
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/admin-panel/dashboard/fulfillment/', {'field': 'payment_status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([state['state'] for state in response.data['states']], ['pending'])
+        response = self.client.get('/api/admin-panel/dashboard/fulfillment/', {'field': 'colour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentCheckoutTestCase(TransactionTestCase):
+    """Test that parallel checkouts cannot oversell"""
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_checkouts_do_not_oversell(self):
+        """Test that ten buyers racing for five units get exactly five orders"""
+        category = Category.objects.create(name='Vaccines')
+        scarce = Product.objects.create(
+            name='Scarce Vaccine', description='Limited', price=500, stock=5, category=category
+        )
+        plentiful = Product.objects.create(
+            name='Syringe', description='Single use', price=5, stock=100, category=category
+        )
+        buyers = []
+        for i in range(10):
+            user = User.objects.create_user(
+                email=f'buyer{i}@test.com', username=f'buyer{i}', password='testpass123'
+            )
+            # Alternate line order so lock ordering, not cart order, decides who waits
+            lines = [(scarce, 1), (plentiful, 1)] if i % 2 else [(plentiful, 1), (scarce, 1)]
+            fill_cart(user, lines)
+            buyers.append(user)
+
+        barrier = threading.Barrier(len(buyers))
+        results = []
+
+        def checkout(user):
+            try:
+                client = APIClient()
+                client.force_authenticate(user=user)
+                barrier.wait()
+                results.append(client.post('/api/orders/orders/', SHIPPING, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(status.HTTP_201_CREATED), 5)
+        self.assertEqual(results.count(status.HTTP_400_BAD_REQUEST), 5)
+        scarce.refresh_from_db()
+        plentiful.refresh_from_db()
+        self.assertEqual(scarce.stock, 0)
+        self.assertEqual(plentiful.stock, 95)
+        self.assertEqual(Order.objects.count(), 5)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_holds_do_not_over_reserve(self):
+        """Test that twenty carts racing for five units get exactly five holds"""
+        category = Category.objects.create(name='Flash Sale')
+        product = Product.objects.create(
+            name='Flash Sale Inhaler', description='Limited', price=250, stock=5, category=category
+        )
+        carts = [
+            Cart.objects.create(user=User.objects.create_user(
+                email=f'shopper{i}@test.com', username=f'shopper{i}', password='testpass123'
+            ))
+            for i in range(20)
+        ]
+
+        barrier = threading.Barrier(len(carts))
+        results = []
+
+        def hold(cart):
+            try:
+                barrier.wait()
+                try:
+                    reserve(cart, product.id, 1)
+                    results.append(True)
+                except InsufficientStock:
+                    results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hold, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 5)
+        product.refresh_from_db()
+        self.assertEqual(product.reserved_stock, 5)
+        self.assertEqual(StockReservation.objects.count(), 5)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_checkouts_on_shards_do_not_oversell(self):
+        """Test that twelve buyers racing for eight sharded units get exactly eight orders"""
+        category = Category.objects.create(name='Hot Deals')
+        product = Product.objects.create(
+            name='Hot Thermometer', description='Digital', price=300, stock=8, category=category
+        )
+        shard_product(product.id, 4)
+        buyers = []
+        for i in range(12):
+            user = User.objects.create_user(
+                email=f'hot{i}@test.com', username=f'hot{i}', password='testpass123'
+            )
+            fill_cart(user, [(product, 1)])
+            buyers.append(user)
+
+        barrier = threading.Barrier(len(buyers))
+        results = []
+
+        def checkout(user):
+            try:
+                client = APIClient()
+                client.force_authenticate(user=user)
+                barrier.wait()
+                results.append(client.post('/api/orders/orders/', SHIPPING, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(status.HTTP_201_CREATED), 8)
+        product.refresh_from_db()
+        self.assertEqual(product.current_stock, 0)
+        self.assertFalse(StockShard.objects.filter(stock__lt=0).exists())
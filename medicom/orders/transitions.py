@@ -0,0 +1,126 @@
+"""
+The order status state machine.
+
+``Order.STATUS_TRANSITIONS`` and ``Order.PAYMENT_STATUS_TRANSITIONS`` list
+the allowed moves.  ``transition`` checks a change against them on the
+locked order row, saves only the changed fields and appends one OrderEvent
+per field in the same transaction.  Each event also records when the order
+entered the state it is leaving, so ``time_in_state`` computes durations for
+every order in one aggregate query over ``order_event_state_idx``.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils import timezone
+
+from .models import Order, OrderEvent
+from .signals import order_transitioned
+
+
+GRAPHS = {
+    'status': Order.STATUS_TRANSITIONS,
+    'payment_status': Order.PAYMENT_STATUS_TRANSITIONS,
+}
+
+# Upper bounds of the time-in-state histogram; the last bucket is open-ended
+DURATION_BUCKETS = [timedelta(hours=1), timedelta(hours=6), timedelta(days=1), timedelta(days=3)]
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def targets(field):
+    """Every value ``field`` can be moved to."""
+    return sorted(set().union(*GRAPHS[field].values()))
+
+
+def sources(field, target):
+    """The values ``field`` may move to ``target`` from."""
+    return {value for value, allowed in GRAPHS[field].items() if target in allowed}
+
+
+def entered_at(orders, field):
+    """``{order_id: when the order entered its current field value}`` for ``(id, created_at)`` pairs."""
+    orders = dict(orders)
+    latest = dict(
+        OrderEvent.objects.filter(order_id__in=orders, field=field).order_by()
+        .values('order_id').annotate(at=Max('created_at')).values_list('order_id', 'at')
+    )
+    return {order_id: latest.get(order_id, created_at) for order_id, created_at in orders.items()}
+
+
+def transition(order, actor=None, **changes):
+    """
+    Move ``order`` to the values in ``changes`` (``status=``, ``payment_status=``)
+    and log the events.  Raises InvalidTransition, changing nothing, when any
+    move is not allowed.
+    """
+    with transaction.atomic():
+        current = Order.objects.select_for_update().values('status', 'payment_status', 'created_at').get(pk=order.pk)
+        for field, target in changes.items():
+            if target not in GRAPHS[field][current[field]]:
+                raise InvalidTransition(f'Cannot change {field} from {current[field]} to {target}')
+
+        events = [
+            OrderEvent(
+                order=order, field=field, from_value=current[field], to_value=target, actor=actor,
+                entered_at=entered_at([(order.pk, current['created_at'])], field)[order.pk],
+            )
+            for field, target in changes.items()
+        ]
+        update_fields = ['updated_at', *changes]
+        for field, target in changes.items():
+            setattr(order, field, target)
+        if changes.get('payment_status') == 'paid':
+            order.is_paid = True
+            order.paid_at = order.paid_at or timezone.now()
+            update_fields += ['is_paid', 'paid_at']
+        order.save(update_fields=update_fields)
+        OrderEvent.objects.bulk_create(events)
+        order_transitioned.send(sender=Order, events=events)
+    return events
+
+
+def time_in_state(field='status', start=None, end=None):
+    """
+    How long orders stayed in each value of ``field`` before moving on, for
+    moves made between ``start`` and ``end``; one aggregate query.
+    """
+    duration = ExpressionWrapper(F('created_at') - F('entered_at'), output_field=DurationField())
+    bounds = [timedelta(0), *DURATION_BUCKETS, None]
+    buckets, labels = {}, {}
+    for position, (lower, upper) in enumerate(zip(bounds, bounds[1:])):
+        condition = Q(created_at__gte=F('entered_at') + lower)
+        if upper is not None:
+            condition &= Q(created_at__lt=F('entered_at') + upper)
+        buckets[f'bucket_{position}'] = Count('id', filter=condition)
+        labels[f'bucket_{position}'] = bucket_key(lower, upper)
+
+    events = OrderEvent.objects.filter(field=field)
+    if start:
+        events = events.filter(created_at__gte=start)
+    if end:
+        events = events.filter(created_at__lt=end)
+    rows = events.order_by().values('from_value').annotate(
+        transitions=Count('id'), average=Avg(duration), shortest=Min(duration), longest=Max(duration), **buckets
+    ).order_by('from_value')
+    return [
+        {
+            'state': row['from_value'],
+            'transitions': row['transitions'],
+            'average_seconds': row['average'].total_seconds(),
+            'min_seconds': row['shortest'].total_seconds(),
+            'max_seconds': row['longest'].total_seconds(),
+            'histogram': {label: row[name] for name, label in labels.items()},
+        }
+        for row in rows
+    ]
+
+
+def bucket_key(lower, upper):
+    def hours(delta):
+        return int(delta.total_seconds() // 3600)
+
+    return f'{hours(lower)}-{hours(upper)}h' if upper is not None else f'{hours(lower)}h+'
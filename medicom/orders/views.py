@@ -1,11 +1,17 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
-from django.utils import timezone
-from .models import Order, OrderItem, Cart, CartItem
+from . import reservations, transitions
+from .checkout import CheckoutError, place_order
+from .guest_cart import GuestCartMixin
+from .idempotency import idempotent
+from .models import Order, Cart, CartItem
 from .serializers import (OrderSerializer, CreateOrderSerializer, 
-                          CartSerializer, CartItemSerializer)
+                          CartSerializer, CartItemSerializer, CartBatchLineSerializer,
+                          CartAddSerializer, CartUpdateSerializer, OrderTimelineSerializer)
 from products.models import Product
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -13,80 +19,84 @@ class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
+        # Items render from their snapshot, so one prefetch covers a page
+        queryset = Order.objects.select_related('user').prefetch_related('items')
         if self.request.user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        # Get or create cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        if not cart.items.exists():
+        try:
+            order = place_order(request.user, serializer.validated_data)
+        except CheckoutError as e:
             return Response(
-                {'error': 'Cart is empty'},
+                {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create order
-        order = Order.objects.create(
-            user=request.user,
-            total_amount=cart.get_total(),
-            **serializer.validated_data
-        )
-        
-        # Create order items from cart
-        for cart_item in cart.items.all():
-            # Check stock
-            if cart_item.product.stock < cart_item.quantity:
-                order.delete()
-                return Response(
-                    {'error': f'Insufficient stock for {cart_item.product.name}'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            
-            # Reduce stock
-            cart_item.product.stock -= cart_item.quantity
-            cart_item.product.save()
-        
-        # Clear cart
-        cart.items.all().delete()
-        
+        order = Order.objects.select_related('user').prefetch_related('items').get(pk=order.pk)
         return Response(
             OrderSerializer(order).data,
             status=status.HTTP_201_CREATED
         )
     
     @action(detail=True, methods=['post'])
+    @idempotent
     def mark_paid(self, request, pk=None):
         order = self.get_object()
-        order.is_paid = True
-        order.paid_at = timezone.now()
-        order.status = 'processing'
-        order.save()
+        changes = {'payment_status': 'paid'}
+        if order.status == 'pending':
+            changes['status'] = 'processing'
+        try:
+            transitions.transition(order, actor=request.user, **changes)
+        except transitions.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(OrderSerializer(order).data)
+    
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        return Response(OrderTimelineSerializer(self.get_object()).data)
 
-class CartViewSet(viewsets.ViewSet):
-    permission_classes = [permissions.IsAuthenticated]
+class CartViewSet(GuestCartMixin, viewsets.ViewSet):
+    """
+    Cart lines hold stock (see orders.reservations): adding or raising a
+    quantity reserves units for CART_HOLD_SECONDS, any cart request extends
+    the holds and removing lines releases them.  Anonymous visitors get a
+    cookie-backed guest cart instead (see orders.guest_cart).
+
+    Mutations return the whole cart, or with ``?compact=1`` only the changed
+    line (null once removed) plus the new ``total`` and ``item_count``.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def cart_response(self, request, cart, item_id=None, status_code=status.HTTP_200_OK):
+        if request.query_params.get('compact') in ('1', 'true'):
+            line = CartItem.objects.for_display().filter(pk=item_id).first() if item_id else None
+            data = {'item': CartItemSerializer(line).data if line else None, **cart.get_totals()}
+        else:
+            prefetch_related_objects([cart], Prefetch('items', queryset=CartItem.objects.for_display()))
+            data = CartSerializer(cart).data
+        return Response(data, status=status_code)
     
     def list(self, request):
+        if not request.user.is_authenticated:
+            return self.guest_list(request)
         cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        reservations.extend(cart)
+        return self.cart_response(request, cart)
     
     def create(self, request):
+        if not request.user.is_authenticated:
+            return self.guest_create(request)
+        serializer = CartAddSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         cart, created = Cart.objects.get_or_create(user=request.user)
-        product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
+        product_id, quantity = serializer.validated_data['product_id'], serializer.validated_data['quantity']
         
         try:
             product = Product.objects.get(id=product_id)
@@ -96,35 +106,33 @@ class CartViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        if product.stock < quantity:
+        try:
+            with transaction.atomic():
+                cart_item = CartItem.objects.filter(cart=cart, product=product).first()
+                # Hold first: reserve() takes the product lock before any cart row
+                reservations.reserve(cart, product.id, quantity + (cart_item.quantity if cart_item else 0))
+                if cart_item is None:
+                    cart_item = CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+                else:
+                    cart_item.quantity += quantity
+                    cart_item.save()
+        except reservations.InsufficientStock:
             return Response(
                 {'error': 'Insufficient stock'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            if cart_item.quantity > product.stock:
-                return Response(
-                    {'error': 'Insufficient stock'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_item.save()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        reservations.extend(cart)
+        return self.cart_response(request, cart, cart_item.id, status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['put'])
     def update_item(self, request):
+        if not request.user.is_authenticated:
+            return self.guest_update_item(request)
+        serializer = CartUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         cart = Cart.objects.get(user=request.user)
-        item_id = request.data.get('item_id')
-        quantity = request.data.get('quantity')
+        item_id, quantity = serializer.validated_data['item_id'], serializer.validated_data['quantity']
         
         try:
             cart_item = CartItem.objects.get(id=item_id, cart=cart)
@@ -135,39 +143,107 @@ class CartViewSet(viewsets.ViewSet):
             )
         
         if quantity <= 0:
+            reservations.release(cart, [cart_item.product_id])
             cart_item.delete()
         else:
-            if cart_item.product.stock < quantity:
+            try:
+                with transaction.atomic():
+                    reservations.reserve(cart, cart_item.product_id, quantity)
+                    cart_item.quantity = quantity
+                    cart_item.save()
+            except reservations.InsufficientStock:
                 return Response(
                     {'error': 'Insufficient stock'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            cart_item.quantity = quantity
-            cart_item.save()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        reservations.extend(cart)
+        return self.cart_response(request, cart, cart_item.id)
     
     @action(detail=False, methods=['delete'])
     def remove_item(self, request):
+        if not request.user.is_authenticated:
+            return self.guest_remove_item(request)
         cart = Cart.objects.get(user=request.user)
         item_id = request.data.get('item_id')
         
         try:
             cart_item = CartItem.objects.get(id=item_id, cart=cart)
+            reservations.release(cart, [cart_item.product_id])
             cart_item.delete()
         except CartItem.DoesNotExist:
             return Response(
                 {'error': 'Cart item not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return self.cart_response(request, cart)
     
     @action(detail=False, methods=['delete'])
     def clear(self, request):
+        if not request.user.is_authenticated:
+            return self.guest_clear(request)
         cart = Cart.objects.get(user=request.user)
+        reservations.release(cart)
         cart.items.all().delete()
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
\ No newline at end of file
+        return self.cart_response(request, cart)
+
+    def batch_lines(self, request):
+        """Validate a batch body into ``({product_id: quantity}, positions, errors)``."""
+        items = request.data.get('items') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return {}, {}, [{'index': None, 'error': 'items must be a non-empty list'}]
+        serializer = CartBatchLineSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return {}, {}, [
+                {'index': index, 'error': error} for index, error in enumerate(serializer.errors) if error
+            ]
+
+        lines, positions, errors = {}, {}, []
+        for index, line in enumerate(serializer.validated_data):
+            if line['product_id'] in lines:
+                errors.append({'index': index, 'product_id': line['product_id'], 'error': 'Duplicate product'})
+            lines[line['product_id']] = line['quantity']
+            positions.setdefault(line['product_id'], index)
+        found = set(Product.objects.filter(pk__in=lines).values_list('pk', flat=True))
+        errors += [
+            {'index': positions[pk], 'product_id': pk, 'error': 'Product not found'}
+            for pk in lines if pk not in found
+        ]
+        return lines, positions, sorted(errors, key=lambda error: error['index'])
+
+    @action(detail=False, methods=['put'])
+    def batch(self, request):
+        """
+        Set several lines at once: ``{"items": [{"product_id", "quantity"}]}``
+        with absolute quantities (0 removes).  All lines apply or none do;
+        failures come back as ``errors`` with each line's index.
+        """
+        lines, positions, errors = self.batch_lines(request)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.user.is_authenticated:
+            return self.guest_batch(request, lines, positions)
+
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        try:
+            with transaction.atomic():
+                # Holds first: reserve_many() takes the product locks before any cart row
+                reservations.reserve_many(cart, lines)
+                items = {item.product_id: item for item in CartItem.objects.filter(cart=cart, product_id__in=lines)}
+                updated = []
+                for product_id, item in items.items():
+                    item.quantity = lines[product_id]
+                    if item.quantity:
+                        updated.append(item)
+                CartItem.objects.bulk_update(updated, ['quantity'])
+                CartItem.objects.filter(pk__in=[item.pk for item in items.values() if not item.quantity]).delete()
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                    for product_id, quantity in lines.items() if quantity and product_id not in items
+                ])
+        except reservations.InsufficientStock as e:
+            return Response({'errors': [
+                {'index': positions[product_id], 'product_id': product_id, 'error': 'Insufficient stock'}
+                for product_id in sorted(e.args[0], key=positions.get)
+            ]}, status=status.HTTP_400_BAD_REQUEST)
+        reservations.extend(cart)
+        return self.cart_response(request, cart)
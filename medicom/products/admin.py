@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ContactMessage, FAQ
+from .models import ContactMessage, FAQ, MedicineSynonym
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
@@ -23,4 +23,11 @@ class FAQAdmin(admin.ModelAdmin):
     list_filter = ('category', 'is_active')
     search_fields = ('question', 'answer')
     list_editable = ('order', 'is_active')
-    ordering = ('category', 'order')
\ No newline at end of file
+    ordering = ('category', 'order')
+
+
+@admin.register(MedicineSynonym)
+class MedicineSynonymAdmin(admin.ModelAdmin):
+    list_display = ('brand_name', 'generic_name', 'created_at')
+    search_fields = ('brand_name', 'generic_name')
+    ordering = ('generic_name', 'brand_name')
@@ -0,0 +1,170 @@
+"""
+Versioned read-through cache for the public catalog endpoints.
+
+Responses of ``list``/``retrieve`` on ProductViewSet, CategoryViewSet and
+FAQViewSet are cached under keys that embed a generation number per
+namespace.  Writes never delete keys: they bump the generation (see
+``products.signals``; bulk updates that bypass ``save()`` must call
+``bump_generation`` themselves), which makes every older entry
+unreachable until it expires.  The bump happens
+immediately and again on commit, so a reader racing the writing
+transaction cannot pin pre-commit data under the new generation.
+
+The same views answer conditional GETs.  Every write bumps the generation,
+so the validators need no query: the ETag is derived from the cache key
+(generation plus normalized params) and Last-Modified is when the
+namespace last changed.  They are stored next to the cached body, so a
+revalidation is a 304 without touching the database.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+CATALOG = 'catalog'
+FAQ = 'faq'
+STATS_KEYS = {'hit': 'catalog-cache:hits', 'miss': 'catalog-cache:misses'}
+
+
+def _generation_key(namespace):
+    return f'catalog-cache:generation:{namespace}'
+
+
+def _changed_key(namespace):
+    return f'catalog-cache:changed:{namespace}'
+
+
+def _initial_generation():
+    # Seeded from the clock so a generation lost to eviction restarts above
+    # every value readers may still have keys for
+    return int(time.time() * 1000)
+
+
+def get_generation(namespace):
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def _incr(key, initial):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+
+
+def _bump(namespace):
+    _incr(_generation_key(namespace), _initial_generation())
+    # Deletes leave no updated_at behind, so Last-Modified also honours this
+    cache.set(_changed_key(namespace), int(time.time()), timeout=None)
+
+
+def bump_generation(namespace=CATALOG):
+    _bump(namespace)
+    transaction.on_commit(lambda: _bump(namespace))
+
+
+def last_changed(namespace):
+    key = _changed_key(namespace)
+    changed = cache.get(key)
+    if changed is None:
+        # Unknown after eviction: from now on is the safe answer
+        cache.add(key, int(time.time()), timeout=None)
+        changed = cache.get(key)
+    return changed
+
+
+def record(outcome):
+    _incr(STATS_KEYS[outcome], 1)
+
+
+def cache_stats():
+    hits = cache.get(STATS_KEYS['hit'], 0)
+    misses = cache.get(STATS_KEYS['miss'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+        'generations': {namespace: get_generation(namespace) for namespace in (CATALOG, FAQ)},
+    }
+
+
+class CachedResponseMixin:
+    """
+    Serve ``list``/``retrieve`` from the cache, keyed by normalized query
+    params, with strong ETag/Last-Modified validators and 304 responses.
+    """
+    cache_namespace = CATALOG
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, kwargs):
+        params = self.get_cache_params(request)
+        # Pagination links are absolute, so the host is part of the response
+        raw = repr((request.get_host(), self.basename, self.action, sorted(kwargs.items()), params))
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return f'catalog-cache:{self.cache_namespace}:{get_generation(self.cache_namespace)}:{digest}'
+
+    def get_cache_params(self, request):
+        """Query params that identify the response, normalized."""
+        return sorted((key, sorted(values)) for key, values in request.query_params.lists())
+
+    def get_validators(self, request, key):
+        """Return ``(etag, last_modified)`` for the response under ``key``."""
+        # The key embeds the generation, which every write bumps
+        raw = repr((key, request.accepted_renderer.format))
+        etag = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return etag, last_changed(self.cache_namespace)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request, kwargs)
+        entry = cache.get(key)
+        if entry is not None:
+            record('hit')
+            etag, last_modified = entry['etag'], entry['last_modified']
+            response = get_conditional_response(
+                request, etag=etag and quote_etag(etag), last_modified=last_modified
+            ) or Response(entry['data'])
+            response['X-Cache'] = 'HIT'
+            return self.add_validators(response, etag, last_modified)
+
+        record('miss')
+        etag, last_modified = self.get_validators(request, key)
+        not_modified = get_conditional_response(
+            request, etag=quote_etag(etag), last_modified=last_modified
+        )
+        if not_modified is not None:
+            not_modified['X-Cache'] = 'MISS'
+            return self.add_validators(not_modified, etag, last_modified)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, {'data': response.data, 'etag': etag, 'last_modified': last_modified},
+                      settings.CATALOG_CACHE_TIMEOUT)
+            self.add_validators(response, etag, last_modified)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Always revalidate: a heuristic freshness window would hide stock changes
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
@@ -0,0 +1,62 @@
+"""
+Facet counts for the Products page filter sidebar.
+
+Every facet is computed from one ``GROUP BY category, price bucket`` query
+over the filtered catalog: the price bucket is a ``Case`` expression and
+stock availability a conditional ``Count`` over consolidated stock, so
+per-category, availability and price counts are all folded out of the same
+rows.
+"""
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+
+# (min, max) in rupees; the last bucket is open-ended
+PRICE_BUCKETS = [(0, 100), (100, 250), (250, 500), (500, 1000), (1000, None)]
+
+
+def price_bucket_expression():
+    whens = [
+        When(price__lt=upper, then=Value(position))
+        for position, (_, upper) in enumerate(PRICE_BUCKETS) if upper is not None
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def bucket_key(lower, upper):
+    return f'{lower}-{upper}' if upper is not None else f'{lower}+'
+
+
+def facet_counts(queryset):
+    if 'stock_on_hand' not in queryset.query.annotations:
+        queryset = queryset.with_stock()
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket_expression())
+        .values('category_id', 'category__slug', 'category__name', 'price_bucket')
+        .annotate(total=Count('id'), in_stock=Count('id', filter=Q(stock_on_hand__gt=0)))
+    )
+
+    categories = {}
+    prices = [0] * len(PRICE_BUCKETS)
+    total = in_stock = 0
+    for row in rows:
+        category = categories.setdefault(row['category_id'], {
+            'id': row['category_id'],
+            'slug': row['category__slug'],
+            'name': row['category__name'],
+            'count': 0,
+        })
+        category['count'] += row['total']
+        prices[row['price_bucket']] += row['total']
+        total += row['total']
+        in_stock += row['in_stock']
+
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda category: category['name'].lower()),
+        'availability': {'in_stock': in_stock, 'out_of_stock': total - in_stock},
+        'price': [
+            {'key': bucket_key(lower, upper), 'min': lower, 'max': upper, 'count': count}
+            for (lower, upper), count in zip(PRICE_BUCKETS, prices)
+        ],
+    }
@@ -0,0 +1,158 @@
+"""
+Typo-tolerant matching of medicine names.
+
+``TrigramIndex`` is the in-process fallback used when the database has no
+pg_trgm (SQLite in local/test runs).  It indexes the distinct words of
+product names by their pg_trgm-style trigrams and scores a product by how
+well each query word matches its best name word, so "paracetmol" finds
+"Paracetamol 500mg Tablet".  Lookups use prefix filtering: a word can only
+reach the similarity threshold if it shares one of the query's rarest
+trigrams, so only those posting lists are read.
+"""
+import math
+import threading
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .search import tokenize
+
+
+SIMILARITY_THRESHOLD = 0.4
+MAX_SYNONYM_TERMS = 5
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a, b):
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+class TrigramIndex:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._built = False
+        self.clear()
+
+    def clear(self):
+        self.words = {}                            # word -> trigram set
+        self.postings = defaultdict(set)           # trigram -> words
+        self.word_products = defaultdict(set)      # word -> product ids
+        self.product_words = {}                    # product id -> words
+        self._built = False
+
+    def build(self, rows):
+        """Replace the index contents with ``(product_id, name)`` rows."""
+        with self._lock:
+            self.clear()
+            for product_id, name in rows:
+                self._add(product_id, name)
+            self._built = True
+
+    def ensure_built(self, rows_factory):
+        if not self._built:
+            self.build(rows_factory())
+
+    @property
+    def is_built(self):
+        return self._built
+
+    def add(self, product_id, name):
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, name)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, product_id, name):
+        words = set(tokenize(name))
+        self.product_words[product_id] = words
+        for word in words:
+            if word not in self.words:
+                grams = trigrams(word)
+                self.words[word] = grams
+                for gram in grams:
+                    self.postings[gram].add(word)
+            self.word_products[word].add(product_id)
+
+    def _remove(self, product_id):
+        for word in self.product_words.pop(product_id, ()):
+            products = self.word_products[word]
+            products.discard(product_id)
+            if not products:
+                del self.word_products[word]
+                for gram in self.words.pop(word):
+                    self.postings[gram].discard(word)
+                    if not self.postings[gram]:
+                        del self.postings[gram]
+
+    def _match_word(self, query_word):
+        """Return ``{word: similarity}`` for indexed words close to ``query_word``."""
+        grams = trigrams(query_word)
+        min_overlap = max(1, math.ceil(self.threshold * len(grams)))
+        rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(grams) - min_overlap + 1]:
+            candidates.update(self.postings.get(gram, ()))
+
+        matches = {}
+        for word in candidates:
+            score = similarity(grams, self.words[word])
+            if score >= self.threshold:
+                matches[word] = score
+        return matches
+
+    def search(self, term, limit):
+        query_words = tokenize(term)
+        if not query_words:
+            return []
+
+        with self._lock:
+            scores = None
+            for query_word in query_words:
+                word_scores = defaultdict(float)
+                for word, score in self._match_word(query_word).items():
+                    for product_id in self.word_products[word]:
+                        if score > word_scores[product_id]:
+                            word_scores[product_id] = score
+                # Every query word must match some word of the product name
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {pk: scores[pk] + s for pk, s in word_scores.items() if pk in scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(pk, score / len(query_words)) for pk, score in ranked]
+
+
+def expand_synonyms(query):
+    """Return the query plus brand/generic alternatives from MedicineSynonym."""
+    from .models import MedicineSynonym
+
+    tokens = tokenize(query)
+    normalized = ' '.join(tokens)
+    if not normalized:
+        return []
+
+    terms = [normalized]
+    candidates = {normalized, *tokens}
+    rows = MedicineSynonym.objects.filter(
+        Q(brand_name__in=candidates) | Q(generic_name__in=candidates)
+    ).values_list('brand_name', 'generic_name')
+    for brand, generic in rows:
+        for source, target in ((brand, generic), (generic, brand)):
+            if source == normalized:
+                terms.append(target)
+            elif source in tokens:
+                terms.append(' '.join(target if token == source else token for token in tokens))
+
+    return list(dict.fromkeys(terms))[:MAX_SYNONYM_TERMS + 1]
@@ -0,0 +1,150 @@
+"""
+Sharded stock counters for hot SKUs.
+
+A product with ``stock_shards = N`` keeps its stock and cart holds in N
+StockShard rows instead of ``Product.stock``/``reserved_stock`` (both left
+at zero), so concurrent checkouts and holds lock one of N rows rather than
+queueing on the product row.  Every take goes to a random shard with room,
+skipping shards other transactions have locked, then falls back to waiting
+on the others; when no single shard has room for a request the total could
+still satisfy, free units are first gathered into one shard.
+
+Readers go through ``Product.objects.with_stock()`` or
+``Product.current_stock``/``available_stock``; writers use ``set_stock``.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, IntegerField
+
+from .models import Product, StockShard
+
+
+def _room_for(quantity, credit=0):
+    # stock - reserved + credit >= quantity, typed explicitly (stock and
+    # reserved are different integer field types)
+    return {'stock__gte': ExpressionWrapper(F('reserved') + (quantity - credit), output_field=IntegerField())}
+
+
+def _distribute(shards, total):
+    """Set ``stock`` on ``shards``: cover each shard's holds, spread the rest evenly."""
+    remaining = total
+    for shard in shards:
+        shard.stock = min(shard.reserved, max(remaining, 0))
+        remaining -= shard.stock
+    if remaining > 0:
+        share, extra = divmod(remaining, len(shards))
+        for position, shard in enumerate(shards):
+            shard.stock += share + (1 if position < extra else 0)
+
+
+def shard_product(product_id, shards):
+    """Move a product's stock and holds onto ``shards`` counter rows (or re-shard it)."""
+    from orders.models import StockReservation
+
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        if product.stock_shards:
+            _fold_shards(product)
+        rows = [StockShard(product=product, index=index) for index in range(shards)]
+        # Existing holds all move to shard 0
+        rows[0].reserved = product.reserved_stock
+        _distribute(rows, product.stock)
+        StockShard.objects.bulk_create(rows)
+        first = StockShard.objects.get(product=product, index=0)
+        StockReservation.objects.filter(product=product).update(shard=first)
+
+        product.stock = product.reserved_stock = 0
+        product.stock_shards = shards
+        product.save(update_fields=['stock', 'reserved_stock', 'stock_shards', 'updated_at'])
+
+
+def unshard_product(product_id):
+    """Fold a sharded product's counters back into its product row."""
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        if product.stock_shards:
+            _fold_shards(product)
+            product.save(update_fields=['stock', 'reserved_stock', 'stock_shards', 'updated_at'])
+
+
+def _fold_shards(product):
+    from orders.models import StockReservation
+
+    shards = list(StockShard.objects.select_for_update().filter(product=product).order_by('index'))
+    product.stock = sum(shard.stock for shard in shards)
+    product.reserved_stock = sum(shard.reserved for shard in shards)
+    product.stock_shards = 0
+    StockReservation.objects.filter(product=product).update(shard=None)
+    StockShard.objects.filter(product=product).delete()
+
+
+def set_stock(product, total):
+    """Set on-hand stock, keeping cart holds where they are."""
+    with transaction.atomic():
+        # ``product`` may be stale: holds and ratings move by F() updates
+        product.stock_shards = (
+            Product.objects.select_for_update().values_list('stock_shards', flat=True).get(pk=product.pk)
+        )
+        if not product.stock_shards:
+            product.stock = total
+            product.save(update_fields=['stock', 'updated_at'])
+            return
+        shards = list(StockShard.objects.select_for_update().filter(product=product).order_by('index'))
+        _distribute(shards, total)
+        StockShard.objects.bulk_update(shards, ['stock'])
+        product.save(update_fields=['updated_at'])
+
+
+def take(shard_id, quantity, reserve=False, credit=0):
+    """
+    Take ``quantity`` from one shard if it has room; True on success.
+
+    ``reserve`` adds to the shard's holds instead of removing stock.
+    ``credit`` is a hold on this shard being consumed by the same take.
+    """
+    if reserve:
+        updates = {'reserved': F('reserved') + quantity}
+    else:
+        updates = {'stock': F('stock') - quantity, 'reserved': F('reserved') - credit}
+    return StockShard.objects.filter(pk=shard_id, **_room_for(quantity, credit)).update(**updates) == 1
+
+
+def acquire(product_id, quantity, reserve=False):
+    """Take ``quantity`` from some shard of ``product_id``; returns its id, or None if short."""
+    shards = StockShard.objects.filter(product_id=product_id, **_room_for(quantity))
+    with transaction.atomic():
+        # An idle shard with room, without waiting on busy ones
+        shard_id = shards.select_for_update(skip_locked=True).order_by('?').values_list('pk', flat=True).first()
+        if shard_id is not None and take(shard_id, quantity, reserve):
+            return shard_id
+
+        candidates = list(shards.values_list('pk', flat=True))
+        random.shuffle(candidates)
+        for shard_id in candidates:
+            if take(shard_id, quantity, reserve):
+                return shard_id
+
+        shard_id = gather(product_id)
+        if shard_id is not None and take(shard_id, quantity, reserve):
+            return shard_id
+    return None
+
+
+def gather(product_id):
+    """Move the free units of every idle shard into the one with the most; returns its id."""
+    with transaction.atomic():
+        shards = list(
+            StockShard.objects.select_for_update(skip_locked=True)
+            .filter(product_id=product_id).order_by('index')
+        )
+        if not shards:
+            return None
+        target = max(shards, key=lambda shard: shard.stock - shard.reserved)
+        for shard in shards:
+            free = shard.stock - shard.reserved
+            if shard is not target and free > 0:
+                shard.stock -= free
+                target.stock += free
+        StockShard.objects.bulk_update(shards, ['stock'])
+        return target.pk
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from products.cache import bump_generation
+from products.models import Product, Review
+
+
+RATING_FIELDS = [
+    'review_count', 'rating_sum',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+]
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized review aggregates stored on Product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # One grouped query over products_review for every product at once
+        aggregates = {
+            row['product_id']: row
+            for row in Review.objects.order_by().values('product_id').annotate(
+                review_count=Count('id'),
+                rating_sum=Sum('rating'),
+                **{
+                    f'rating_{star}_count': Count('id', filter=Q(rating=star))
+                    for star in range(1, 6)
+                },
+            )
+        }
+
+        updated = 0
+        batch = []
+        products = Product.objects.only('id', *RATING_FIELDS).order_by('id')
+        for product in products.iterator(chunk_size=batch_size):
+            row = aggregates.get(product.id, {})
+            for field in RATING_FIELDS:
+                setattr(product, field, row.get(field) or 0)
+            batch.append(product)
+            if len(batch) >= batch_size:
+                updated += self._flush(batch)
+                batch = []
+        if batch:
+            updated += self._flush(batch)
+        bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled rating aggregates for {updated} products'))
+
+    def _flush(self, batch):
+        with transaction.atomic():
+            Product.objects.bulk_update(batch, RATING_FIELDS)
+        return len(batch)
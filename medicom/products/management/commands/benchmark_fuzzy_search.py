@@ -0,0 +1,117 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.fuzzy import TrigramIndex
+from products.models import Category, Product
+from products.search import get_search_backend
+
+
+GENERICS = [
+    'paracetamol', 'ibuprofen', 'amoxicillin', 'azithromycin', 'cetirizine', 'metformin',
+    'atorvastatin', 'omeprazole', 'pantoprazole', 'amlodipine', 'losartan', 'montelukast',
+    'levocetirizine', 'diclofenac', 'aceclofenac', 'ciprofloxacin', 'doxycycline',
+    'fexofenadine', 'ranitidine', 'domperidone', 'ondansetron', 'metronidazole',
+    'clopidogrel', 'rosuvastatin', 'telmisartan', 'glimepiride', 'sitagliptin',
+    'levothyroxine', 'prednisolone', 'salbutamol', 'budesonide', 'folic acid',
+]
+FORMS = ['tablet', 'capsule', 'syrup', 'suspension', 'injection', 'gel', 'drops', 'cream']
+SYLLABLES = ['cro', 'cin', 'do', 'lo', 'pan', 'zo', 'ri', 'vex', 'mox', 'tra', 'bru', 'fen',
+             'ta', 'lix', 'neo', 'cal', 'pol', 'dex', 'ora', 'myl', 'sun', 'zy', 'cip', 'la']
+
+
+def make_names(count, rng):
+    names = []
+    for _ in range(count):
+        brand = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        names.append(
+            f'{brand} {rng.choice(GENERICS)} {rng.choice([50, 100, 250, 400, 500, 650])}mg '
+            f'{rng.choice(FORMS)}'
+        )
+    return names
+
+
+def misspell(word, rng):
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(['drop', 'swap', 'replace'])
+    if edit == 'drop':
+        return word[:i] + word[i + 1:]
+    if edit == 'swap':
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice('aeiou') + word[i + 1:]
+
+
+class Command(BaseCommand):
+    help = 'Measure fuzzy medicine-name search latency on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--database', action='store_true',
+            help='Insert the catalog (rolled back afterwards) and query the active '
+                 'search backend instead of a standalone in-process index',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = make_names(options['products'], rng)
+        queries = []
+        for _ in range(options['queries']):
+            words = rng.choice(names).lower().split()
+            query = misspell(words[1], rng)
+            if rng.random() < 0.3:
+                query = f'{query} {words[-1]}'
+            queries.append(query)
+
+        if options['database']:
+            self._run_database(names, queries)
+        else:
+            index = TrigramIndex()
+            started = time.perf_counter()
+            index.build(enumerate(names, start=1))
+            self.stdout.write(f'Built in-process index over {len(names)} names '
+                              f'in {time.perf_counter() - started:.2f}s')
+            self._report(lambda term: index.search(term, 50), queries)
+
+    def _run_database(self, names, queries):
+        backend = get_search_backend()
+        with transaction.atomic():
+            category = Category.objects.create(name='Benchmark')
+            Product.objects.bulk_create(
+                [Product(category=category, name=name, slug=f'benchmark-{i}', description=name,
+                         price=10, stock=10) for i, name in enumerate(names)],
+                batch_size=5000,
+            )
+            backend.trigram_index.clear()
+            self.stdout.write(f'Inserted {len(names)} products, querying {backend.__class__.__name__}')
+            self._report(lambda term: backend.fuzzy_search([term], 50), queries)
+            transaction.set_rollback(True)
+        backend.trigram_index.clear()
+
+    def _report(self, run, queries):
+        run(queries[0])  # warm up (builds lazy indexes)
+        timings = []
+        hits = 0
+        for query in queries:
+            started = time.perf_counter()
+            results = run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += bool(results)
+
+        timings.sort()
+
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(queries)} fuzzy queries, {hits} with results: '
+            f'mean {statistics.mean(timings):.2f}ms  p50 {percentile(0.50):.2f}ms  '
+            f'p95 {percentile(0.95):.2f}ms  p99 {percentile(0.99):.2f}ms'
+        ))
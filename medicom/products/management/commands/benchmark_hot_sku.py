@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.checkout import CheckoutError, place_order
+from orders.models import Cart, CartItem
+from products.inventory import shard_product
+from products.models import Category, Product
+
+
+User = get_user_model()
+
+SHIPPING = {
+    'shipping_address': 'Benchmark',
+    'shipping_city': 'Benchmark',
+    'shipping_country': 'India',
+    'shipping_postal_code': '000000',
+    'phone': '0000000000',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare checkout throughput on one hot SKU with and without sharded stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=400, help='Checkouts per run')
+        parser.add_argument('--shards', type=int, default=8)
+
+    def handle(self, *args, **options):
+        if not connection.features.has_select_for_update:
+            self.stderr.write('This benchmark needs a database with row locks (PostgreSQL)')
+            return
+        for shards in (0, options['shards']):
+            self._run(shards, options)
+
+    def _run(self, shards, options):
+        # Worker threads need committed rows, so the run creates and deletes its own data
+        category = Category.objects.create(name='Benchmark hot SKU')
+        product = Product.objects.create(
+            category=category, name='Benchmark hot SKU', description='Benchmark',
+            price=100, stock=options['orders'] * 2,
+        )
+        if shards:
+            shard_product(product.pk, shards)
+        User.objects.bulk_create([
+            User(username=f'benchmark-sku-{i}', email=f'benchmark-sku-{i}@example.com')
+            for i in range(options['threads'])
+        ])
+        users = list(User.objects.filter(username__startswith='benchmark-sku-').order_by('pk'))
+        carts = {cart.user_id: cart for cart in Cart.objects.bulk_create([Cart(user=user) for user in users])}
+
+        remaining = [options['orders']]
+        lock = threading.Lock()
+        failures = [0]
+
+        def shopper(user):
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    CartItem.objects.create(cart=carts[user.pk], product=product, quantity=1)
+                    try:
+                        place_order(user, SHIPPING)
+                    except CheckoutError:
+                        with lock:
+                            failures[0] += 1
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(shopper, users))
+            elapsed = time.perf_counter() - started
+            product.refresh_from_db()
+            label = f'{shards} shards' if shards else 'unsharded'
+            self.stdout.write(self.style.SUCCESS(
+                f"{label:>10}: {options['orders']} checkouts in {elapsed:.2f}s "
+                f"({options['orders'] / elapsed:.0f}/s), {failures[0]} failed, "
+                f'stock left {product.current_stock}'
+            ))
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            product.delete()
+            category.delete()
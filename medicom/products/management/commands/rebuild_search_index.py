@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.cache import bump_generation
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search document for every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            total = backend.rebuild(batch_size=options['batch_size'])
+            bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} products with {backend.__class__.__name__}'
+        ))
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+
+POSTGRES_DOCUMENT_SQL = (
+    "setweight(to_tsvector('english', coalesce(p.name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(c.name, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(p.description, '')), 'C')"
+)
+
+
+def create_search_document(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE products_product ADD COLUMN search_vector tsvector")
+        schema_editor.execute(
+            "CREATE INDEX products_product_search_gin ON products_product USING GIN (search_vector)"
+        )
+        schema_editor.execute(
+            f"UPDATE products_product p SET search_vector = {POSTGRES_DOCUMENT_SQL} "
+            f"FROM products_category c WHERE c.id = p.category_id"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_product_fts USING fts5("
+            "name, category, description, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO products_product_fts (rowid, name, category, description) "
+            "SELECT p.id, p.name, c.name, p.description FROM products_product p "
+            "JOIN products_category c ON c.id = p.category_id"
+        )
+
+
+def drop_search_document(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS products_product_search_gin")
+        schema_editor.execute("ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_document, drop_search_document),
+    ]
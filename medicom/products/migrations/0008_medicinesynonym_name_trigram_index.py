@@ -0,0 +1,49 @@
+# Generated by Django 5.2.10 on 2026-10-18 20:06
+
+from django.db import migrations, models
+
+
+def create_name_trigram_index(apps, schema_editor):
+    # pg_trgm is optional: without it fuzzy search uses the in-process index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_name_trgm "
+        "ON products_product USING GIN (lower(name) gin_trgm_ops)"
+    )
+
+
+def drop_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS products_product_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicineSynonym',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('brand_name', models.CharField(db_index=True, max_length=200)),
+                ('generic_name', models.CharField(db_index=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Medicine Synonym',
+                'verbose_name_plural': 'Medicine Synonyms',
+                'ordering': ['generic_name', 'brand_name'],
+                'unique_together': {('brand_name', 'generic_name')},
+            },
+        ),
+        migrations.RunPython(create_name_trigram_index, drop_name_trigram_index),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 from cloudinary_storage.storage import MediaCloudinaryStorage
@@ -18,6 +20,7 @@ class Category(models.Model):
         storage=MediaCloudinaryStorage()  # ← explicit Cloudinary storage
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -38,13 +41,50 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+        Annotate consolidated ``stock_on_hand`` / ``stock_held``.
+
+        Sharded products keep their counts in StockShard rows and leave the
+        ``stock``/``reserved_stock`` columns at zero; filter and read stock
+        through these annotations so both kinds of product look the same.
+        """
+        def shard_total(field):
+            return Subquery(
+                StockShard.objects.filter(product=OuterRef('pk')).order_by()
+                .values('product').annotate(total=Sum(field)).values('total'),
+                output_field=models.IntegerField(),
+            )
+
+        return self.annotate(
+            stock_on_hand=Case(
+                When(stock_shards=0, then=F('stock')),
+                default=Coalesce(shard_total('stock'), 0),
+                output_field=models.IntegerField(),
+            ),
+            stock_held=Case(
+                When(stock_shards=0, then=F('reserved_stock')),
+                default=Coalesce(shard_total('reserved'), 0),
+                output_field=models.IntegerField(),
+            ),
+        )
+
+
 class Product(models.Model):
+    # Stock on hand below this shows as low stock on the admin dashboard
+    LOW_STOCK_THRESHOLD = 10
+    
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+    # Units held by carts (orders.reservations); sellable = stock - reserved_stock
+    reserved_stock = models.PositiveIntegerField(default=0)
+    # Hot SKUs spread stock over this many StockShard rows (products.inventory)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     image = models.ImageField(
         upload_to='products/',
         blank=True,
@@ -52,11 +92,29 @@ class Product(models.Model):
         storage=MediaCloudinaryStorage()  # ← explicit Cloudinary storage
     )
     is_available = models.BooleanField(default=True)
+
+    # Denormalized review aggregates, maintained by products.signals
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination over the catalog orderings, tie-broken on id
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_id_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -72,6 +130,69 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return 0
+        return self.rating_sum / self.review_count
+
+    @property
+    def current_stock(self):
+        """Units on hand, summed over shards for sharded products."""
+        if not self.stock_shards:
+            return self.stock
+        if 'stock_on_hand' not in self.__dict__:
+            self._load_shard_totals()
+        return self.stock_on_hand
+
+    @property
+    def available_stock(self):
+        if not self.stock_shards:
+            return max(self.stock - self.reserved_stock, 0)
+        if 'stock_held' not in self.__dict__:
+            self._load_shard_totals()
+        return max(self.stock_on_hand - self.stock_held, 0)
+
+    def _load_shard_totals(self):
+        totals = self.shards.aggregate(stock=Sum('stock'), reserved=Sum('reserved'))
+        self.stock_on_hand = totals['stock'] or 0
+        self.stock_held = totals['reserved'] or 0
+
+    def refresh_from_db(self, *args, **kwargs):
+        # Shard totals are loaded lazily (or annotated); drop them with the rest
+        self.__dict__.pop('stock_on_hand', None)
+        self.__dict__.pop('stock_held', None)
+        super().refresh_from_db(*args, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    @classmethod
+    def adjust_rating_aggregates(cls, product_id, rating, delta):
+        """Add (delta=1) or remove (delta=-1) one rating from a product's aggregates."""
+        histogram_field = f'rating_{rating}_count'
+        cls.objects.filter(pk=product_id).update(
+            review_count=F('review_count') + delta,
+            rating_sum=F('rating_sum') + rating * delta,
+            **{histogram_field: F(histogram_field) + delta},
+        )
+
+
+class StockShard(models.Model):
+    """One slice of a hot product's stock; see products.inventory."""
+    product = models.ForeignKey(Product, related_name='shards', on_delete=models.CASCADE)
+    index = models.PositiveSmallIntegerField()
+    stock = models.IntegerField(default=0)
+    reserved = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'index')
+        ordering = ['product', 'index']
+
+    def __str__(self):
+        return f'{self.product_id}#{self.index}: {self.stock} ({self.reserved} held)'
+
 
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
@@ -84,10 +205,37 @@ class Review(models.Model):
         ordering = ['-created_at']
         unique_together = ('product', 'user')
 
+    def save(self, *args, **kwargs):
+        # Keep the row write and the product aggregate update in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.user.username} - {self.product.name}'
 
 
+class MedicineSynonym(models.Model):
+    """Brand ⇄ generic name pair used to expand catalog searches in both directions."""
+    brand_name = models.CharField(max_length=200, db_index=True)
+    generic_name = models.CharField(max_length=200, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['generic_name', 'brand_name']
+        unique_together = ('brand_name', 'generic_name')
+        verbose_name = 'Medicine Synonym'
+        verbose_name_plural = 'Medicine Synonyms'
+
+    def save(self, *args, **kwargs):
+        # Stored in the same normalized form the search filter looks up
+        self.brand_name = ' '.join(self.brand_name.lower().split())
+        self.generic_name = ' '.join(self.generic_name.lower().split())
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.brand_name} ⇄ {self.generic_name}'
+
+
 class ContactMessage(models.Model):
     STATUS_CHOICES = [
         ('new', 'New'),
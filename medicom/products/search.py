@@ -0,0 +1,329 @@
+"""
+Full-text search over the product catalog.
+
+Each product has one search document: its name (highest weight), its
+category name and its description.  PostgreSQL stores the document as a
+weighted ``tsvector`` column on ``products_product`` behind a GIN index;
+SQLite (local/test runs) stores it in an FTS5 table keyed by product id.
+Both structures are created by migration 0007, kept current from
+``products.signals`` and rebuilt with ``manage.py rebuild_search_index``.
+
+Fuzzy (typo-tolerant) matching on product names uses pg_trgm when the
+extension is installed and ``products.fuzzy.TrigramIndex`` otherwise.
+
+On PostgreSQL the ``?q=`` filter matches and ranks in the product query
+itself, so every match is returned and counted.  The other backends rank
+in Python and hand back the best SEARCH_RESULT_LIMIT product ids, so
+their results (and counts) stop there.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+
+SEARCH_RESULT_LIMIT = 500
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def chunked(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def merge_ranked(results, limit=SEARCH_RESULT_LIMIT):
+    """Merge several ranked lists, keeping each product's best score."""
+    best = {}
+    for ranked in results:
+        for pk, score in ranked:
+            if score > best.get(pk, float('-inf')):
+                best[pk] = score
+    return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def rank_by_ids(queryset, ranked):
+    """Narrow ``queryset`` to ``[(product_id, score), ...]`` as ``search_rank``; None when empty."""
+    if not ranked:
+        return None
+    return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(float(score))) for pk, score in ranked],
+            output_field=FloatField(),
+        )
+    )
+
+
+class BaseSearchBackend:
+    """Backend interface: rank product ids for a query and keep documents current."""
+
+    def __init__(self):
+        from .fuzzy import TrigramIndex
+        self.trigram_index = TrigramIndex()
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return ``[(product_id, score), ...]`` ordered best first."""
+        raise NotImplementedError
+
+    def search_terms(self, terms, limit=SEARCH_RESULT_LIMIT):
+        return merge_ranked((self.search(term, limit) for term in terms), limit)
+
+    def fuzzy_search(self, terms, limit=SEARCH_RESULT_LIMIT):
+        """Rank products whose names approximately match any of ``terms``."""
+        from .models import Product
+        self.trigram_index.ensure_built(lambda: Product.objects.values_list('id', 'name').iterator())
+        return merge_ranked((self.trigram_index.search(term, limit) for term in terms), limit)
+
+    def filter_search(self, queryset, terms):
+        """
+        ``queryset`` narrowed to products matching any of ``terms`` and
+        annotated with their ``search_rank``, or None when nothing matches.
+        """
+        return rank_by_ids(queryset, self.search_terms(terms))
+
+    def filter_fuzzy(self, queryset, terms):
+        """``filter_search`` for approximate product name matches."""
+        return rank_by_ids(queryset, self.fuzzy_search(terms))
+
+    def index_products(self, product_ids):
+        pass
+
+    def index_category(self, category_id):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        from .models import Product
+        ids = Product.objects.order_by('id').values_list('id', flat=True)
+        total = 0
+        for batch in chunked(ids, batch_size):
+            self.index_products(batch)
+            total += len(batch)
+        return total
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    DOCUMENT_SQL = (
+        "setweight(to_tsvector('english', coalesce(p.name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(c.name, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(p.description, '')), 'C')"
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._has_trigram = None
+
+    @property
+    def has_trigram(self):
+        if self._has_trigram is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                self._has_trigram = cursor.fetchone() is not None
+        return self._has_trigram
+
+    def fuzzy_search(self, terms, limit=SEARCH_RESULT_LIMIT):
+        if not self.has_trigram:
+            return super().fuzzy_search(terms, limit)
+        terms = [term for term in terms if term]
+        if not terms:
+            return []
+        # "<%" (word similarity above pg_trgm.word_similarity_threshold) is
+        # served by the products_product_name_trgm GIN index
+        matches = ' UNION ALL '.join(
+            "SELECT id, word_similarity(%s, lower(name)) AS score "
+            "FROM products_product WHERE %s <%% lower(name)"
+            for _ in terms
+        )
+        params = [value for term in terms for value in (term, term)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, MAX(score) AS score FROM ({matches}) matches "
+                f"GROUP BY id ORDER BY score DESC, id LIMIT %s",
+                [*params, limit],
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def tsquery(terms):
+        """A ``to_tsquery`` string matching any of ``terms``, or '' when they have no words."""
+        # Prefix-match every word so partially typed words still hit the index
+        return ' | '.join(
+            '(' + ' & '.join(f'{token}:*' for token in tokens) + ')'
+            for tokens in map(tokenize, terms) if tokens
+        )
+
+    def filter_search(self, queryset, terms):
+        tsquery = self.tsquery(terms)
+        if not tsquery:
+            return None
+        table = queryset.model._meta.db_table
+        matches = queryset.alias(search_match=RawSQL(
+            f"{table}.search_vector @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField()
+        )).filter(search_match=True).annotate(search_rank=RawSQL(
+            f"ts_rank_cd({table}.search_vector, to_tsquery('english', %s))", [tsquery], output_field=FloatField()
+        ))
+        return matches if matches.exists() else None
+
+    def filter_fuzzy(self, queryset, terms):
+        if not self.has_trigram:
+            return super().filter_fuzzy(queryset, terms)
+        terms = [term for term in terms if term]
+        if not terms:
+            return None
+        name = f'lower({queryset.model._meta.db_table}.name)'
+        matches = queryset.alias(search_match=RawSQL(
+            ' OR '.join(f'%s <%% {name}' for _ in terms), terms, output_field=BooleanField()
+        )).filter(search_match=True).annotate(search_rank=RawSQL(
+            'GREATEST(' + ', '.join(f'word_similarity(%s, {name})' for _ in terms) + ')',
+            terms, output_field=FloatField(),
+        ))
+        return matches if matches.exists() else None
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        tsquery = self.tsquery([query])
+        if not tsquery:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id, ts_rank_cd(search_vector, query) AS rank "
+                "FROM products_product, to_tsquery('english', %s) query "
+                "WHERE search_vector @@ query "
+                "ORDER BY rank DESC, id LIMIT %s",
+                [tsquery, limit],
+            )
+            return cursor.fetchall()
+
+    def _reindex(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE products_product p SET search_vector = {self.DOCUMENT_SQL} "
+                f"FROM products_category c WHERE c.id = p.category_id AND {where}",
+                params,
+            )
+
+    def index_products(self, product_ids):
+        product_ids = list(product_ids)
+        if product_ids:
+            self._reindex('p.id = ANY(%s)', [product_ids])
+
+    def index_category(self, category_id):
+        self._reindex('p.category_id = %s', [category_id])
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    TABLE = 'products_product_fts'
+    # bm25() column weights for (name, category, description)
+    WEIGHTS = (10.0, 4.0, 1.0)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = ' AND '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, -bm25({self.TABLE}, %s, %s, %s) AS score "
+                f"FROM {self.TABLE} WHERE {self.TABLE} MATCH %s "
+                f"ORDER BY score DESC, rowid LIMIT %s",
+                [*self.WEIGHTS, match, limit],
+            )
+            return cursor.fetchall()
+
+    def _reindex(self, where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.TABLE} WHERE rowid IN "
+                f"(SELECT p.id FROM products_product p WHERE {where})",
+                params,
+            )
+            cursor.execute(
+                f"INSERT INTO {self.TABLE} (rowid, name, category, description) "
+                f"SELECT p.id, p.name, c.name, p.description FROM products_product p "
+                f"JOIN products_category c ON c.id = p.category_id WHERE {where}",
+                params,
+            )
+
+    def index_products(self, product_ids):
+        for batch in chunked(product_ids, 500):
+            placeholders = ', '.join(['%s'] * len(batch))
+            self._reindex(f'p.id IN ({placeholders})', batch)
+
+    def index_category(self, category_id):
+        self._reindex('p.category_id = %s', [category_id])
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            for batch in chunked(product_ids, 500):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM {self.TABLE} WHERE rowid IN ({placeholders})", batch)
+
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE}")
+        return super().rebuild(batch_size)
+
+
+class FallbackSearchBackend(BaseSearchBackend):
+    """Unindexed name match for databases without a full-text engine."""
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        from .models import Product
+        queryset = Product.objects.all()
+        for token in tokenize(query):
+            queryset = queryset.filter(name__icontains=token)
+        return [(pk, 1.0) for pk in queryset.order_by('name').values_list('id', flat=True)[:limit]]
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+_backends = {}
+
+
+def get_search_backend():
+    vendor = connection.vendor
+    if vendor not in _backends:
+        _backends[vendor] = BACKENDS.get(vendor, FallbackSearchBackend)()
+    return _backends[vendor]
+
+
+class FullTextSearchFilter(filters.BaseFilterBackend):
+    """
+    ``?q=`` filter for ProductViewSet: restricts to matching products and
+    orders them by relevance unless the client asked for an explicit ``ordering``.
+
+    The query is expanded with brand/generic synonyms.  ``?fuzzy=true`` ranks
+    by trigram similarity of product names instead, and a full-text search
+    with no hits falls back to fuzzy matching so misspellings still find products.
+    Outside PostgreSQL only the best SEARCH_RESULT_LIMIT matches are returned.
+    """
+    search_param = 'q'
+    fuzzy_param = 'fuzzy'
+
+    def filter_queryset(self, request, queryset, view):
+        from .fuzzy import expand_synonyms
+
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        terms = expand_synonyms(query)
+        fuzzy = request.query_params.get(self.fuzzy_param, '').lower() in ('1', 'true', 'yes')
+        backend = get_search_backend()
+        matches = None if fuzzy else backend.filter_search(queryset, terms)
+        if matches is None:
+            matches = backend.filter_fuzzy(queryset, terms)
+        if matches is None:
+            return queryset.none()
+        if not request.query_params.get('ordering'):
+            matches = matches.order_by('-search_rank', 'id')
+        return matches
@@ -34,6 +34,11 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = '__all__'
 
+class CategorySummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ('id', 'slug', 'name')
+
 class ReviewSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     
@@ -42,21 +47,47 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'rating', 'comment', 'created_at')
         read_only_fields = ('id', 'user', 'created_at')
 
-class ProductSerializer(serializers.ModelSerializer):
+class ConsolidatedStockMixin:
+    """
+    Serve ``stock`` as on-hand units across stock shards, and route stock
+    writes for sharded products through ``products.inventory``.
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'stock' in data:
+            data['stock'] = instance.current_stock
+        return data
+
+    def update(self, instance, validated_data):
+        if instance.stock_shards and 'stock' in validated_data:
+            from .inventory import set_stock
+            set_stock(instance, validated_data.pop('stock'))
+        return super().update(instance, validated_data)
+
+
+class ProductSerializer(ConsolidatedStockMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Product
         fields = ('id', 'category', 'category_id', 'name', 'slug', 'description', 
                   'price', 'stock', 'image', 'is_available', 'created_at', 
-                  'updated_at', 'reviews', 'average_rating')
-        read_only_fields = ('id', 'created_at', 'updated_at')
-    
-    def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum([review.rating for review in reviews]) / len(reviews)
-        return 0
\ No newline at end of file
+                  'updated_at', 'reviews', 'average_rating', 'review_count',
+                  'rating_histogram')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'review_count')
+
+class ProductListSerializer(ConsolidatedStockMixin, serializers.ModelSerializer):
+    """Compact catalog representation; reviews are only served on retrieve."""
+    category = CategorySummarySerializer(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'slug', 'name', 'price', 'image', 'stock', 'is_available',
+                  'average_rating', 'review_count', 'category')
+        read_only_fields = fields
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import cache as catalog_cache
+from .models import FAQ, Category, MedicineSynonym, Product, Review
+from .search import get_search_backend
+from .suggest import suggestion_index, product_entry, category_entry
+
+
+SEARCH_DOCUMENT_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Capture the stored product/rating so edits can be moved between buckets."""
+    instance._previous_rating = None
+    if not instance._state.adding and instance.pk:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list('product_id', 'rating')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def add_rating_to_product(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    current = (instance.product_id, instance.rating)
+
+    if previous == current:
+        return
+    if previous is not None:
+        Product.adjust_rating_aggregates(previous[0], previous[1], -1)
+    Product.adjust_rating_aggregates(instance.product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating_from_product(sender, instance, **kwargs):
+    Product.adjust_rating_aggregates(instance.product_id, instance.rating, -1)
+
+
+# The search documents are rows written in the change's transaction; the
+# in-process trigram and suggestion indexes are only touched once it
+# commits, so a rollback leaves them as they were
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not SEARCH_DOCUMENT_FIELDS.intersection(update_fields):
+        return
+    backend = get_search_backend()
+    backend.index_products([instance.pk])
+    pk, name = instance.pk, instance.name
+
+    def add_trigrams():
+        if backend.trigram_index.is_built:
+            backend.trigram_index.add(pk, name)
+    transaction.on_commit(add_trigrams)
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, **kwargs):
+    if not suggestion_index.is_built:
+        return
+    entry = product_entry(instance) if instance.is_available else None
+    key = ('product', instance.pk)
+
+    def update():
+        if entry is not None:
+            suggestion_index.upsert(*entry)
+        else:
+            suggestion_index.remove(key)
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    backend = get_search_backend()
+    backend.remove_products([instance.pk])
+    pk = instance.pk
+
+    def remove():
+        if backend.trigram_index.is_built:
+            backend.trigram_index.remove(pk)
+        suggestion_index.remove(('product', pk))
+    transaction.on_commit(remove)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    # A new category has no products yet; a renamed one changes their documents
+    if not created:
+        get_search_backend().index_category(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, **kwargs):
+    if not suggestion_index.is_built:
+        return
+    def update():
+        # Product counts are only refreshed on the periodic rebuild
+        current = suggestion_index.entries.get(('category', instance.pk))
+        suggestion_index.upsert(*category_entry(instance, current['weight'] if current else 0))
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    key = ('category', instance.pk)
+    transaction.on_commit(lambda: suggestion_index.remove(key))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+# Synonyms change which products a cached ?q= search returns
+@receiver(post_save, sender=MedicineSynonym)
+@receiver(post_delete, sender=MedicineSynonym)
+def invalidate_catalog_cache(sender, **kwargs):
+    catalog_cache.bump_generation(catalog_cache.CATALOG)
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def invalidate_faq_cache(sender, **kwargs):
+    catalog_cache.bump_generation(catalog_cache.FAQ)
@@ -0,0 +1,263 @@
+"""
+In-process prefix index behind ``/api/products/suggest/``.
+
+A trie over normalized product and category names.  Every word position of
+a name is inserted as a key ("crocin paracetamol 500mg" is also reachable
+from "para" and "500"), truncated to ``MAX_KEY_LENGTH`` characters.  Each
+node caches the ids of its ``TOP_N`` most popular entries, so a lookup is a
+walk down the prefix plus a copy of that cache.
+
+The index is built on first use in each process, updated incrementally from
+``products.signals`` and rebuilt every ``REBUILD_INTERVAL`` seconds so that
+workers converge on changes made by other processes.  Rebuilds run on one
+background thread while requests keep reading the current index; the fresh
+trie is swapped in when it is complete.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from django.db import connection
+
+from .search import tokenize
+
+
+TOP_N = 10
+MAX_KEY_LENGTH = 24
+REBUILD_INTERVAL = 15 * 60
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+class Node:
+    __slots__ = ('children', 'terminal', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = set()   # entries whose (truncated) key ends here
+        self.top = []           # best TOP_N entry ids in this subtree
+
+
+class PrefixIndex:
+    def __init__(self, top_n=TOP_N):
+        self.top_n = top_n
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self.root = Node()
+        self.entries = {}       # entry id -> suggestion dict (with 'weight')
+        self.ranks = {}         # entry id -> sort key, best first
+        self.built_at = None
+        self._changes = None    # upserts/removes made while a rebuild loads
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def _rank(self, entry_id):
+        return self.ranks[entry_id]
+
+    @staticmethod
+    def _keys(name):
+        words = normalize(name).split()
+        return {' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(len(words))}
+
+    def build(self, entries):
+        with self._lock:
+            self.clear()
+            for entry_id, entry in entries:
+                self._insert(entry_id, entry, offer=False)
+            self._fill_top(self.root)
+            self.built_at = time.monotonic()
+
+    def rebuild(self, entries):
+        """
+        Build a fresh trie from ``entries`` (which may be a slow generator)
+        without blocking readers, then swap it in.  Changes applied while it
+        loads are replayed onto the fresh trie so none are lost.
+        """
+        with self._lock:
+            self._changes = []
+        fresh = PrefixIndex(self.top_n)
+        try:
+            fresh.build(entries)
+        finally:
+            with self._lock:
+                changes, self._changes = self._changes, None
+        with self._lock:
+            for entry_id, entry in changes:
+                if entry is None:
+                    fresh.remove(entry_id)
+                else:
+                    fresh.upsert(entry_id, entry)
+            self.root, self.entries, self.ranks = fresh.root, fresh.entries, fresh.ranks
+            self.built_at = fresh.built_at
+
+    def _fill_top(self, node):
+        candidates = set(node.terminal)
+        for child in node.children.values():
+            candidates.update(self._fill_top(child))
+        node.top = heapq.nsmallest(self.top_n, candidates, key=self._rank)
+        return node.top
+
+    def upsert(self, entry_id, entry):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((entry_id, entry))
+            if entry_id in self.entries:
+                self._remove(entry_id)
+            self._insert(entry_id, entry)
+
+    def remove(self, entry_id):
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((entry_id, None))
+            if entry_id in self.entries:
+                self._remove(entry_id)
+
+    def _insert(self, entry_id, entry, offer=True):
+        self.entries[entry_id] = entry
+        rank = self.ranks[entry_id] = (-entry['weight'], entry['name'].lower(), entry_id)
+        for key in self._keys(entry['name']):
+            node = self.root
+            if offer:
+                self._offer(node, entry_id, rank)
+            for char in key:
+                node = node.children.get(char) or node.children.setdefault(char, Node())
+                if offer:
+                    self._offer(node, entry_id, rank)
+            node.terminal.add(entry_id)
+
+    def _offer(self, node, entry_id, rank):
+        top = node.top
+        if entry_id in top:
+            return
+        if len(top) >= self.top_n and rank >= self.ranks[top[-1]]:
+            return
+        bisect.insort(top, entry_id, key=self._rank)
+        del top[self.top_n:]
+
+    def _remove(self, entry_id):
+        # Collect every node on every key path, then repair them deepest
+        # first: a node's top list is rebuilt from its own terminal entries
+        # and its children's (already repaired) top lists
+        nodes = {id(self.root): (0, self.root, None, None)}
+        for key in self._keys(self.entries[entry_id]['name']):
+            node = self.root
+            for depth, char in enumerate(key, start=1):
+                parent, node = node, node.children[char]
+                nodes[id(node)] = (depth, node, parent, char)
+            node.terminal.discard(entry_id)
+
+        for depth, node, parent, char in sorted(nodes.values(), key=lambda item: -item[0]):
+            if entry_id in node.top:
+                candidates = set(node.terminal)
+                for child in node.children.values():
+                    candidates.update(child.top)
+                candidates.discard(entry_id)
+                node.top = sorted(candidates, key=self._rank)[:self.top_n]
+            if parent is not None and not node.top and not node.terminal and not node.children:
+                del parent.children[char]
+        del self.entries[entry_id]
+        del self.ranks[entry_id]
+
+    def _subtree_entries(self, node):
+        found = set(node.terminal)
+        for child in node.children.values():
+            found.update(self._subtree_entries(child))
+        return found
+
+    def suggest(self, prefix, limit=TOP_N):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            node = self.root
+            for char in prefix[:MAX_KEY_LENGTH]:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            if len(prefix) <= MAX_KEY_LENGTH:
+                ids = node.top[:limit]
+            else:
+                # Keys are truncated, so check the full prefix against names
+                ids = sorted(
+                    (entry_id for entry_id in self._subtree_entries(node)
+                     if any(key.startswith(prefix) for key in self._full_keys(entry_id))),
+                    key=self._rank,
+                )[:limit]
+            return [self._public(entry_id) for entry_id in ids]
+
+    def _full_keys(self, entry_id):
+        words = normalize(self.entries[entry_id]['name']).split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _public(self, entry_id):
+        entry = self.entries[entry_id]
+        return {field: value for field, value in entry.items() if field != 'weight'}
+
+
+def product_entry(product):
+    return ('product', product.pk), {
+        'type': 'product',
+        'id': product.pk,
+        'name': product.name,
+        'slug': product.slug,
+        'weight': product.review_count,
+    }
+
+
+def category_entry(category, product_count=0):
+    return ('category', category.pk), {
+        'type': 'category',
+        'id': category.pk,
+        'name': category.name,
+        'slug': category.slug,
+        'weight': product_count,
+    }
+
+
+def load_entries():
+    from django.db.models import Count
+    from .models import Category, Product
+
+    products = Product.objects.filter(is_available=True).only('id', 'name', 'slug', 'review_count')
+    for product in products.iterator(chunk_size=2000):
+        yield product_entry(product)
+    for category in Category.objects.annotate(product_count=Count('products')).only('id', 'name', 'slug'):
+        yield category_entry(category, category.product_count)
+
+
+suggestion_index = PrefixIndex()
+_build_lock = threading.Lock()
+_rebuilding = False
+
+
+def _rebuild_in_background(index):
+    global _rebuilding
+    try:
+        index.rebuild(load_entries())
+    finally:
+        with _build_lock:
+            _rebuilding = False
+        # The thread's own database connection
+        connection.close()
+
+
+def get_suggestion_index():
+    global _rebuilding
+    index = suggestion_index
+    if index.is_built and time.monotonic() - index.built_at < REBUILD_INTERVAL:
+        return index
+    with _build_lock:
+        if not index.is_built:
+            # Nothing to serve yet, so the first build happens in the request
+            index.build(list(load_entries()))
+        elif not _rebuilding and time.monotonic() - index.built_at >= REBUILD_INTERVAL:
+            _rebuilding = True
+            threading.Thread(target=_rebuild_in_background, args=(index,), daemon=True).start()
+    return index
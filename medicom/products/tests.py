@@ -1,3 +1,645 @@
-from django.test import TestCase
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils.http import http_date
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from products.cache import cache_stats
+from products.models import Product, Category, Review, MedicineSynonym, FAQ
+from products.search import SEARCH_RESULT_LIMIT, get_search_backend
+from products.views import FAQViewSet
+from products.suggest import PrefixIndex, suggestion_index
+
+User = get_user_model()
+
+
+class ProductRatingAggregateTestCase(TestCase):
+    """Test cases for the denormalized rating aggregates on Product"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Pain Relief')
+        self.product = Product.objects.create(
+            name='Paracetamol',
+            description='Fever and pain relief',
+            price=25.00,
+            stock=100,
+            category=self.category
+        )
+        self.users = [
+            User.objects.create_user(
+                email=f'user{i}@test.com',
+                username=f'user{i}',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+
+    def test_add_review_updates_aggregates(self):
+        """Test that add_review keeps count, sum and histogram in sync"""
+        for user, rating in zip(self.users, [5, 4, 4]):
+            self.client.force_authenticate(user=user)
+            response = self.client.post(
+                f'/api/products/{self.product.slug}/add_review/',
+                {'rating': rating, 'comment': 'Works well'}
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 3)
+        self.assertEqual(self.product.rating_sum, 13)
+        self.assertEqual(self.product.rating_histogram, {1: 0, 2: 0, 3: 0, 4: 2, 5: 1})
+        self.assertAlmostEqual(self.product.average_rating, 13 / 3)
+
+    def test_delete_review_updates_aggregates(self):
+        """Test that deleting a review removes it from the aggregates"""
+        review = Review.objects.create(
+            product=self.product, user=self.users[0], rating=2, comment='Meh'
+        )
+        Review.objects.create(product=self.product, user=self.users[1], rating=5, comment='Great')
+        review.delete()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 1)
+        self.assertEqual(self.product.rating_sum, 5)
+        self.assertEqual(self.product.rating_2_count, 0)
+
+    def test_product_detail_reads_stored_aggregates(self):
+        """Test that the detail payload exposes the stored rating summary"""
+        Review.objects.create(product=self.product, user=self.users[0], rating=3, comment='Okay')
+        response = self.client.get(f'/api/products/{self.product.slug}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['review_count'], 1)
+        self.assertEqual(response.data['average_rating'], 3.0)
+
+    def test_backfill_command(self):
+        """Test that the backfill command repairs drifted aggregates"""
+        Review.objects.create(product=self.product, user=self.users[0], rating=1, comment='Bad')
+        Product.objects.filter(pk=self.product.pk).update(review_count=0, rating_sum=0, rating_1_count=0)
+
+        call_command('backfill_product_ratings', stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.review_count, 1)
+        self.assertEqual(self.product.rating_sum, 1)
+        self.assertEqual(self.product.rating_1_count, 1)
+
+
+class ProductListQueryTestCase(TestCase):
+    """Test cases for the compact catalog listing"""
+
+    def setUp(self):
+        """Set up a page of products with many reviews each"""
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Antibiotics')
+        users = [
+            User.objects.create_user(
+                email=f'reviewer{i}@test.com',
+                username=f'reviewer{i}',
+                password='testpass123'
+            )
+            for i in range(5)
+        ]
+        for i in range(15):
+            product = Product.objects.create(
+                name=f'Amoxicillin {i}',
+                description='Broad spectrum antibiotic',
+                price=40 + i,
+                stock=20,
+                category=self.category
+            )
+            Review.objects.bulk_create([
+                Review(product=product, user=user, rating=4, comment='Effective')
+                for user in users
+            ])
+
+    def test_list_query_count_is_constant(self):
+        """Test that a catalog page costs a count and one joined select"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_list_payload_is_compact(self):
+        """Test that list rows carry a category summary and no reviews"""
+        response = self.client.get('/api/products/')
+        row = response.data['results'][0]
+        self.assertNotIn('reviews', row)
+        self.assertNotIn('description', row)
+        self.assertEqual(row['category'], {
+            'id': self.category.id,
+            'slug': self.category.slug,
+            'name': self.category.name,
+        })
+
+    def test_retrieve_keeps_rich_payload(self):
+        """Test that the detail endpoint still nests reviews"""
+        product = Product.objects.first()
+        response = self.client.get(f'/api/products/{product.slug}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('description', response.data)
+        self.assertEqual(len(response.data['reviews']), 5)
+
+
+class ProductSearchTestCase(TestCase):
+    """Test cases for full-text product search"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = APIClient()
+        self.pain = Category.objects.create(name='Pain Relief')
+        self.vitamins = Category.objects.create(name='Vitamins')
+        self.ibuprofen = Product.objects.create(
+            name='Ibuprofen 400mg',
+            description='Anti-inflammatory tablets',
+            price=30.00,
+            stock=10,
+            category=self.pain
+        )
+        self.combo = Product.objects.create(
+            name='Cold Relief Combo',
+            description='Contains ibuprofen and pseudoephedrine',
+            price=55.00,
+            stock=10,
+            category=self.pain
+        )
+        self.vitamin_c = Product.objects.create(
+            name='Vitamin C 1000mg',
+            description='Immune support',
+            price=15.00,
+            stock=10,
+            category=self.vitamins
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/products/', {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_name_match_ranks_above_description_match(self):
+        """Test that a hit in the name outranks a hit in the description"""
+        self.assertEqual(self.search('ibuprofen'), [self.ibuprofen.id, self.combo.id])
+
+    def test_prefix_and_category_match(self):
+        """Test partial terms and category names are searchable"""
+        self.assertEqual(self.search('ibupro'), [self.ibuprofen.id, self.combo.id])
+        self.assertEqual(self.search('vitamins'), [self.vitamin_c.id])
+
+    def test_no_match_returns_empty_page(self):
+        """Test that an unmatched query returns no products"""
+        self.assertEqual(self.search('insulin'), [])
+
+    def test_index_follows_product_and_category_saves(self):
+        """Test that renames are searchable without a rebuild"""
+        self.vitamin_c.name = 'Ascorbic Acid 1000mg'
+        self.vitamin_c.save()
+        self.assertEqual(self.search('ascorbic'), [self.vitamin_c.id])
+
+        self.vitamins.name = 'Supplements'
+        self.vitamins.save()
+        self.assertEqual(self.search('supplements'), [self.vitamin_c.id])
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command indexes rows written without signals"""
+        Product.objects.filter(pk=self.vitamin_c.pk).update(name='Zinc Tablets')
+        self.assertEqual(self.search('zinc'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('zinc'), [self.vitamin_c.id])
+
+    @skipUnless(connection.vendor == 'postgresql', 'ranked in SQL on PostgreSQL only')
+    def test_every_match_is_returned(self):
+        """Test that matches beyond SEARCH_RESULT_LIMIT are still counted and paged"""
+        extra = Product.objects.bulk_create([
+            Product(name=f'Ibuprofen Gel {i}', slug=f'ibuprofen-gel-{i}', description='Topical', price=5, stock=1,
+                    category=self.pain)
+            for i in range(SEARCH_RESULT_LIMIT)
+        ])
+        get_search_backend().index_products([product.pk for product in extra])
+        response = self.client.get('/api/products/', {'q': 'ibuprofen'})
+        self.assertEqual(response.data['count'], SEARCH_RESULT_LIMIT + 2)
+        self.assertEqual(response.data['results'][0]['id'], self.ibuprofen.id)
+
+
+
+class FuzzySearchTestCase(TestCase):
+    """Test cases for typo-tolerant search and brand/generic synonyms"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = APIClient()
+        get_search_backend().trigram_index.clear()
+        category = Category.objects.create(name='Analgesics')
+        self.paracetamol = Product.objects.create(
+            name='Paracetamol 500mg Tablet',
+            description='Fever reducer',
+            price=20.00,
+            stock=10,
+            category=category
+        )
+        self.ibuprofen = Product.objects.create(
+            name='Ibuprofen 200mg Tablet',
+            description='Pain reliever',
+            price=35.00,
+            stock=10,
+            category=category
+        )
+        MedicineSynonym.objects.create(brand_name='Crocin', generic_name='Paracetamol')
+
+    def search(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_misspelled_query_falls_back_to_fuzzy(self):
+        """Test that misspellings with no full-text hit still find the product"""
+        self.assertEqual(self.search(q='paracetmol'), [self.paracetamol.id])
+        self.assertEqual(self.search(q='ibuprofin'), [self.ibuprofen.id])
+
+    def test_explicit_fuzzy_mode(self):
+        """Test fuzzy=true ranks by name similarity"""
+        self.assertEqual(self.search(q='ibuprofin tablet', fuzzy='true')[0], self.ibuprofen.id)
+
+    def test_brand_name_finds_generic(self):
+        """Test that a brand synonym expands to its generic name"""
+        self.assertEqual(self.search(q='crocin'), [self.paracetamol.id])
+        self.assertEqual(self.search(q='CROCIN 500mg'), [self.paracetamol.id])
+
+    def test_in_process_index_follows_saves(self):
+        """Test that renamed products are matched after the index is built"""
+        self.search(q='paracetmol', fuzzy='true')
+        self.ibuprofen.name = 'Naproxen 250mg Tablet'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ibuprofen.save()
+        self.assertEqual(self.search(q='naproxn', fuzzy='true'), [self.ibuprofen.id])
+        self.assertEqual(self.search(q='ibuprofin', fuzzy='true'), [])
+
+    def test_rolled_back_save_leaves_index(self):
+        """Test that a rename rolled back with its transaction never reaches the in-process index"""
+        self.search(q='paracetmol', fuzzy='true')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.ibuprofen.name = 'Naproxen 250mg Tablet'
+                self.ibuprofen.save()
+                raise RuntimeError('Payment gateway timed out')
+        self.assertEqual(self.search(q='naproxn', fuzzy='true'), [])
+        self.assertEqual(self.search(q='ibuprofin', fuzzy='true'), [self.ibuprofen.id])
+
+
+
+class PrefixIndexTestCase(TestCase):
+    """Test cases for the in-process suggestion trie"""
+
+    def entry(self, pk, name, weight):
+        return ('product', pk), {'type': 'product', 'id': pk, 'name': name, 'slug': name, 'weight': weight}
+
+    def test_top_n_by_popularity_and_word_prefix(self):
+        """Test that suggestions match any word start and rank by weight"""
+        index = PrefixIndex(top_n=2)
+        index.build([
+            self.entry(1, 'Crocin Paracetamol', 5),
+            self.entry(2, 'Paracetamol 650', 9),
+            self.entry(3, 'Pantoprazole', 1),
+        ])
+        self.assertEqual([s['id'] for s in index.suggest('pa')], [2, 1])
+        self.assertEqual([s['id'] for s in index.suggest('crocin par')], [1])
+        self.assertEqual(index.suggest('xyz'), [])
+
+    def test_remove_repairs_cached_top_lists(self):
+        """Test that removing a top entry promotes the next best one"""
+        index = PrefixIndex(top_n=2)
+        index.build([
+            self.entry(1, 'Crocin Paracetamol', 5),
+            self.entry(2, 'Paracetamol 650', 9),
+            self.entry(3, 'Pantoprazole', 1),
+        ])
+        index.remove(('product', 2))
+        self.assertEqual([s['id'] for s in index.suggest('pa')], [1, 3])
+        index.upsert(*self.entry(3, 'Pantoprazole', 10))
+        self.assertEqual([s['id'] for s in index.suggest('p')], [3, 1])
+
+    
+    def test_rebuild_keeps_serving_and_replays_changes(self):
+        """Test that a rebuild serves the old trie while loading and keeps changes made meanwhile"""
+        index = PrefixIndex(top_n=2)
+        index.build([self.entry(1, 'Crocin Paracetamol', 5), self.entry(2, 'Paracetamol 650', 9)])
+        
+        def entries():
+            yield self.entry(1, 'Crocin Paracetamol', 5)
+            # Readers still see the old trie while the new one loads
+            self.assertEqual([s['id'] for s in index.suggest('pa')], [2, 1])
+            index.remove(('product', 1))
+            index.upsert(*self.entry(3, 'Pantoprazole', 7))
+            yield self.entry(2, 'Paracetamol 650', 9)
+        
+        index.rebuild(entries())
+        self.assertEqual([s['id'] for s in index.suggest('pa')], [2, 3])
+        self.assertEqual(index.suggest('crocin'), [])
+
+
+class ProductSuggestTestCase(TestCase):
+    """Test cases for the suggest endpoint"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = APIClient()
+        suggestion_index.clear()
+        self.category = Category.objects.create(name='Pain Relief')
+        self.product = Product.objects.create(
+            name='Paracetamol 500mg',
+            description='Fever reducer',
+            price=20.00,
+            stock=10,
+            category=self.category
+        )
+
+    def test_suggest_products_and_categories(self):
+        """Test that product and category names are suggested"""
+        response = self.client.get('/api/products/suggest/', {'prefix': 'pa'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {(s['type'], s['id']) for s in response.data['suggestions']},
+            {('product', self.product.id), ('category', self.category.id)}
+        )
+
+    def test_index_follows_changes(self):
+        """Test that new and unavailable products update the built index"""
+        self.client.get('/api/products/suggest/', {'prefix': 'pa'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name='Ibuprofen 400mg',
+                description='Pain reliever',
+                price=30.00,
+                stock=10,
+                category=self.category
+            )
+            self.product.is_available = False
+            self.product.save()
+
+        response = self.client.get('/api/products/suggest/', {'prefix': 'ibu'})
+        self.assertEqual([s['name'] for s in response.data['suggestions']], ['Ibuprofen 400mg'])
+        response = self.client.get('/api/products/suggest/', {'prefix': 'paracet'})
+        self.assertEqual(response.data['suggestions'], [])
+
+
+class ProductCursorPaginationTestCase(TestCase):
+    """Test cases for opt-in keyset pagination on the catalog"""
+
+    def setUp(self):
+        """Set up 30 products with many duplicate prices"""
+        self.client = APIClient()
+        category = Category.objects.create(name='Vitamins')
+        for i in range(30):
+            Product.objects.create(
+                name=f'Vitamin {i:02d}',
+                description='Supplement',
+                price=10 + i % 4,
+                stock=5,
+                category=category
+            )
+
+    def walk(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_walk_matches_offset_ordering(self):
+        """Test that cursor pages cover every product once, in order"""
+        ids, _ = self.walk('/api/products/', {'cursor': '', 'ordering': 'price'})
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+        ids, _ = self.walk('/api/products/', {'cursor': ''})
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        """Test that following previous from page two gives page one"""
+        first = self.client.get('/api/products/', {'cursor': '', 'ordering': 'name'})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']]
+        )
+
+    def test_cursor_page_skips_count_query(self):
+        """Test that a cursor page is a single select"""
+        first = self.client.get('/api/products/', {'cursor': ''})
+        with self.assertNumQueries(1):
+            self.client.get(first.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = self.client.get('/api/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_unchanged(self):
+        """Test that clients without a cursor still get counted pages"""
+        response = self.client.get('/api/products/', {'page': 2})
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 12)
+
+
+class CatalogCacheTestCase(TestCase):
+    """Test cases for the versioned catalog response cache"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Pain Relief')
+        self.product = Product.objects.create(
+            name='Paracetamol 500mg',
+            description='Pain relief tablets',
+            price=20.00,
+            stock=50,
+            category=self.category
+        )
+        self.user = get_user_model().objects.create_user(
+            username='reviewer',
+            email='reviewer@example.com',
+            password='testpass123'
+        )
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_second_request_is_served_from_cache(self):
+        """Test that a repeated listing hits the cache without queries"""
+        self.assertEqual(self.get('/api/products/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['id'], self.product.id)
+
+    def test_query_params_are_normalized(self):
+        """Test that parameter order does not split cache entries"""
+        self.get(f'/api/products/?ordering=price&category={self.category.id}')
+        response = self.get(f'/api/products/?category={self.category.id}&ordering=price')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_product_save_invalidates(self):
+        """Test that a stock change is visible on the next read"""
+        self.get(f'/api/products/{self.product.slug}/')
+        self.product.stock = 0
+        self.product.save()
+        response = self.get(f'/api/products/{self.product.slug}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['stock'], 0)
+
+    def test_review_invalidates(self):
+        """Test that a new review refreshes cached rating aggregates"""
+        self.get('/api/products/')
+        Review.objects.create(product=self.product, user=self.user, rating=4, comment='Works')
+        response = self.get('/api/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['review_count'], 1)
+
+    def test_synonym_invalidates(self):
+        """Test that a new synonym refreshes cached searches"""
+        self.assertEqual(self.get('/api/products/', {'q': 'crocin'}).data['count'], 0)
+        synonym = MedicineSynonym.objects.create(brand_name='Crocin', generic_name='Paracetamol')
+        response = self.get('/api/products/', {'q': 'crocin'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 1)
+
+        synonym.delete()
+        self.assertEqual(self.get('/api/products/', {'q': 'crocin'}).data['count'], 0)
+
+    def test_faq_namespace_is_separate(self):
+        """Test that product writes leave cached FAQs alone and FAQ writes refresh them"""
+        view = FAQViewSet.as_view({'get': 'list'}, basename='faq')
+
+        def faqs():
+            return view(APIRequestFactory().get('/api/products/faqs/'))
+
+        faqs()
+        self.product.save()
+        self.assertEqual(faqs()['X-Cache'], 'HIT')
+
+        FAQ.objects.create(question='Delivery time?', answer='Two days', order=1)
+        response = faqs()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 1)
+
+    def test_stats_count_hits_and_misses(self):
+        """Test that hit and miss counters are recorded"""
+        self.get('/api/products/categories/')
+        self.get('/api/products/categories/')
+        stats = cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_if_none_match_returns_not_modified(self):
+        """Test that a matching ETag gets a 304 without a body"""
+        etag = self.get('/api/products/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(CATALOG_CACHE_TIMEOUT=0)
+    def test_not_modified_without_cached_body(self):
+        """Test that validators alone answer a revalidation without queries"""
+        etag = self.get('/api/products/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_changes_validators(self):
+        """Test that a stale ETag or date gets the fresh body after a write"""
+        first = self.get(f'/api/products/{self.product.slug}/')
+        categories = self.get('/api/products/categories/')
+        response = self.client.get('/api/products/categories/', HTTP_IF_MODIFIED_SINCE=categories['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Last-Modified has whole-second resolution, so the write happens a minute later
+        later = time.time() + 60
+        with mock.patch('products.cache.time.time', return_value=later):
+            self.product.price = 25
+            self.product.save()
+        response = self.client.get(
+            f'/api/products/{self.product.slug}/',
+            HTTP_IF_NONE_MATCH=first['ETag'],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+        # Categories share the catalog namespace, so they are fresh again too
+        response = self.client.get('/api/products/categories/', HTTP_IF_MODIFIED_SINCE=categories['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Last-Modified'], http_date(int(later)))
+        self.product.delete()
+        response = self.client.get('/api/products/categories/', HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2024 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProductFacetTestCase(TestCase):
+    """Test cases for the filter sidebar facet counts"""
+
+    def setUp(self):
+        """Set up products across categories, prices and stock levels"""
+        cache.clear()
+        self.client = APIClient()
+        self.pain = Category.objects.create(name='Pain Relief')
+        self.vitamins = Category.objects.create(name='Vitamins')
+        for name, price, stock, category in [
+            ('Paracetamol 500mg', 20, 50, self.pain),
+            ('Ibuprofen 400mg', 120, 0, self.pain),
+            ('Diclofenac Gel', 300, 5, self.pain),
+            ('Vitamin C 1000mg', 80, 10, self.vitamins),
+            ('Multivitamin Pack', 1500, 0, self.vitamins),
+        ]:
+            Product.objects.create(
+                name=name, description=name, price=price, stock=stock, category=category
+            )
+
+    def test_all_facets_in_one_query(self):
+        """Test category, availability and price counts from a single aggregate"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/facets/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 5)
+        self.assertEqual(
+            [(row['slug'], row['count']) for row in response.data['categories']],
+            [('pain-relief', 3), ('vitamins', 2)]
+        )
+        self.assertEqual(response.data['availability'], {'in_stock': 3, 'out_of_stock': 2})
+        self.assertEqual(
+            [(row['key'], row['count']) for row in response.data['price']],
+            [('0-100', 2), ('100-250', 1), ('250-500', 1), ('500-1000', 0), ('1000+', 1)]
+        )
+
+    def test_facets_follow_filters_and_search(self):
+        """Test that facets describe the same products as the listing"""
+        response = self.client.get('/api/products/facets/', {'q': 'vitamin'})
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual([row['slug'] for row in response.data['categories']], ['vitamins'])
+
+        response = self.client.get('/api/products/facets/', {'category': self.pain.id})
+        self.assertEqual(response.data['availability'], {'in_stock': 2, 'out_of_stock': 1})
+
+    def test_cached_per_filter_signature(self):
+        """Test that paging and ordering share one cached facet result"""
+        self.client.get('/api/products/facets/', {'category': self.pain.id, 'page': 1})
+        response = self.client.get('/api/products/facets/', {'category': self.pain.id, 'ordering': 'price'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        response = self.client.get('/api/products/facets/', {'category': self.vitamins.id})
+        self.assertEqual(response['X-Cache'], 'MISS')
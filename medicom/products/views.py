@@ -3,7 +3,12 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Category, Product, Review, ContactMessage, FAQ
-from .serializers import CategorySerializer, ProductSerializer, ReviewSerializer, ContactMessageSerializer, FAQSerializer
+from .cache import CachedResponseMixin, FAQ as FAQ_CACHE
+from .facets import facet_counts
+from .search import FullTextSearchFilter
+from .suggest import get_suggestion_index, TOP_N
+from .serializers import (CategorySerializer, ProductSerializer, ProductListSerializer, ReviewSerializer,
+                          ContactMessageSerializer, FAQSerializer)
 from rest_framework.views import APIView
 from django.core.mail import send_mail, EmailMultiAlternatives, EmailMessage
 from django.conf import settings
@@ -140,7 +145,7 @@ class ContactMessageView(APIView):
         email.send(fail_silently=False)
 
 
-class FAQViewSet(viewsets.ModelViewSet):
+class FAQViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     GET  /api/faqs/           → list all active FAQs (grouped by category on frontend)
     GET  /api/faqs/?category=orders  → filter by category
@@ -148,6 +153,7 @@ class FAQViewSet(viewsets.ModelViewSet):
     """
     queryset = FAQ.objects.filter(is_active=True)
     serializer_class = FAQSerializer
+    cache_namespace = FAQ_CACHE
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -162,17 +168,25 @@ class FAQViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    """
+    GET /api/products/?q=para  → full-text search, most relevant first
+    GET /api/products/suggest/?prefix=para  → search-box suggestions
+    GET /api/products/facets/?q=para  → filter sidebar counts for the same filters
+    GET /api/products/availability/?ids=1,2  → live stock net of cart holds
+    """
+    # Params that change the page but not the set of matching products
+    facet_ignored_params = {'page', 'page_size', 'cursor', 'ordering'}
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     lookup_field = 'slug'
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'is_available']
     search_fields = ['name', 'description']
     ordering_fields = ['price', 'created_at', 'name']
@@ -182,6 +196,49 @@ class ProductViewSet(viewsets.ModelViewSet):
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProductListSerializer
+        return ProductSerializer
+
+    def get_queryset(self):
+        queryset = Product.objects.select_related('category').with_stock()
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('reviews__user')
+        return queryset
+
+    def get_cache_params(self, request):
+        params = super().get_cache_params(request)
+        if self.action == 'facets':
+            params = [(key, values) for key, values in params if key not in self.facet_ignored_params]
+        return params
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        return self.cached_response(self._facets, request)
+
+    def _facets(self, request):
+        return Response(facet_counts(self.filter_queryset(self.get_queryset())))
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """Live sellable stock (on hand minus cart holds) for ``?ids=1,2,3``; never cached."""
+        ids = [pk for pk in request.query_params.get('ids', '').split(',') if pk.strip().isdigit()][:100]
+        rows = Product.objects.filter(pk__in=ids).with_stock().values_list('pk', 'stock_on_hand', 'stock_held')
+        return Response([
+            {'id': pk, 'available_stock': max(stock - reserved, 0)} for pk, stock, reserved in rows
+        ])
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        prefix = request.query_params.get('prefix', '')
+        try:
+            limit = min(int(request.query_params.get('limit', TOP_N)), TOP_N)
+        except ValueError:
+            limit = TOP_N
+        suggestions = get_suggestion_index().suggest(prefix, limit=max(limit, 1))
+        return Response({'prefix': prefix, 'suggestions': suggestions})
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_review(self, request, slug=None):
         product = self.get_object()
@@ -201,6 +258,6 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def reviews(self, request, slug=None):
         product = self.get_object()
-        reviews = product.reviews.all()
+        reviews = product.reviews.select_related('user')
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
\ No newline at end of file